@@ -4,6 +4,9 @@ import datetime
 import hashlib
 import json
 from core.db import BrainDB
+from core.analyzer import ProjectAnalyzer
+from core.journal import ObserverJournal
+from core.metrics import load_snapshots, aggregate_snapshots
 from core import config
 from streamlit_agraph import agraph, Node, Edge, Config
 
@@ -86,58 +89,98 @@ def get_db():
 
 db = get_db()
 
+@st.cache_resource
+def get_journal():
+    return ObserverJournal()
+
+def read_observer_logs(limit=20):
+    """Fetch only journal events newer than the session cursor and keep the latest `limit` log lines."""
+    journal = get_journal()
+    if "observer_cursor" not in st.session_state:
+        st.session_state.observer_cursor = max(0, journal.last_id() - 200)
+        st.session_state.observer_logs = []
+    events, st.session_state.observer_cursor = journal.read_since(
+        st.session_state.observer_cursor, kinds=["log", "scan_start", "scan_complete"]
+    )
+    st.session_state.observer_logs = (st.session_state.observer_logs + events)[-limit:]
+    return list(reversed(st.session_state.observer_logs))
+
 def load_data():
-    all_memories = []
+    """Load materialized memory counts per (workbase, type, category) from the workbase registry."""
     try:
-        results = db.collection.get()
-        if results["ids"]:
-            for i in range(len(results["ids"])):
-                all_memories.append({
-                    "id": results["ids"][i],
-                    "text": results["documents"][i],
-                    "workbase_id": results["metadatas"][i].get("workbase_id"),
-                    "project_name": results["metadatas"][i].get("project_name", "Unknown"),
-                    "type": results["metadatas"][i].get("type", "unknown"),
-                    "category": results["metadatas"][i].get("category", "unknown"),
-                    "created_at": results["metadatas"][i].get("created_at", "N/A"),
-                    "source": results["metadatas"][i].get("source", "agent")
-                })
-        
-        full_df = pd.DataFrame(all_memories)
-        
-        # Enrich rows missing project_name
-        if not full_df.empty:
-            name_map = full_df[full_df["project_name"] != "Unknown"].set_index("workbase_id")["project_name"].to_dict()
-            full_df["project_name"] = full_df.apply(
-                lambda row: name_map.get(row["workbase_id"], row["project_name"]), axis=1
-            )
-            
+        names = {wb["workbase_id"]: wb["project_name"] for wb in db.get_known_workbases()}
+        stats = db.get_workbase_stats()
+        full_df = pd.DataFrame(stats, columns=["workbase_id", "type", "category", "count"])
+        full_df["project_name"] = full_df["workbase_id"].map(names).fillna("Unknown")
         return full_df
     except Exception as e:
         st.error(f"Error loading system memory: {e}")
         return pd.DataFrame()
 
+def load_page(workbase_id, categories, search, page, page_size, name_map):
+    """Materialize only the visible page, with filters pushed down to BrainDB."""
+    try:
+        records = db.get_memories_page(
+            workbase_id=workbase_id,
+            categories=categories,
+            search=search,
+            offset=page * page_size,
+            limit=page_size
+        )
+    except Exception as e:
+        st.error(f"Error loading page: {e}")
+        return pd.DataFrame()
+
+    rows = []
+    for rec in records:
+        meta = rec["metadata"]
+        wb_id = meta.get("workbase_id")
+        rows.append({
+            "id": rec["id"],
+            "text": rec["text"],
+            "workbase_id": wb_id,
+            "project_name": name_map.get(wb_id, meta.get("project_name", "Unknown")),
+            "type": meta.get("type", "unknown"),
+            "category": meta.get("category", "unknown"),
+            "created_at": meta.get("created_at", "N/A"),
+            "source": meta.get("source", "agent")
+        })
+    return pd.DataFrame(rows)
+
 # --- CRUD Operations ---
 def delete_memories(ids):
     try:
-        db.collection.delete(ids=ids)
+        db.delete_memories(ids)
         st.success(f"Successfully deleted {len(ids)} memories.")
         st.cache_resource.clear()
         st.rerun()
     except Exception as e:
         st.error(f"Deletion failed: {e}")
 
-def update_memory_metadata(memory_id, text, metadata):
+GRID_METADATA_FIELDS = ["type", "category", "source"]
+
+def grid_changes(original, edited):
+    """Diff the Grid Editor against the loaded page: one update per changed row, text only if it changed."""
+    updates = []
+    for (_, before), (_, after) in zip(original.iterrows(), edited.iterrows()):
+        update = {"id": before["id"]}
+        if after["text"] != before["text"]:
+            update["text"] = after["text"]
+        changed = {f: after[f] for f in GRID_METADATA_FIELDS if after[f] != before[f]}
+        if changed:
+            update["metadata"] = changed
+        if len(update) > 1:
+            updates.append(update)
+    return updates
+
+def save_grid_edits(updates):
     try:
-        db.collection.update(
-            ids=[memory_id],
-            documents=[text],
-            metadatas=[metadata]
-        )
-        return True
+        result = db.update_memories(updates)
+        st.success(f"Saved {result['updated']} memories ({result['reembedded']} re-embedded).")
+        st.cache_resource.clear()
+        st.rerun()
     except Exception as e:
-        st.error(f"Update failed for {memory_id}: {e}")
-        return False
+        st.error(f"Save failed: {e}")
 
 # --- UI Components ---
 def render_memory_card(row):
@@ -173,6 +216,8 @@ with st.sidebar:
     st.header("🔍 Filters")
     workbase_filter = "All"
     category_filter = []
+    search_filter = ""
+    page_size = config.ADMIN_PAGE_SIZE
     
     if not df.empty:
         wb_names = df.groupby("workbase_id")["project_name"].first().to_dict()
@@ -184,6 +229,10 @@ with st.sidebar:
         categories = sorted(df["category"].unique().tolist())
         category_filter = st.multiselect("Category", categories)
 
+        search_filter = st.text_input("Search", placeholder="Substring in memory text", help="Case-sensitive match on memory content.")
+        page_sizes = sorted({12, 24, 48, 96, config.ADMIN_PAGE_SIZE})
+        page_size = st.selectbox("Page size", page_sizes, index=page_sizes.index(config.ADMIN_PAGE_SIZE))
+
     st.divider()
 
     # --- Silent Observer Sidebar Section ---
@@ -213,13 +262,20 @@ with st.sidebar:
             
             if obs_state.get("drift_detected"):
                 st.warning("⚠️ Codebase Drift Detected!")
-            
+
+            wb_status = obs_state.get("workbases", {})
+            if wb_status:
+                with st.expander(f"Workbases ({len(wb_status)})", expanded=False):
+                    for status_entry in sorted(wb_status.values(), key=lambda s: s.get("priority", 0), reverse=True):
+                        st.caption(
+                            f"**{status_entry.get('project_name', 'Unknown')}** — {status_entry.get('status', '?')}, "
+                            f"{status_entry.get('checked_files', 0)} files, {status_entry.get('drifts', 0)} drifts"
+                        )
+
             with st.expander("Recent Activity", expanded=False):
-                for log in obs_state.get("logs", []):
-                    st.caption(log)
+                for event in read_observer_logs():
+                    st.caption(f"[{datetime.datetime.fromisoformat(event['ts']).astimezone().strftime('%H:%M:%S')}] {event['message']}")
                     
-        except json.JSONDecodeError:
-            st.caption("🔄 Syncing observer state...")
         except Exception as e:
             st.error(f"Observer Error: {e}")
     else:
@@ -229,7 +285,7 @@ with st.sidebar:
     
     with st.expander("⚙️ System Settings", expanded=False):
         st.caption(f"**DB:** {config.BASE_DATA_DIR.name}")
-        st.caption(f"**Model:** {config.EMBEDDING_MODEL.split('/')[-1]}")
+        st.caption(f"**Model:** {config.EMBEDDING_MODEL.split('/')[-1]} ({config.EMBEDDING_BACKEND})")
         
         st.write("---")
         st.subheader("💾 Memory Management")
@@ -287,6 +343,55 @@ with st.sidebar:
                     st.error(f"Import failed: {e}")
 
         st.write("---")
+        st.subheader("🧹 Consolidate Duplicates")
+        if workbase_filter == "All":
+            st.info("Select a workbase from the filter above to consolidate it.")
+        else:
+            consolidation_threshold = st.slider(
+                "Min. similarity", 0.80, 1.0, config.CONSOLIDATION_THRESHOLD, 0.01, key="consolidation_threshold"
+            )
+            c1, c2 = st.columns(2)
+            if c1.button("🔎 Preview", width="stretch"):
+                st.session_state.consolidation_report = db.consolidate_workbase(
+                    workbase_filter, threshold=consolidation_threshold
+                )
+            if c2.button("🧹 Merge", width="stretch", type="primary"):
+                report = db.consolidate_workbase(workbase_filter, threshold=consolidation_threshold, apply=True)
+                st.session_state.consolidation_report = report
+                st.cache_resource.clear()
+
+            report = st.session_state.get("consolidation_report")
+            if report and report["workbase_id"] == workbase_filter:
+                verb = "Removed" if report["applied"] else "Would remove"
+                st.caption(
+                    f"{len(report['clusters'])} clusters · {verb} {report['removed']} memories "
+                    f"({report['memories_before']} → {report['memories_after']}, "
+                    f"-{report['index_shrink_pct']}%)"
+                )
+                for cluster in report["clusters"][:20]:
+                    st.caption(f"**Keep:** {cluster['keep_text'][:80]} (+{len(cluster['remove'])})")
+
+        st.write("---")
+        with st.expander("🚚 Rename / Move Workbase"):
+            move_wb = st.selectbox("Workbase", ["None"] + sorted(list(wb_options.keys())), key="move_wb")
+            if move_wb != "None":
+                move_wb_id = wb_options[move_wb]
+                new_name = st.text_input("New project name", value=move_wb.split(" (")[0], key="move_name")
+                new_root = st.text_input("New root path (moving changes the workbase id)", key="move_root")
+                if st.button("Apply", width="stretch", key="move_apply"):
+                    bar = st.progress(0.0, text="Updating...")
+                    report = lambda done, total: bar.progress(min(done / max(total, 1), 1.0), text=f"{done}/{total}")
+                    if new_root.strip():
+                        new_id = ProjectAnalyzer().get_workbase_id(new_root.strip())
+                        moved = db.move_workbase(move_wb_id, new_id, project_name=new_name or None,
+                                                 root_path=new_root.strip(), progress=report)
+                        st.success(f"Moved {moved} memories to {new_id[:12]}.")
+                    else:
+                        db.rename_workbase(move_wb_id, project_name=new_name or None, progress=report)
+                        st.success(f"Renamed to {new_name}.")
+                    st.cache_resource.clear()
+                    st.rerun()
+
         st.warning("Danger Zone")
         if st.checkbox("Enable Workbase Destruction"):
             target_wb = st.selectbox("Select Workbase to Destroy", ["None"] + sorted(list(wb_options.keys())))
@@ -299,10 +404,13 @@ with st.sidebar:
                 if st.session_state.get('confirm_delete'):
                     confirm_text = st.text_input(f"Type 'DELETE {target_wb.split(' ')[0]}' to confirm:")
                     if confirm_text == f"DELETE {target_wb.split(' ')[0]}":
-                        # Perform deletion of all items with this workbase_id
-                        ids_to_del = df[df["workbase_id"] == wb_id_to_del]["id"].tolist()
-                        if ids_to_del:
-                            db.collection.delete(ids=ids_to_del)
+                        # Delete in chunks through a workbase_id filter, with progress
+                        bar = st.progress(0.0, text="Deleting...")
+                        removed = db.delete_workbase(
+                            wb_id_to_del,
+                            progress=lambda done, total: bar.progress(min(done / max(total, 1), 1.0), text=f"Deleted {done}/{total}")
+                        )
+                        if removed:
                             st.success(f"Workbase {target_wb} destroyed.")
                             st.session_state.confirm_delete = False
                             st.cache_resource.clear()
@@ -313,7 +421,7 @@ st.title("🧠 Command Center")
 st.caption("Advanced Semantic Memory Management")
 
 if not df.empty:
-    # Filter data
+    # Filter materialized counts (metrics only; documents are loaded per page)
     display_df = df.copy()
     if workbase_filter != "All":
         display_df = display_df[display_df["workbase_id"] == workbase_filter]
@@ -322,26 +430,44 @@ if not df.empty:
 
     # Metrics
     m1, m2, m3, m4 = st.columns(4)
-    m1.metric("Total", len(display_df))
-    m2.metric("Rules", len(display_df[display_df["type"]=="rule"]))
-    m3.metric("Constraints", len(display_df[display_df["category"]=="constraints"]))
+    m1.metric("Total", int(display_df["count"].sum()))
+    m2.metric("Rules", int(display_df[display_df["type"]=="rule"]["count"].sum()))
+    m3.metric("Constraints", int(display_df[display_df["category"]=="constraints"]["count"].sum()))
     m4.metric("Categories", len(display_df["category"].unique()))
 
     st.divider()
 
-    tab_explore, tab_graph, tab_raw, tab_inject = st.tabs([
+    # Pagination (server-side)
+    query_wb = workbase_filter if workbase_filter != "All" else None
+    query_categories = category_filter or None
+    if search_filter:
+        match_count = db.count_memories(query_wb, query_categories, search_filter)
+    else:
+        match_count = int(display_df["count"].sum())
+    page_count = max(1, -(-match_count // page_size))
+
+    p1, p2 = st.columns([1, 5])
+    page_number = p1.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+    p2.caption(f"{match_count} matching memories · page {page_number} of {page_count}")
+
+    name_map = df.groupby("workbase_id")["project_name"].first().to_dict()
+    page_df = load_page(query_wb, query_categories, search_filter, page_number - 1, page_size, name_map)
+
+    tab_explore, tab_graph, tab_raw, tab_inject, tab_drift, tab_perf = st.tabs([
         "🗂️ Card View", 
         "🕸️ Knowledge Graph",
         "📑 Grid Editor",
-        "💉 Injection"
+        "💉 Injection",
+        "🕵️ Drift History",
+        "📈 Performance"
     ])
 
     with tab_explore:
-        if not display_df.empty:
+        if not page_df.empty:
             # Multi-select using st.data_editor hidden but driving selection? 
             # Or just cards. Cards are better for UX as requested.
             cols = st.columns(3)
-            for i, (_, row) in enumerate(display_df.iterrows()):
+            for i, (_, row) in enumerate(page_df.iterrows()):
                 with cols[i % 3]:
                     render_memory_card(row)
         else:
@@ -349,32 +475,47 @@ if not df.empty:
 
     with tab_graph:
         st.subheader("Semantic Relationships")
-        if not display_df.empty:
+        if workbase_filter == "All":
+            st.info("Select a workbase from the sidebar to build its knowledge graph.")
+        elif not display_df.empty:
+            g1, g2, g3 = st.columns(3)
+            graph_k = g1.slider("Neighbours per memory", 1, 20, config.GRAPH_NEIGHBORS)
+            graph_threshold = g2.slider("Min. similarity", 0.0, 1.0, config.GRAPH_SIMILARITY_THRESHOLD, 0.05)
+            graph_max_edges = g3.number_input("Max edges", min_value=10, value=config.GRAPH_MAX_EDGES, step=100)
+
+            graph = db.build_knn_graph(
+                workbase_filter,
+                categories=category_filter or None,
+                k=graph_k,
+                threshold=graph_threshold,
+                max_edges=int(graph_max_edges)
+            )
+
             nodes = []
             edges = []
-            # For visualization, we limit nodes if too many
-            limit = 50
-            viz_df = display_df.head(limit)
-            
-            for _, row in viz_df.iterrows():
-                color = "#238636" if row['type'] == 'rule' else "#1f6feb"
-                if row['type'] == 'constraint': color = "#da3633"
+            for node in graph["nodes"]:
+                color = "#238636" if node['type'] == 'rule' else "#1f6feb"
+                if node['type'] == 'constraint': color = "#da3633"
                 
                 nodes.append(Node(
-                    id=row['id'], 
-                    label=row['category'], 
-                    title=row['text'],
+                    id=node['id'], 
+                    label=node['category'], 
+                    title=node['text'],
                     size=15,
                     color=color
                 ))
             
-            # Simple edges: connect same category within the same workbase
-            for cat in viz_df['category'].unique():
-                cat_nodes = viz_df[viz_df['category'] == cat]['id'].tolist()
-                for i in range(len(cat_nodes)-1):
-                    edges.append(Edge(source=cat_nodes[i], target=cat_nodes[i+1], type="CURVE_SMOOTH"))
+            # Edges: top-k cosine neighbours above the threshold, pruned server-side
+            for edge in graph["edges"]:
+                edges.append(Edge(
+                    source=edge['source'],
+                    target=edge['target'],
+                    title=f"{edge['similarity']:.2f}",
+                    type="CURVE_SMOOTH"
+                ))
 
-            config_graph = Config(width=1000, height=600, directed=True, nodeHighlightBehavior=True)
+            st.caption(f"{len(nodes)} memories · {len(edges)} semantic links")
+            config_graph = Config(width=1000, height=600, directed=False, nodeHighlightBehavior=True)
             agraph(nodes=nodes, edges=edges, config=config_graph)
         else:
             st.warning("Not enough data for graph visualization.")
@@ -385,7 +526,7 @@ if not df.empty:
         col_act1, col_act2, col_spacer = st.columns([1, 1, 4])
         
         # We use st.data_editor with a checkbox column for selection
-        display_df_with_sel = display_df.copy()
+        display_df_with_sel = page_df.copy()
         display_df_with_sel.insert(0, "select", False)
         
         edited_raw = st.data_editor(
@@ -398,10 +539,11 @@ if not df.empty:
                 "workbase_id": None,
                 "category": st.column_config.SelectboxColumn("Category", options=sorted(df["category"].unique().tolist())),
                 "type": st.column_config.SelectboxColumn("Type", options=["rule", "context", "constraint"]),
+                "created_at": st.column_config.TextColumn("Created", disabled=True),
             },
             hide_index=True,
             width="stretch",
-            key="bulk_editor"
+            key=f"bulk_editor_{page_number}"
         )
         
         selected_ids = edited_raw[edited_raw["select"] == True]["id"].tolist()
@@ -409,9 +551,11 @@ if not df.empty:
         if col_act1.button("🗑️ Delete Selected", type="primary", disabled=not selected_ids):
             delete_memories(selected_ids)
             
-        if col_act2.button("💾 Save Grid", disabled=True): # Save logic similar to original but filtered
-            pass
-        st.caption(f"Selected: {len(selected_ids)} items")
+        # Only edited rows are sent: metadata changes in one batch, changed texts embedded together
+        grid_updates = grid_changes(page_df, edited_raw.drop(columns=["select"]))
+        if col_act2.button("💾 Save Grid", disabled=not grid_updates):
+            save_grid_edits(grid_updates)
+        st.caption(f"Selected: {len(selected_ids)} items · Edited: {len(grid_updates)} rows")
 
     with tab_inject:
         st.subheader("Manual Knowledge Injection")
@@ -440,6 +584,59 @@ if not df.empty:
                     st.cache_resource.clear()
                     st.rerun()
 
+    with tab_drift:
+        st.subheader("Observer Drift History")
+        drift_wb = None if workbase_filter == "All" else workbase_filter
+        journal = get_journal()
+        drift_total = journal.count_drifts(drift_wb)
+        if drift_total:
+            d1, d2 = st.columns([1, 3])
+            drift_pages = max(1, -(-drift_total // page_size))
+            drift_page = d1.number_input("History page", min_value=1, max_value=drift_pages, value=1, step=1)
+            d2.caption(f"{drift_total} drift findings · page {drift_page} of {drift_pages}")
+            history = journal.drift_history(drift_wb, offset=(drift_page - 1) * page_size, limit=page_size)
+            history_df = pd.DataFrame(history, columns=["ts", "workbase_id", "file", "drift_type", "rule_id", "message"])
+            history_df.insert(1, "project_name", history_df["workbase_id"].map(name_map).fillna("Unknown"))
+            st.dataframe(history_df.drop(columns=["workbase_id"]), hide_index=True, width="stretch")
+        else:
+            st.info("No drift findings recorded by the Silent Observer yet.")
+
+    with tab_perf:
+        st.subheader("MCP Server Metrics")
+        snapshots = load_snapshots()
+        if snapshots:
+            # Every server process (one per stdio agent) exports its own files
+            snapshot = aggregate_snapshots(snapshots)
+            generated = datetime.datetime.fromtimestamp(snapshot["generated_at"])
+            st.caption(f"{len(snapshot['processes'])} server process(es): {', '.join(snapshot['processes'])} · "
+                       f"last export {generated.strftime('%H:%M:%S')} · also in per-process `.prom` files")
+
+            latency_rows = []
+            other_rows = []
+            for dist in snapshot["distributions"]:
+                label = ", ".join(f"{k}={v}" for k, v in dist["labels"].items())
+                if dist["name"].endswith("_seconds"):
+                    latency_rows.append({
+                        "metric": dist["name"], "labels": label, "count": dist["count"],
+                        "p50 (ms)": dist["p50"] * 1000, "p95 (ms)": dist["p95"] * 1000, "p99 (ms)": dist["p99"] * 1000
+                    })
+                else:
+                    other_rows.append({
+                        "metric": dist["name"], "labels": label, "count": dist["count"],
+                        "p50": dist["p50"], "p95": dist["p95"], "p99": dist["p99"]
+                    })
+            if latency_rows:
+                st.dataframe(pd.DataFrame(latency_rows).sort_values(["metric", "labels"]), hide_index=True, width="stretch")
+            if other_rows:
+                st.dataframe(pd.DataFrame(other_rows), hide_index=True, width="stretch")
+            if snapshot["counters"]:
+                st.dataframe(pd.DataFrame([
+                    {"metric": c["name"], "labels": ", ".join(f"{k}={v}" for k, v in c["labels"].items()), "value": c["value"]}
+                    for c in snapshot["counters"]
+                ]), hide_index=True, width="stretch")
+        else:
+            st.info("No metrics exported yet. They appear after the MCP server handles its first tool call.")
+
 else:
     st.warning("No memories found. Initialize a workbase first.")
     if st.sidebar.button("Retry"): st.rerun()
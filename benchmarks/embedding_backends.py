@@ -0,0 +1,101 @@
+"""
+Compare embedding backends: encode throughput and neighbour recall.
+
+Recall is measured against a reference backend (the first one listed): for each query,
+the exact top-k neighbours in the corpus under the reference embeddings are the ground
+truth, and each backend's own top-k is scored against them.
+
+Usage (from the repository root):
+    python -m benchmarks.embedding_backends --backends sentence-transformers,onnx,hashing
+"""
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from core.embeddings import get_embedding_function
+from core.tuning import exact_topk
+
+SUBJECTS = ["function names", "class names", "API handlers", "database access", "logging", "error handling",
+            "imports", "tests", "configuration", "React components", "CLI commands", "async code"]
+VERBS = ["must use", "should prefer", "never use", "always wrap", "avoid", "document"]
+OBJECTS = ["snake_case", "camelCase", "dependency injection", "the repository pattern", "print statements",
+           "structured logging", "type hints", "retry decorators", "environment variables", "pytest fixtures"]
+
+
+def synthetic_corpus(size: int, seed: int = 0):
+    """Rule-like sentences, so the benchmark runs offline without a real brain."""
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(SUBJECTS).capitalize()} {rng.choice(VERBS)} {rng.choice(OBJECTS)} "
+        f"in {rng.choice(['core', 'server', 'admin', 'utils', 'api'])} module #{i}"
+        for i in range(size)
+    ]
+
+
+def run(backends, corpus, num_queries: int, k: int):
+    results = []
+    reference = None
+    query_idx = np.arange(min(num_queries, len(corpus)))
+
+    for name in backends:
+        try:
+            fn = get_embedding_function(name)
+            fn(corpus[:2])  # warm-up: model load is not part of throughput
+        except Exception as e:
+            results.append({"backend": name, "error": str(e)})
+            continue
+
+        start = time.perf_counter()
+        vectors = np.asarray(fn(corpus), dtype=np.float32)
+        seconds = time.perf_counter() - start
+
+        neighbours = exact_topk(vectors, vectors[query_idx], k + 1)[:, 1:]  # drop self-match
+        if reference is None:
+            reference = neighbours
+        hits = sum(len(set(a) & set(b)) for a, b in zip(neighbours.tolist(), reference.tolist()))
+
+        results.append({
+            "backend": name,
+            "texts": len(corpus),
+            "dim": int(vectors.shape[1]),
+            "seconds": round(seconds, 3),
+            "texts_per_second": round(len(corpus) / seconds, 1),
+            "recall_at_k_vs_reference": round(hits / (k * len(query_idx)), 4)
+        })
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="sentence-transformers,onnx,hashing",
+                        help="Comma-separated backends; the first one is the recall reference.")
+    parser.add_argument("--size", type=int, default=2000, help="Synthetic corpus size.")
+    parser.add_argument("--queries", type=int, default=200, help="Queries for recall@k.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args(argv)
+
+    corpus = synthetic_corpus(args.size)
+    results = run([b.strip() for b in args.backends.split(",") if b.strip()], corpus, args.queries, args.k)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"{'backend':<24} {'dim':>5} {'texts/s':>10} {'recall@k':>9}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:<24} unavailable: {r['error']}")
+        else:
+            print(f"{r['backend']:<24} {r['dim']:>5} {r['texts_per_second']:>10.1f} {r['recall_at_k_vs_reference']:>9.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
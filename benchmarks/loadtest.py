@@ -0,0 +1,252 @@
+"""
+Concurrent-client load test for the MCP server.
+
+Spawns N simulated agents. Each one is an MCP client driving its own `server.py` over stdio,
+the way one server runs per agent host, and all servers share one temporary data directory.
+With `--transport streamable-http` all clients share one long-lived server instead.
+The hashing embedding backend keeps it offline. Each client calls tools drawn from a
+weighted mix at a target rate. The report gives throughput, p50/p99 latency and error
+rate per tool, lock-retry exhaustion (tool errors caused by tenacity giving up on a locked
+SQLite database), and the retry counts reported by the servers' metrics resource.
+
+Usage (from the repository root):
+    python -m benchmarks.loadtest --clients 8 --duration 60 --mix store_insight=2,recall_context=6,audit_codebase=1
+    python -m benchmarks.loadtest --clients 8 --transport streamable-http
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import collections
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from mcp import ClientSession
+from mcp.client.stdio import stdio_client, StdioServerParameters
+from mcp.client.streamable_http import streamablehttp_client
+
+from benchmarks.suite import build_tree, percentile
+
+TOOLS = ("store_insight", "recall_context", "critique_code", "audit_codebase")
+QUERIES = ["print", "snake_case", "logging conventions", "how are errors handled", "type hints", "api handlers"]
+SNIPPET = "def handler(request):\n    print(request)\n    return {'ok': True}\n"
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in TOOLS:
+            raise ValueError(f"Unknown tool in mix: {name} (choose from {', '.join(TOOLS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def tool_arguments(tool: str, workbase_path: str, client_id: int, rng: random.Random) -> dict:
+    if tool == "store_insight":
+        return {
+            "content": f"Client {client_id} rule {rng.randrange(10 ** 6)}: prefer {rng.choice(QUERIES)}",
+            "category": rng.choice(["coding_style", "architecture", "constraints"]),
+            "workbase_id": workbase_path,
+            "force": True
+        }
+    if tool == "recall_context":
+        return {"query": rng.choice(QUERIES), "workbase_id": workbase_path}
+    if tool == "critique_code":
+        return {"code_snippet": SNIPPET, "workbase_id": workbase_path}
+    return {"directory_path": workbase_path}
+
+
+def decode(result) -> dict:
+    """Tool results are JSON objects serialized as text content."""
+    try:
+        return json.loads(result.content[0].text)
+    except Exception:
+        return {}
+
+
+async def run_client(client_id: int, args, env: dict, workbase_path: str, deadline: float, samples: list,
+                     server_metrics: list, ready: asyncio.Event):
+    rng = random.Random(args.seed + client_id)
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    if args.transport == "stdio":
+        params = StdioServerParameters(command=sys.executable, args=[str(ROOT / "server.py")], env=env, cwd=str(ROOT))
+        transport = stdio_client(params)
+    else:
+        transport = streamablehttp_client(f"http://127.0.0.1:{args.port}/mcp")
+
+    if client_id:
+        await ready.wait()
+    try:
+        async with transport as (read, write, *_):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                await session.call_tool("initialize_workbase", {"root_path": workbase_path})
+                ready.set()
+
+                interval = 1.0 / args.rate if args.rate > 0 else 0.0
+                next_call = time.monotonic()
+                while time.monotonic() < deadline:
+                    tool = rng.choices(names, weights)[0]
+                    start = time.perf_counter()
+                    try:
+                        result = await session.call_tool(tool, tool_arguments(tool, workbase_path, client_id, rng))
+                        payload = decode(result)
+                        error = result.isError or payload.get("status") == "error"
+                        message = payload.get("message", "") if error else ""
+                    except Exception as e:
+                        error, message = True, str(e)
+                    samples.append({
+                        "client": client_id, "tool": tool, "ms": (time.perf_counter() - start) * 1000,
+                        "error": bool(error), "retry_exhausted": "RetryError" in message, "message": message[:200]
+                    })
+                    if interval:
+                        next_call += interval
+                        await asyncio.sleep(max(0.0, next_call - time.monotonic()))
+
+                try:
+                    resource = await session.read_resource("mybrain://metrics")
+                    server_metrics.append(json.loads(resource.contents[0].text))
+                except Exception as e:
+                    print(f"client {client_id}: could not read server metrics: {e}", file=sys.stderr)
+    except Exception as e:
+        # A server that dies (e.g. during start-up) fails its client, not the whole run
+        ready.set()
+        print(f"client {client_id}: server connection failed: {e!r}", file=sys.stderr)
+        samples.append({"client": client_id, "tool": "connection", "ms": 0.0, "error": True,
+                        "retry_exhausted": False, "message": f"connection failed: {e!r}"[:200]})
+
+
+def start_shared_server(args, env: dict) -> subprocess.Popen:
+    """One streamable-HTTP server for every client; returns once /health answers."""
+    server = subprocess.Popen(
+        [sys.executable, str(ROOT / "server.py"), "--transport", "streamable-http", "--port", str(args.port)],
+        env=env, cwd=str(ROOT)
+    )
+    deadline = time.monotonic() + args.startup_seconds + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Shared server exited with status {server.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{args.port}/health", timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Shared server did not start in time")
+
+
+def summarize(samples: list, server_metrics: list, elapsed: float) -> dict:
+    by_tool = collections.defaultdict(list)
+    for s in samples:
+        by_tool[s["tool"]].append(s)
+
+    tools = {}
+    for tool, calls in sorted(by_tool.items()):
+        latencies = [c["ms"] for c in calls]
+        errors = sum(c["error"] for c in calls)
+        tools[tool] = {
+            "calls": len(calls),
+            "calls_per_second": round(len(calls) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.5), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "error_rate": round(errors / len(calls), 4),
+            "retry_exhausted": sum(c["retry_exhausted"] for c in calls)
+        }
+
+    retries = sum(
+        c["value"] for m in server_metrics for c in m.get("counters", []) if c["name"] == "mybrain_retries_total"
+    )
+    errors = [s for s in samples if s["error"]]
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "calls": len(samples),
+        "calls_per_second": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(len(errors) / len(samples), 4) if samples else 0.0,
+        "retry_exhausted": sum(s["retry_exhausted"] for s in samples),
+        "lock_retries": retries,
+        "tools": tools,
+        "sample_errors": sorted({e["message"] for e in errors})[:10]
+    }
+
+
+async def run(args) -> dict:
+    data_dir = Path(args.data_dir) if args.data_dir else Path(tempfile.mkdtemp(prefix="mybrain_load_"))
+    tree = Path(tempfile.mkdtemp(prefix="mybrain_load_tree_"))
+    build_tree(tree, args.tree_files, args.seed)
+
+    env = {
+        **os.environ,
+        "MYBRAIN_DATA_DIR": str(data_dir),
+        "MYBRAIN_EMBEDDING_BACKEND": "hashing",
+        "ANONYMIZED_TELEMETRY": "False",
+        "MYBRAIN_METRICS_EXPORT_INTERVAL": "1"
+    }
+    server = start_shared_server(args, env) if args.transport != "stdio" else None
+    samples, server_metrics = [], []
+    # Over stdio the first server creates the data directory alone (Chroma's first-run setup is
+    # not safe to race); the others start once it is up. The load window covers start-up as well.
+    ready = asyncio.Event()
+    deadline = time.monotonic() + args.duration + args.startup_seconds
+    start = time.monotonic()
+    try:
+        await asyncio.gather(*[
+            run_client(i, args, env, str(tree), deadline, samples, server_metrics, ready) for i in range(args.clients)
+        ])
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    elapsed = time.monotonic() - start
+    if server is not None:
+        server_metrics = server_metrics[:1]  # every client read the same process's counters
+    return summarize(samples, server_metrics, elapsed)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent MCP clients (one server process each).")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load per client.")
+    parser.add_argument("--rate", type=float, default=0, help="Target calls/second per client (0 = closed loop).")
+    parser.add_argument("--mix", default="store_insight=2,recall_context=6,critique_code=1,audit_codebase=1",
+                        help="Weighted tool mix, e.g. store_insight=2,recall_context=6.")
+    parser.add_argument("--tree-files", type=int, default=200, help="Files in the synthetic tree audited by clients.")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http"], default="stdio",
+                        help="stdio: one server per client; streamable-http: one shared server.")
+    parser.add_argument("--port", type=int, default=8766, help="Port of the shared server (streamable-http).")
+    parser.add_argument("--startup-seconds", type=float, default=5, help="Allowance for server start-up.")
+    parser.add_argument("--data-dir", help="Data directory (default: a new temporary directory).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args(argv)
+    parse_mix(args.mix)
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"{report['calls']} calls in {report['elapsed_seconds']}s "
+          f"({report['calls_per_second']} calls/s), error rate {report['error_rate']:.2%}")
+    print(f"lock retries: {report['lock_retries']}, retry exhaustion: {report['retry_exhausted']}")
+    print(f"\n{'tool':<18} {'calls':>7} {'calls/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'errors':>8} {'exhausted':>10}")
+    for tool, t in report["tools"].items():
+        print(f"{tool:<18} {t['calls']:>7} {t['calls_per_second']:>8} {t['p50_ms']:>9} {t['p99_ms']:>9} "
+              f"{t['error_rate']:>8.2%} {t['retry_exhausted']:>10}")
+    for message in report["sample_errors"]:
+        print(f"  error: {message}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+Reproducible benchmark suite for BrainDB, the analyzer and the observer.
+
+Builds a synthetic brain (memories spread over N workbases) and a synthetic source tree in
+a temporary data directory, with the deterministic hashing embedding backend so it runs
+offline. Measures bulk-load and add throughput, search / check_conflict latency, export / import
+throughput, scan_structure / detect_style time and full vs steady-state audit / observer
+scans. Results are written as JSON and can be compared against a baseline run.
+
+Usage (from the repository root):
+    python -m benchmarks.suite --memories 5000 --workbases 4 --output bench.json
+    python -m benchmarks.suite --output new.json --baseline bench.json --fail-on-regression
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import platform
+import argparse
+import tempfile
+import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# core modules read their configuration at import time: they are imported in run(), after
+# configure_environment() has pointed them at the temporary data directory.
+
+CATEGORIES = ["coding_style", "architecture", "constraints", "naming", "testing", "tooling"]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def configure_environment(data_dir: Path):
+    """Point myBrAIn at a throwaway data dir with offline embeddings. Must run before importing core."""
+    os.environ["MYBRAIN_DATA_DIR"] = str(data_dir)
+    os.environ["MYBRAIN_EMBEDDING_BACKEND"] = "hashing"
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+    # Benchmarks measure raw scan cost, not the observer's throttling
+    os.environ["MYBRAIN_OBSERVER_FILES_PER_SECOND"] = "0"
+    os.environ["MYBRAIN_OBSERVER_CPU_BUDGET"] = "0"
+    os.environ["MYBRAIN_OBSERVER_NICE"] = "0"
+
+
+def build_tree(root: Path, files: int, seed: int = 0):
+    """Synthetic source tree: nested packages of small Python/TypeScript files, some with print()."""
+    rng = random.Random(seed)
+    for i in range(files):
+        package = root / f"pkg{i % 20}" / f"sub{(i // 20) % 5}"
+        package.mkdir(parents=True, exist_ok=True)
+        if i % 3 == 0:
+            body = "export function handler" + str(i) + "() {\n  return " + str(i) + ";\n}\n"
+            (package / f"module_{i}.ts").write_text(body)
+        else:
+            lines = [f"def function_{i}_{j}(value):\n    return value * {j}\n" for j in range(rng.randint(3, 12))]
+            if rng.random() < 0.2:
+                lines.append("print('debug')\n")
+            (package / f"module_{i}.py").write_text("\n".join(lines))
+    (root / "node_modules" / "ignored").mkdir(parents=True, exist_ok=True)
+    (root / "node_modules" / "ignored" / "index.js").write_text("console.log(1)\n")
+
+
+def run(args) -> dict:
+    from core.db import BrainDB
+    from core.analyzer import ProjectAnalyzer
+    from core.observer import SilentObserver
+    from core import config
+    from benchmarks.embedding_backends import synthetic_corpus
+
+    results = {}
+
+    def record(name, value, unit, better):
+        results[name] = {"value": round(value, 6), "unit": unit, "better": better}
+
+    tree = Path(tempfile.mkdtemp(prefix="mybrain_tree_"))
+    build_tree(tree, args.tree_files, args.seed)
+
+    analyzer = ProjectAnalyzer()
+    db = BrainDB()
+    workbases = [analyzer.get_workbase_id(tree)] + [
+        hashlib.sha256(f"bench-{i}".encode()).hexdigest() for i in range(1, args.workbases)
+    ]
+    corpus = synthetic_corpus(args.memories, args.seed)
+    rng = random.Random(args.seed)
+
+    def memory(i, text):
+        wb = workbases[i % len(workbases)]
+        return {
+            "id": f"rule_{wb}_{hashlib.md5(text.encode()).hexdigest()}",
+            "document": text,
+            "metadata": {"workbase_id": wb, "type": "rule", "category": CATEGORIES[i % len(CATEGORIES)],
+                         "project_name": tree.name if wb == workbases[0] else f"bench-{i % len(workbases)}",
+                         "root_path": str(tree) if wb == workbases[0] else ""}
+        }
+
+    # --- bulk load (batched upserts through import) ---
+    start = time.perf_counter()
+    for offset in range(0, len(corpus), args.batch_size):
+        batch = [memory(offset + i, text) for i, text in enumerate(corpus[offset:offset + args.batch_size])]
+        db.import_memory_from_json(json.dumps(batch))
+    record("bulk_load_memories_per_second", len(corpus) / (time.perf_counter() - start), "memories/s", "higher")
+
+    # --- single add_memory throughput (one embedding + upsert + registry update per call) ---
+    sample = synthetic_corpus(args.add_sample, args.seed + 1)
+    start = time.perf_counter()
+    for i, text in enumerate(sample):
+        item = memory(i, f"{text} (added)")
+        db.add_memory(item["id"], item["document"], item["metadata"])
+    record("add_memories_per_second", len(sample) / (time.perf_counter() - start), "memories/s", "higher")
+
+    db.add_memory(f"rule_{workbases[0]}_noprint", "no print statements in library code",
+                  {"workbase_id": workbases[0], "type": "rule", "category": "constraints"})
+
+    # --- search / check_conflict latency ---
+    queries = [rng.choice(corpus) for _ in range(args.queries // 2)]
+    queries += [rng.choice(["print", "snake_case", "logging", "type hints", "pytest fixtures"]) for _ in range(args.queries - len(queries))]
+    for name, call in (
+        ("search", lambda q, wb: db.search(q, wb, limit=5)),
+        ("check_conflict", lambda q, wb: db.check_conflict(q, wb)),
+    ):
+        for wb in workbases:
+            call(queries[0], wb)  # warm per-workbase caches (exact matrix, BM25 index)
+        latencies = []
+        for i, q in enumerate(queries):
+            wb = workbases[i % len(workbases)]
+            start = time.perf_counter()
+            call(q, wb)
+            latencies.append((time.perf_counter() - start) * 1000)
+        record(f"{name}_p50_ms", percentile(latencies, 0.5), "ms", "lower")
+        record(f"{name}_p99_ms", percentile(latencies, 0.99), "ms", "lower")
+
+    # --- export / import throughput ---
+    start = time.perf_counter()
+    exported = json.loads(db.export_memory_to_json(workbases[0]))
+    record("export_memories_per_second", len(exported) / max(time.perf_counter() - start, 1e-9), "memories/s", "higher")
+
+    target = hashlib.sha256(b"bench-import").hexdigest()
+    start = time.perf_counter()
+    imported = 0
+    for offset in range(0, len(exported), args.batch_size):
+        imported += db.import_memory_from_json(
+            json.dumps(exported[offset:offset + args.batch_size]),
+            target_workbase_id=target, target_project_name="bench-import"
+        )
+    record("import_memories_per_second", imported / max(time.perf_counter() - start, 1e-9), "memories/s", "higher")
+
+    # --- analyzer ---
+    start = time.perf_counter()
+    analyzer.scan_structure(tree)
+    record("scan_structure_seconds", time.perf_counter() - start, "s", "lower")
+    start = time.perf_counter()
+    analyzer.detect_style(tree)
+    record("detect_style_seconds", time.perf_counter() - start, "s", "lower")
+
+    # --- audit_codebase: first (cold) call vs steady state ---
+    import server
+    server.db = db
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        server.audit_codebase(str(tree))
+        timings.append(time.perf_counter() - start)
+    record("audit_full_seconds", timings[0], "s", "lower")
+    record("audit_steady_seconds", min(timings[1:]), "s", "lower")
+
+    # --- observer: first cycle vs steady state (unchanged files are skipped) ---
+    observer = SilentObserver(config.BASE_DATA_DIR, {"workbase_id": workbases[0], "root_path": str(tree)})
+    observer.db = db
+    start = time.perf_counter()
+    observer._perform_scan()
+    record("observer_full_cycle_seconds", time.perf_counter() - start, "s", "lower")
+    start = time.perf_counter()
+    observer._perform_scan()
+    record("observer_steady_cycle_seconds", time.perf_counter() - start, "s", "lower")
+
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Per-metric relative change vs the baseline; a change beyond `tolerance` in the bad direction is a regression."""
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or not previous["value"]:
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        worse = change > tolerance if current["better"] == "lower" else change < -tolerance
+        rows.append({"metric": name, "baseline": previous["value"], "current": current["value"],
+                     "change": round(change, 4), "regression": worse})
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memories", type=int, default=2000, help="Synthetic memories (1k-1M).")
+    parser.add_argument("--add-sample", type=int, default=500, help="Memories added one by one with add_memory.")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Batch size for the bulk load.")
+    parser.add_argument("--workbases", type=int, default=4, help="Workbases the memories are spread across.")
+    parser.add_argument("--tree-files", type=int, default=500, help="Files in the synthetic source tree.")
+    parser.add_argument("--queries", type=int, default=200, help="Queries for latency measurements.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results JSON to this file.")
+    parser.add_argument("--baseline", help="Results JSON of a previous run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Relative change counted as a regression.")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on regressions.")
+    args = parser.parse_args(argv)
+
+    data_dir = Path(tempfile.mkdtemp(prefix="mybrain_bench_"))
+    configure_environment(data_dir)
+    results = run(args)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "memories": args.memories, "add_sample": args.add_sample, "workbases": args.workbases,
+            "tree_files": args.tree_files, "queries": args.queries, "seed": args.seed
+        },
+        "results": results
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    print(f"{'metric':<32} {'value':>14} unit")
+    for name, r in results.items():
+        print(f"{name:<32} {r['value']:>14.4f} {r['unit']}")
+
+    if not args.baseline:
+        return 0
+    baseline = json.loads(Path(args.baseline).read_text())["results"]
+    rows = compare(results, baseline, args.tolerance)
+    print(f"\n{'metric':<32} {'baseline':>12} {'current':>12} {'change':>8}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:<32} {row['baseline']:>12.4f} {row['current']:>12.4f} {row['change']:>+8.1%}{flag}")
+    regressions = [r for r in rows if r["regression"]]
+    print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}.")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+import argparse
+import json
+import sys
+
+from core.analyzer import ProjectAnalyzer
+
+
+def cmd_consolidate(args) -> int:
+    from core.db import BrainDB
+
+    db = BrainDB()
+    workbase_id = ProjectAnalyzer().get_workbase_id(args.workbase)
+    report = db.consolidate_workbase(workbase_id, threshold=args.threshold, apply=args.apply)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    for cluster in report["clusters"]:
+        print(f"KEEP   {cluster['keep']} [{cluster['type']}/{cluster['category']}]: {cluster['keep_text'][:80]}")
+        for dup in cluster["remove"]:
+            print(f"  MERGE {dup['id']} (sim {dup['similarity']:.3f}): {dup['text'][:70]}")
+
+    verb = "Removed" if report["applied"] else "Would remove"
+    print(
+        f"{len(report['clusters'])} clusters. {verb} {report['removed']} memories: "
+        f"{report['memories_before']} -> {report['memories_after']} "
+        f"({report['index_shrink_pct']}% smaller index)."
+    )
+    return 0
+
+
+def cmd_registry_rebuild(args) -> int:
+    from core.db import BrainDB
+
+    db = BrainDB()
+    db.rebuild_registry()
+    for wb in db.get_known_workbases():
+        print(f"{wb['workbase_id'][:12]}  {wb['project_name']:<30} {wb['root_path']}")
+    return 0
+
+
+def cmd_shard_migrate(args) -> int:
+    from core.db import BrainDB
+
+    db = BrainDB()
+
+    def progress(moved, total):
+        print(f"  moved {moved}/{total}", file=sys.stderr)
+
+    result = db.migrate_to_shards(batch_size=args.batch_size, progress=progress)
+    print(f"Moved {result['moved']} memories into {result['workbases']} workbase collections "
+          f"({result['skipped']} without workbase left in the shared collection).")
+    return 0
+
+
+def _chunk_progress(done, total):
+    print(f"  {done}/{total}", file=sys.stderr)
+
+
+def cmd_delete_workbase(args) -> int:
+    from core.db import BrainDB
+
+    db = BrainDB()
+    workbase_id = ProjectAnalyzer().get_workbase_id(args.workbase)
+    removed = db.delete_workbase(workbase_id, batch_size=args.batch_size, progress=_chunk_progress)
+    print(f"Deleted {removed} memories of {workbase_id[:12]}.")
+    return 0
+
+
+def cmd_rename_workbase(args) -> int:
+    from core.db import BrainDB
+
+    db = BrainDB()
+    workbase_id = ProjectAnalyzer().get_workbase_id(args.workbase)
+    rewritten = db.rename_workbase(workbase_id, project_name=args.name, root_path=args.root_path,
+                                   batch_size=args.batch_size, progress=_chunk_progress)
+    print(f"Renamed {workbase_id[:12]} ({rewritten} memories rewritten).")
+    return 0
+
+
+def cmd_move_workbase(args) -> int:
+    from core.db import BrainDB
+
+    db = BrainDB()
+    analyzer = ProjectAnalyzer()
+    old_id = analyzer.get_workbase_id(args.workbase)
+    new_id = analyzer.get_workbase_id(args.new_root)
+    moved = db.move_workbase(old_id, new_id, project_name=args.name, root_path=args.new_root,
+                             batch_size=args.batch_size, progress=_chunk_progress)
+    print(f"Moved {moved} memories from {old_id[:12]} to {new_id[:12]}.")
+    return 0
+
+
+def cmd_shards(args) -> int:
+    from core.db import BrainDB
+
+    db = BrainDB()
+    names = {wb["workbase_id"]: wb["project_name"] for wb in db.get_known_workbases()}
+    for shard in db.list_shards():
+        wb_id = shard["workbase_id"]
+        label = f"{names.get(wb_id, 'Unknown')} ({wb_id[:12]})" if wb_id else "(shared)"
+        print(f"{shard['collection']:<60} {shard['count']:>8}  {label}")
+    return 0
+
+
+def _int_list(value: str):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def cmd_tune_hnsw(args) -> int:
+    from core.db import BrainDB
+    from core.tuning import tune_hnsw
+
+    db = BrainDB()
+    workbase_id = ProjectAnalyzer().get_workbase_id(args.workbase) if args.workbase else None
+    embeddings = db.sample_embeddings(workbase_id, limit=args.limit)
+    print(f"Tuning on {embeddings.shape[0]} embeddings ({args.queries} held-out queries, k={args.k})...",
+          file=sys.stderr)
+
+    results = tune_hnsw(
+        embeddings,
+        m_values=args.m,
+        construction_ef_values=args.construction_ef,
+        search_ef_values=args.search_ef,
+        k=args.k,
+        num_queries=args.queries
+    )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"{'M':>4} {'constr_ef':>10} {'search_ef':>10} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8}")
+    for r in results:
+        print(f"{r['M']:>4} {r['construction_ef']:>10} {r['search_ef']:>10} {r['recall_at_k']:>9.4f} "
+              f"{r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['build_seconds']:>8.2f}")
+    print("Apply a setting with MYBRAIN_HNSW_M / MYBRAIN_HNSW_CONSTRUCTION_EF / MYBRAIN_HNSW_SEARCH_EF "
+          "and `python cli.py rebuild-index`.")
+    return 0
+
+
+def cmd_rebuild_index(args) -> int:
+    from core.db import BrainDB
+
+    # Re-embedding is how a brain moves to another backend, so the backend check is skipped
+    db = BrainDB(check_embedding_space=not args.reembed)
+
+    def progress(name, copied, total):
+        print(f"  {name}: {copied}/{total}", file=sys.stderr)
+
+    for report in db.rebuild_index(batch_size=args.batch_size, progress=progress, reembed=args.reembed):
+        print(f"Rebuilt {report['collection']} ({report['memories']} memories): "
+              f"M={report['after']['hnsw:M']} construction_ef={report['after']['hnsw:construction_ef']} "
+              f"search_ef={report['after']['hnsw:search_ef']}")
+    return 0
+
+
+def cmd_migrate(args) -> int:
+    from core.db import BrainDB
+
+    db = BrainDB()
+    if not args.status:
+        def progress(migrated):
+            print(f"  upgraded {migrated}", file=sys.stderr)
+
+        report = db.migrate_schema(batch_size=args.batch_size, progress=progress)
+        print(f"Upgraded {report['migrated']} memories to schema v{report['target']}.")
+
+    status = db.get_migration_status()
+    print(f"Schema v{status['schema_version']}: {status['pending']} memories pending, "
+          f"last run {status.get('state', 'never')} ({status.get('migrated', 0)} upgraded).")
+    return 0
+
+
+def cmd_retention(args) -> int:
+    from core.db import BrainDB
+    from core.retention import parse_age_rules, retention_policy
+
+    db = BrainDB()
+    age_rules, keep_latest = retention_policy()
+    if args.days:
+        age_rules = parse_age_rules(args.days)
+    if args.keep_latest:
+        keep_latest = [t.strip() for t in args.keep_latest.split(",") if t.strip()]
+    if not age_rules and not keep_latest:
+        print("No retention policy configured (MYBRAIN_RETENTION_DAYS / MYBRAIN_RETENTION_KEEP_LATEST).")
+        return 0
+
+    report = db.apply_retention(age_rules, keep_latest, dry_run=not args.apply)
+    verb = "Removed" if args.apply else "Would remove"
+    for rule, count in report["rules"].items():
+        print(f"  {rule:<30} {count:>8} expired")
+    print(f"{verb} {report['expired']} expired and {report['superseded']} superseded memories.")
+    return 0
+
+
+def cmd_compact(args) -> int:
+    from core.db import BrainDB
+
+    db = BrainDB()
+
+    def progress(name, copied, total):
+        print(f"  {name}: {copied}/{total}", file=sys.stderr)
+
+    report = db.compact(samples=args.samples, batch_size=args.batch_size, progress=progress)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    mb = 1024 * 1024
+    print(f"Disk: {report['bytes_before'] / mb:.1f} MB -> {report['bytes_after'] / mb:.1f} MB "
+          f"({report['bytes_reclaimed'] / mb:.1f} MB reclaimed)")
+    before, after = report["latency_before"], report["latency_after"]
+    print(f"Query latency: p50 {before['p50_ms']} -> {after['p50_ms']} ms, "
+          f"p99 {before['p99_ms']} -> {after['p99_ms']} ms ({after['queries']} queries)")
+    return 0
+
+
+def cmd_quantize_onnx(args) -> int:
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(args.model, args.output, weight_type=QuantType.QInt8)
+    print(f"Wrote int8-quantized model to {args.output}. "
+          f"Use it with MYBRAIN_EMBEDDING_BACKEND=onnx MYBRAIN_ONNX_MODEL_FILE=<file name>.")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="myBrAIn maintenance commands.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("consolidate", help="Find and merge near-duplicate memories in a workbase.")
+    p.add_argument("workbase", help="Workbase root path or workbase id.")
+    p.add_argument("--threshold", type=float, default=None, help="Minimum cosine similarity to merge.")
+    p.add_argument("--apply", action="store_true", help="Apply merges (default is a dry run).")
+    p.add_argument("--json", action="store_true", help="Print the full report as JSON.")
+    p.set_defaults(func=cmd_consolidate)
+
+    p = sub.add_parser("registry-rebuild", help="Recompute the workbase registry from the memory collection.")
+    p.set_defaults(func=cmd_registry_rebuild)
+
+    p = sub.add_parser("shard-migrate", help="Split the shared collection into per-workbase collections.")
+    p.add_argument("--batch-size", type=int, default=None, help="Memories moved per batch.")
+    p.set_defaults(func=cmd_shard_migrate)
+
+    p = sub.add_parser("delete-workbase", help="Delete every memory of a workbase in chunks.")
+    p.add_argument("workbase", help="Workbase root path or workbase id.")
+    p.add_argument("--batch-size", type=int, default=None, help="Memories deleted per chunk.")
+    p.set_defaults(func=cmd_delete_workbase)
+
+    p = sub.add_parser("rename-workbase", help="Change a workbase's project name and/or root path (same id).")
+    p.add_argument("workbase", help="Workbase root path or workbase id.")
+    p.add_argument("--name", default=None, help="New project name.")
+    p.add_argument("--root-path", default=None, help="New root path stored on the workbase.")
+    p.add_argument("--batch-size", type=int, default=None, help="Memories rewritten per chunk.")
+    p.set_defaults(func=cmd_rename_workbase)
+
+    p = sub.add_parser("move-workbase", help="Re-key a workbase to a new project directory (keeps embeddings).")
+    p.add_argument("workbase", help="Old workbase root path or workbase id.")
+    p.add_argument("new_root", help="New project root path (determines the new workbase id).")
+    p.add_argument("--name", default=None, help="New project name.")
+    p.add_argument("--batch-size", type=int, default=None, help="Memories moved per chunk.")
+    p.set_defaults(func=cmd_move_workbase)
+
+    p = sub.add_parser("shards", help="List memory collections and their sizes.")
+    p.set_defaults(func=cmd_shards)
+
+    p = sub.add_parser("tune-hnsw", help="Benchmark HNSW settings: recall@k vs. latency against exact search.")
+    p.add_argument("--workbase", default=None, help="Tune on one workbase (path or id) instead of the whole brain.")
+    p.add_argument("--k", type=int, default=10, help="Neighbours per query for recall@k.")
+    p.add_argument("--queries", type=int, default=100, help="Held-out queries.")
+    p.add_argument("--limit", type=int, default=20000, help="Maximum embeddings sampled.")
+    p.add_argument("--m", type=_int_list, default=[8, 16, 32], help="Comma-separated M values.")
+    p.add_argument("--construction-ef", type=_int_list, default=[100, 200], help="Comma-separated construction_ef values.")
+    p.add_argument("--search-ef", type=_int_list, default=[10, 50, 100], help="Comma-separated search_ef values.")
+    p.add_argument("--json", action="store_true", help="Print results as JSON.")
+    p.set_defaults(func=cmd_tune_hnsw)
+
+    p = sub.add_parser("rebuild-index", help="Recreate collections with the configured HNSW parameters.")
+    p.add_argument("--batch-size", type=int, default=None, help="Memories copied per batch.")
+    p.add_argument("--reembed", action="store_true",
+                   help="Re-embed every memory with the configured backend (required after changing it).")
+    p.set_defaults(func=cmd_rebuild_index)
+
+    p = sub.add_parser("migrate", help="Upgrade stored metadata to the current schema version.")
+    p.add_argument("--batch-size", type=int, default=None, help="Memories upgraded per batch.")
+    p.add_argument("--status", action="store_true", help="Only report migration progress.")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("retention", help="Apply the retention policy (dry run unless --apply).")
+    p.add_argument("--days", default=None, help="Override MYBRAIN_RETENTION_DAYS, e.g. context:agent=30.")
+    p.add_argument("--keep-latest", default=None, help="Override MYBRAIN_RETENTION_KEEP_LATEST, e.g. context.")
+    p.add_argument("--apply", action="store_true", help="Delete (default is a dry run).")
+    p.set_defaults(func=cmd_retention)
+
+    p = sub.add_parser("compact", help="Rebuild indexes and VACUUM SQLite; reports space and latency (stop the server first).")
+    p.add_argument("--samples", type=int, default=50, help="Stored vectors per collection used to measure query latency.")
+    p.add_argument("--batch-size", type=int, default=None, help="Memories copied per batch while rebuilding.")
+    p.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    p.set_defaults(func=cmd_compact)
+
+    p = sub.add_parser("quantize-onnx", help="Write an int8 dynamically-quantized copy of an ONNX embedding model.")
+    p.add_argument("model", help="Path to the fp32 model.onnx.")
+    p.add_argument("output", help="Path of the quantized model (e.g. model_quantized.onnx).")
+    p.set_defaults(func=cmd_quantize_onnx)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,11 @@
-import os
+import ast
 import hashlib
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Union
 import collections
 
 from core import config
+from core.walker import ParallelWalker, suffix_filter
 
 class ProjectAnalyzer:
     def __init__(self):
@@ -48,67 +49,91 @@ class ProjectAnalyzer:
         tree_lines = []
         count = 0
         
-        # Sort for determinism
-        for root, dirs, files in os.walk(root_path):
-            # Resolve root to Path object and handle symlinks as requested
-            curr_root = Path(root).resolve()
-            
-            # Skip if we escaped the root
-            if not str(curr_root).startswith(str(root_path)):
-                continue
+        # The walker yields sorted listings in pre-order (deterministic) and skips ignored dirs
+        # and symlinked directories, so the tree never escapes the root
+        binary_filter = suffix_filter(self.binary_extensions, exclude=True)
+        with ParallelWalker(root_path, self.ignored_dirs, file_filter=binary_filter) as walker:
+            for curr_root, _, files in walker:
+                level = len(curr_root.relative_to(root_path).parts)
+                indent = "  " * level
 
-            # In-place modification of dirs to skip ignored ones
-            dirs[:] = sorted([d for d in dirs if d not in self.ignored_dirs])
-            files = sorted(files)
+                if curr_root == root_path:
+                    tree_lines.append(f"{curr_root.name}/")
+                else:
+                    tree_lines.append(f"{indent}{curr_root.name}/")
 
-            level = len(curr_root.relative_to(root_path).parts)
-            indent = "  " * level
-            
-            if curr_root == root_path:
-                tree_lines.append(f"{curr_root.name}/")
-            else:
-                tree_lines.append(f"{indent}{curr_root.name}/")
-            
-            count += 1
-            if count >= config.MAX_TREE_LINES:
-                break
-
-            sub_indent = "  " * (level + 1)
-            for f in files:
-                file_path = curr_root / f
-                if file_path.suffix.lower() not in self.binary_extensions:
-                    if file_path.stat().st_size <= config.MAX_FILE_SIZE_BYTES:
-                        tree_lines.append(f"{sub_indent}{f}")
+                count += 1
+                if count >= config.MAX_TREE_LINES:
+                    break
+
+                sub_indent = "  " * (level + 1)
+                for f in files:
+                    if f.size <= config.MAX_FILE_SIZE_BYTES:
+                        tree_lines.append(f"{sub_indent}{f.name}")
                         count += 1
-                
+
+                    if count >= config.MAX_TREE_LINES:
+                        break
+
                 if count >= config.MAX_TREE_LINES:
                     break
-            
-            if count >= config.MAX_TREE_LINES:
-                break
-                
+
         return "\n".join(tree_lines)
 
+    def scan_structure_chunks(self, root_path: Path) -> List[Dict[str, str]]:
+        """
+        Split the project tree into per-directory chunks small enough to embed whole.
+        Each directory up to STRUCTURE_CHUNK_DEPTH gets a chunk listing its subdirectories and
+        files; deeper directories (and any beyond STRUCTURE_MAX_CHUNKS) are folded into their
+        nearest chunked ancestor as relative paths. A chunk lists at most STRUCTURE_CHUNK_LINES
+        entries. Returns [{"path", "text", "content_hash"}] in deterministic (sorted pre-order) order.
+        """
+        entries: Dict[tuple, List[str]] = {}
+        owner_of: Dict[tuple, tuple] = {}
+        binary_filter = suffix_filter(self.binary_extensions, exclude=True)
+        with ParallelWalker(root_path, self.ignored_dirs, file_filter=binary_filter) as walker:
+            for directory, dirs, files in walker:
+                parts = directory.relative_to(root_path).parts
+                if not parts or (len(parts) <= config.STRUCTURE_CHUNK_DEPTH
+                                 and len(entries) < config.STRUCTURE_MAX_CHUNKS):
+                    owner = parts
+                    entries[owner] = [f"{d}/" for d in dirs]
+                else:
+                    owner = owner_of[parts[:-1]]
+                owner_of[parts] = owner
+
+                prefix = "/".join(parts[len(owner):])
+                entries[owner].extend(
+                    f"{prefix}/{f.name}" if prefix else f.name
+                    for f in files if f.size <= config.MAX_FILE_SIZE_BYTES
+                )
+
+        chunks = []
+        for parts, lines in entries.items():
+            path = "/".join(parts) or "."
+            shown = lines[:config.STRUCTURE_CHUNK_LINES]
+            if len(lines) > len(shown):
+                shown.append(f"... ({len(lines) - len(shown)} more)")
+            header = f"Directory {'/'.join((root_path.name,) + parts)}/ of project {root_path.name}:"
+            text = "\n".join([header] + shown)
+            chunks.append({
+                "path": path,
+                "text": text,
+                "content_hash": hashlib.md5(text.encode("utf-8")).hexdigest()
+            })
+        return chunks
+
     def detect_style(self, root_path: Path) -> Dict[str, str]:
         """Infer coding style (indentation and naming convention) from sample files."""
         indentation = "unknown"
         naming = "unknown"
         
         sample_files = []
-        for root, _, files in os.walk(root_path):
-            curr_root = Path(root).resolve()
-            # Skip ignored dirs
-            if any(part in self.ignored_dirs for part in curr_root.relative_to(root_path).parts):
-                continue
-                
-            for f in files:
-                file_path = curr_root / f
-                if file_path.suffix.lower() in {".py", ".js", ".ts"}:
-                    sample_files.append(file_path)
-                    if len(sample_files) >= config.MAX_STYLE_SAMPLE_FILES:
-                        break
-            if len(sample_files) >= config.MAX_STYLE_SAMPLE_FILES:
-                break
+        with ParallelWalker(root_path, self.ignored_dirs, file_filter=suffix_filter({".py", ".js", ".ts"})) as walker:
+            for f in walker.files():
+                sample_files.append(f.path)
+                if len(sample_files) >= config.MAX_STYLE_SAMPLE_FILES:
+                    break
 
         if not sample_files:
             return {"indentation": indentation, "naming": naming}
@@ -192,3 +217,47 @@ class ProjectAnalyzer:
         except Exception:
             pass
         return drifts
+
+    def split_code(self, code: str) -> List[Dict[str, Any]]:
+        """
+        Split a code snippet into chunks small enough for the embedding model.
+        Python is split on top-level function/class boundaries (consecutive other statements
+        are grouped); anything else, and oversized chunks, fall back to fixed line windows.
+        Returns dicts with "text", "start_line" and "end_line" (1-based, inclusive).
+        """
+        lines = code.splitlines()
+        window = max(1, config.CRITIQUE_CHUNK_LINES)
+        if len(lines) <= window:
+            return [{"text": code, "start_line": 1, "end_line": max(1, len(lines))}]
+
+        spans = []
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError):
+            tree = None
+
+        if tree is not None and tree.body:
+            pending_start = None
+            for node in tree.body:
+                start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+                end = getattr(node, "end_lineno", None) or start
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    if pending_start is not None:
+                        spans.append((pending_start, start - 1))
+                        pending_start = None
+                    spans.append((start, end))
+                elif pending_start is None:
+                    pending_start = start
+            if pending_start is not None:
+                spans.append((pending_start, len(lines)))
+        else:
+            spans = [(1, len(lines))]
+
+        chunks = []
+        for start, end in spans:
+            for window_start in range(start, end + 1, window):
+                window_end = min(end, window_start + window - 1)
+                text = "\n".join(lines[window_start - 1:window_end])
+                if text.strip():
+                    chunks.append({"text": text, "start_line": window_start, "end_line": window_end})
+        return chunks or [{"text": code, "start_line": 1, "end_line": len(lines)}]
@@ -6,9 +6,54 @@ from pathlib import Path
 
 BASE_DATA_DIR = Path(os.getenv("MYBRAIN_DATA_DIR", "~/mybrain_data")).expanduser().resolve()
 CHROMA_COLLECTION = os.getenv("MYBRAIN_COLLECTION", "mybrain_memory")
+
 EMBEDDING_MODEL = os.getenv("MYBRAIN_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 
-DB_SCHEMA_VERSION = 1
+# Embedding backend: "sentence-transformers" (PyTorch), "onnx" (ONNX Runtime, optionally int8-quantized),
+# "hashing" (deterministic, model-free; for tests and benchmarks) or "remote" (a shared server's model)
+EMBEDDING_BACKEND = os.getenv("MYBRAIN_EMBEDDING_BACKEND", "sentence-transformers")
+EMBEDDING_BATCH_SIZE = int(os.getenv("MYBRAIN_EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_THREADS = int(os.getenv("MYBRAIN_EMBEDDING_THREADS", "0"))  # 0 = library default
+EMBEDDING_MAX_LENGTH = int(os.getenv("MYBRAIN_EMBEDDING_MAX_LENGTH", "256"))
+ONNX_MODEL_PATH = os.getenv("MYBRAIN_ONNX_MODEL_PATH", "")
+ONNX_MODEL_FILE = os.getenv("MYBRAIN_ONNX_MODEL_FILE", "model.onnx")
+HASHING_EMBEDDING_DIM = int(os.getenv("MYBRAIN_HASHING_DIM", "384"))
+# "remote" backend: embed through a shared server (see SERVER_TRANSPORT), so the admin and CLI
+# do not load their own model copy. http://host:port or unix:///path/to/socket
+SERVER_URL = os.getenv("MYBRAIN_SERVER_URL", "http://127.0.0.1:8765")
+REMOTE_EMBEDDING_TIMEOUT = float(os.getenv("MYBRAIN_REMOTE_EMBEDDING_TIMEOUT", "60"))
+
+# Sharding: store each workbase in its own collection (created lazily) instead of one shared collection
+SHARD_BY_WORKBASE = os.getenv("MYBRAIN_SHARD_BY_WORKBASE", "false").lower() in ("1", "true", "yes")
+SHARD_MIGRATION_BATCH_SIZE = int(os.getenv("MYBRAIN_SHARD_MIGRATION_BATCH_SIZE", "1000"))
+
+# HNSW index parameters applied when a collection is created (see `cli.py tune-hnsw` / `rebuild-index`)
+HNSW_M = int(os.getenv("MYBRAIN_HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("MYBRAIN_HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("MYBRAIN_HNSW_SEARCH_EF", "10"))
+HNSW_REBUILD_BATCH_SIZE = int(os.getenv("MYBRAIN_HNSW_REBUILD_BATCH_SIZE", "1000"))
+
+DB_SCHEMA_VERSION = 2
+
+# Bulk workbase operations (delete / rename / move) work in chunks of this many memories
+WORKBASE_BATCH_SIZE = int(os.getenv("MYBRAIN_WORKBASE_BATCH_SIZE", "1000"))
+
+# Retention (opt-in, enforced by a background job in the server; see core/retention.py).
+# MYBRAIN_RETENTION_DAYS: comma-separated "type=days" or "type:source=days",
+#   e.g. "context:agent=30" expires agent-written contexts older than 30 days.
+# MYBRAIN_RETENTION_KEEP_LATEST: types of which only the newest memory per workbase is kept, e.g. "context".
+RETENTION_DAYS = os.getenv("MYBRAIN_RETENTION_DAYS", "")
+RETENTION_KEEP_LATEST = {t.strip() for t in os.getenv("MYBRAIN_RETENTION_KEEP_LATEST", "").split(",") if t.strip()}
+RETENTION_INTERVAL_SECONDS = float(os.getenv("MYBRAIN_RETENTION_INTERVAL", "3600"))
+RETENTION_BATCH_SIZE = int(os.getenv("MYBRAIN_RETENTION_BATCH_SIZE", "500"))
+
+# Schema migrations (core/migrations.py): metadata-only updates in batches of MIGRATION_BATCH_SIZE,
+# pausing MIGRATION_PAUSE_SECONDS between batches so tool calls are not starved
+MIGRATION_BATCH_SIZE = int(os.getenv("MYBRAIN_MIGRATION_BATCH_SIZE", "500"))
+MIGRATION_PAUSE_SECONDS = float(os.getenv("MYBRAIN_MIGRATION_PAUSE", "0.05"))
+
+# SQLite sidecar (under BASE_DATA_DIR) with the workbase registry and materialized counts
+REGISTRY_FILE = os.getenv("MYBRAIN_REGISTRY_FILE", "registry.sqlite3")
 
 DB_LOCK_RETRY_SECONDS = float(os.getenv("MYBRAIN_LOCK_RETRY_SECONDS", "2"))
 DB_LOCK_RETRY_INTERVAL = float(os.getenv("MYBRAIN_LOCK_RETRY_INTERVAL", "0.1"))
@@ -17,9 +62,117 @@ MAX_TREE_LINES = int(os.getenv("MYBRAIN_MAX_TREE_LINES", "200"))
 MAX_FILE_SIZE_BYTES = int(os.getenv("MYBRAIN_MAX_FILE_SIZE", "1000000"))
 MAX_STYLE_SAMPLE_FILES = int(os.getenv("MYBRAIN_MAX_STYLE_SAMPLES", "3"))
 
+# initialize_workbase: besides the root summary (MAX_TREE_LINES tree + style), the structure is
+# stored as one context chunk per directory down to STRUCTURE_CHUNK_DEPTH (deeper directories are
+# folded into their ancestor), at most STRUCTURE_MAX_CHUNKS chunks of STRUCTURE_CHUNK_LINES entries
+STRUCTURE_CHUNK_DEPTH = int(os.getenv("MYBRAIN_STRUCTURE_CHUNK_DEPTH", "3"))
+STRUCTURE_CHUNK_LINES = int(os.getenv("MYBRAIN_STRUCTURE_CHUNK_LINES", "50"))
+STRUCTURE_MAX_CHUNKS = int(os.getenv("MYBRAIN_STRUCTURE_MAX_CHUNKS", "500"))
+
+# core/walker.py: threads fanning out readdir/stat calls in scan_structure, detect_style,
+# audit_codebase and the observer (readdir/stat latency dominates on network/overlay filesystems)
+WALKER_THREADS = int(os.getenv("MYBRAIN_WALKER_THREADS", "8"))  # 0 = scan in the calling thread
+# Directory listings the walker threads may buffer ahead of the consumer
+WALKER_MAX_AHEAD = int(os.getenv("MYBRAIN_WALKER_MAX_AHEAD", "256"))
+
+# Admin UI pagination: number of memories materialized per page in Card View / Grid Editor
+ADMIN_PAGE_SIZE = int(os.getenv("MYBRAIN_ADMIN_PAGE_SIZE", "24"))
+
+# critique_code: snippets longer than this many lines are split (function/class boundaries for
+# Python, line windows otherwise) and each chunk is matched against the rules
+CRITIQUE_CHUNK_LINES = int(os.getenv("MYBRAIN_CRITIQUE_CHUNK_LINES", "60"))
+CRITIQUE_RULES_PER_CHUNK = int(os.getenv("MYBRAIN_CRITIQUE_RULES_PER_CHUNK", "3"))
+
+# recall_context diversity/budget mode: over-fetch RECALL_FETCH_K candidates with their embeddings,
+# re-rank with maximal marginal relevance (RECALL_MMR_LAMBDA: 1 = relevance only, 0 = diversity only)
+# and pack them into the caller's budget (tokens are estimated as characters / CHARS_PER_TOKEN)
+RECALL_FETCH_K = int(os.getenv("MYBRAIN_RECALL_FETCH_K", "30"))
+RECALL_MMR_LAMBDA = float(os.getenv("MYBRAIN_RECALL_MMR_LAMBDA", "0.5"))
+CHARS_PER_TOKEN = float(os.getenv("MYBRAIN_CHARS_PER_TOKEN", "4"))
+# recall_context ranks project-structure memories after the others and returns at most this many
+RECALL_STRUCTURE_CHUNKS = int(os.getenv("MYBRAIN_RECALL_STRUCTURE_CHUNKS", "2"))
+
 # Vector search threshold for semantic conflict detection (lower distance = higher similarity)
 CONFLICT_DISTANCE_THRESHOLD = float(os.getenv("MYBRAIN_CONFLICT_THRESHOLD", "0.5"))
 
+# Exact search: workbases with at most this many memories are searched by brute-force NumPy
+# dot products over an in-memory matrix instead of HNSW (0 disables). Up to
+# EXACT_SEARCH_CACHE_WORKBASES matrices are kept in memory (LRU).
+EXACT_SEARCH_MAX_ITEMS = int(os.getenv("MYBRAIN_EXACT_SEARCH_MAX_ITEMS", "5000"))
+EXACT_SEARCH_CACHE_WORKBASES = int(os.getenv("MYBRAIN_EXACT_SEARCH_CACHE_WORKBASES", "16"))
+
+# Hybrid search: per-workbase BM25 index fused with vector results (reciprocal rank fusion).
+# Queries of at most LEXICAL_MAX_QUERY_WORDS words whose best hit contains every query word and
+# scores at least LEXICAL_CONFIDENT_SCORE are answered lexically, without an embedding call.
+HYBRID_SEARCH = os.getenv("MYBRAIN_HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+LEXICAL_MAX_ITEMS = int(os.getenv("MYBRAIN_LEXICAL_MAX_ITEMS", "100000"))
+LEXICAL_CACHE_WORKBASES = int(os.getenv("MYBRAIN_LEXICAL_CACHE_WORKBASES", "16"))
+LEXICAL_MAX_QUERY_WORDS = int(os.getenv("MYBRAIN_LEXICAL_MAX_QUERY_WORDS", "3"))
+LEXICAL_CONFIDENT_SCORE = float(os.getenv("MYBRAIN_LEXICAL_CONFIDENT_SCORE", "2.0"))
+BM25_K1 = float(os.getenv("MYBRAIN_BM25_K1", "1.2"))
+BM25_B = float(os.getenv("MYBRAIN_BM25_B", "0.75"))
+RRF_K = int(os.getenv("MYBRAIN_RRF_K", "60"))
+
+# get_rules: rule lists of up to RULES_CACHE_WORKBASES workbases are kept in memory (LRU) and
+# reused until the workbase's rules version changes (0 disables)
+RULES_CACHE_WORKBASES = int(os.getenv("MYBRAIN_RULES_CACHE_WORKBASES", "64"))
+
+# Knowledge graph: top-k cosine neighbours per memory, minimum similarity and edge budget
+GRAPH_NEIGHBORS = int(os.getenv("MYBRAIN_GRAPH_NEIGHBORS", "5"))
+GRAPH_SIMILARITY_THRESHOLD = float(os.getenv("MYBRAIN_GRAPH_THRESHOLD", "0.6"))
+GRAPH_MAX_EDGES = int(os.getenv("MYBRAIN_GRAPH_MAX_EDGES", "3000"))
+
+# Near-duplicate consolidation: minimum cosine similarity to merge, and delete batch size
+CONSOLIDATION_THRESHOLD = float(os.getenv("MYBRAIN_CONSOLIDATION_THRESHOLD", "0.92"))
+CONSOLIDATION_BATCH_SIZE = int(os.getenv("MYBRAIN_CONSOLIDATION_BATCH_SIZE", "500"))
+
+# Rows per block for blocked NumPy similarity computations (bounds peak memory)
+SIMILARITY_BLOCK_SIZE = int(os.getenv("MYBRAIN_SIMILARITY_BLOCK_SIZE", "512"))
+
+# Silent Observer scheduler: per-cycle budgets (0 disables a limit), per-thread nice increment
+# (Linux) and priority weights for recent activity and staleness
+OBSERVER_FILES_PER_SECOND = float(os.getenv("MYBRAIN_OBSERVER_FILES_PER_SECOND", "200"))
+OBSERVER_CPU_BUDGET_SECONDS = float(os.getenv("MYBRAIN_OBSERVER_CPU_BUDGET", "5"))
+OBSERVER_NICE = int(os.getenv("MYBRAIN_OBSERVER_NICE", "10"))
+OBSERVER_ACTIVITY_HALF_LIFE_HOURS = float(os.getenv("MYBRAIN_OBSERVER_ACTIVITY_HALF_LIFE_HOURS", "24"))
+OBSERVER_MAX_STALENESS_SECONDS = float(os.getenv("MYBRAIN_OBSERVER_MAX_STALENESS", "86400"))
+# Only the server process holding this lock file (under BASE_DATA_DIR) runs observer scans
+OBSERVER_LOCK_FILE = os.getenv("MYBRAIN_OBSERVER_LOCK_FILE", "observer.lock")
+
+# Observer event journal (SQLite WAL under BASE_DATA_DIR): append-only, oldest events pruned
+# beyond OBSERVER_JOURNAL_MAX_EVENTS (checked every OBSERVER_JOURNAL_PRUNE_EVERY appends)
+OBSERVER_JOURNAL_FILE = os.getenv("MYBRAIN_OBSERVER_JOURNAL_FILE", "observer_journal.sqlite3")
+OBSERVER_JOURNAL_MAX_EVENTS = int(os.getenv("MYBRAIN_OBSERVER_JOURNAL_MAX_EVENTS", "100000"))
+OBSERVER_JOURNAL_PRUNE_EVERY = int(os.getenv("MYBRAIN_OBSERVER_JOURNAL_PRUNE_EVERY", "1000"))
+
+# Metrics: reservoir size per latency distribution and export of metrics.prom / metrics.json
+# (under BASE_DATA_DIR) at most every METRICS_EXPORT_INTERVAL seconds. Each process writes its
+# own copy, named after the file with .<host>-<pid> inserted before the suffix
+METRICS_RESERVOIR_SIZE = int(os.getenv("MYBRAIN_METRICS_RESERVOIR_SIZE", "1024"))
+METRICS_EXPORT_INTERVAL = float(os.getenv("MYBRAIN_METRICS_EXPORT_INTERVAL", "10"))
+METRICS_PROM_FILE = os.getenv("MYBRAIN_METRICS_PROM_FILE", "metrics.prom")
+METRICS_JSON_FILE = os.getenv("MYBRAIN_METRICS_JSON_FILE", "metrics.json")
+
+# Opt-in profiling of MCP tools: "all" or comma-separated tool names (tools accepting a
+# `profile` argument can also be profiled per call). Profiles (.pstats + collapsed stacks)
+# go to BASE_DATA_DIR/PROFILE_DIR; only the newest PROFILE_KEEP are kept.
+PROFILE_TOOLS = {t.strip() for t in os.getenv("MYBRAIN_PROFILE", "").split(",") if t.strip()}
+PROFILE_DIR = os.getenv("MYBRAIN_PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("MYBRAIN_PROFILE_KEEP", "20"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("MYBRAIN_PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+# Serving mode: "stdio" (one server process per agent) or a long-lived "streamable-http" / "sse"
+# server shared by many sessions, on SERVER_HOST:SERVER_PORT or on the unix socket SERVER_SOCKET
+SERVER_TRANSPORT = os.getenv("MYBRAIN_TRANSPORT", "stdio")
+SERVER_HOST = os.getenv("MYBRAIN_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("MYBRAIN_PORT", "8765"))
+SERVER_SOCKET = os.getenv("MYBRAIN_SOCKET", "")
+# The shared server has no authentication: it only binds loopback hosts unless
+# SERVER_ALLOW_REMOTE is set. DNS rebinding protection stays on either way; Host headers other
+# than the bind host and loopback must be listed in SERVER_ALLOWED_HOSTS ("name:port" or "name:*")
+SERVER_ALLOW_REMOTE = os.getenv("MYBRAIN_SERVER_ALLOW_REMOTE", "false").lower() in ("1", "true", "yes")
+SERVER_ALLOWED_HOSTS = [h.strip() for h in os.getenv("MYBRAIN_SERVER_ALLOWED_HOSTS", "").split(",") if h.strip()]
+
 IGNORED_DIRS = {
     "node_modules", ".git", "__pycache__", "venv", ".env",
     "dist", "build", ".idea", ".vscode"
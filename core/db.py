@@ -1,93 +1,778 @@
+import sys
+import time
 import sqlite3
 import datetime
 import hashlib
+import re
+import threading
+import collections
 from typing import List, Optional, Dict, Any
 from tenacity import retry, stop_after_delay, wait_fixed, retry_if_exception_type
 
+import numpy as np
 import chromadb
-from chromadb.utils import embedding_functions
 
 from core import config
+from core.registry import WorkbaseRegistry
+from core.metrics import metrics
+from core.embeddings import get_embedding_function
+from core.exact_index import WorkbaseMatrix
+from core.lexical import BM25Index, reciprocal_rank_fusion
+from core.migrations import stamp, upgrade
+from core.tuning import hnsw_metadata
+from core.similarity import (
+    normalize_rows, blocked_topk_neighbors, prune_edges, blocked_similar_pairs, star_clusters,
+    maximal_marginal_relevance
+)
 
 class BrainDB:
-    def __init__(self):
+    def __init__(self, check_embedding_space: bool = True):
         # Ensure data directory exists
         config.BASE_DATA_DIR.mkdir(parents=True, exist_ok=True)
         
         # Initialize ChromaDB client with persistent storage
         self.client = chromadb.PersistentClient(path=str(config.BASE_DATA_DIR))
         
-        # Use default sentence-transformers model as specified in config
-        self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=config.EMBEDDING_MODEL
-        )
-        
-        # Get or create the collection
-        self.collection = self.client.get_or_create_collection(
-            name=config.CHROMA_COLLECTION,
+        # Embedding backend selected in config (sentence-transformers by default)
+        self.embedding_fn = get_embedding_function()
+
+        # Sidecar registry: workbase names/paths, per-type/category counts and write versions
+        self.registry = WorkbaseRegistry()
+
+        # Before anything reopens (and so recreates) a collection a crashed rebuild was replacing
+        self._recover_rebuilds()
+
+        # Get or create the collection (shared by every workbase unless sharding is enabled)
+        self.collection = self._open_collection(config.CHROMA_COLLECTION)
+
+        # Per-workbase collections (registry version, handle), opened lazily when SHARD_BY_WORKBASE is enabled
+        self._shards: Dict[str, tuple] = {}
+        self._shards_lock = threading.Lock()
+
+        if not self.registry.is_bootstrapped():
+            self.rebuild_registry()
+
+        # Refuse to mix vectors from two embedding backends (rebuild_index(reembed=True) switches)
+        if check_embedding_space:
+            self._check_embedding_space()
+
+        self._graph_cache: Dict[tuple, tuple] = {}
+
+        # Per-workbase in-memory embedding matrices for exact search on small workbases (LRU)
+        self._matrices: "collections.OrderedDict[str, WorkbaseMatrix]" = collections.OrderedDict()
+        self._matrices_lock = threading.Lock()
+        # Workbase -> registry version whose embeddings could not be loaded consistently
+        self._matrix_misses: Dict[str, int] = {}
+
+        # Per-workbase BM25 indexes for identifier/keyword queries (LRU)
+        self._lexical: "collections.OrderedDict[str, BM25Index]" = collections.OrderedDict()
+        self._lexical_lock = threading.Lock()
+
+        # Per-workbase rule lists keyed on the registry's rules version (LRU)
+        self._rules: "collections.OrderedDict[str, tuple]" = collections.OrderedDict()
+        self._rules_lock = threading.Lock()
+
+    # --- Collection routing ---
+    def _open_collection(self, name: str, workbase_id: Optional[str] = None):
+        # HNSW parameters only take effect for new collections; see rebuild_index()
+        metadata = hnsw_metadata()
+        if workbase_id:
+            metadata["workbase_id"] = workbase_id
+        return self.client.get_or_create_collection(
+            name=name,
             embedding_function=self.embedding_fn,
-            metadata={"hnsw:space": "cosine"}
+            metadata=metadata
+        )
+
+    @staticmethod
+    def _shard_prefix() -> str:
+        return f"{config.CHROMA_COLLECTION[:32]}_wb_"
+
+    @classmethod
+    def _shard_name(cls, workbase_id: str) -> str:
+        # Chroma collection names are limited to 63 characters
+        return f"{cls._shard_prefix()}{workbase_id[:24]}"
+
+    def _collection_for(self, workbase_id: Optional[str], create: bool = False):
+        """
+        Collection holding a workbase's memories.
+        With sharding disabled (or no workbase) this is the shared collection. Reads
+        (create=False) fall back to the shared collection when the shard does not exist yet.
+        """
+        if not config.SHARD_BY_WORKBASE or not workbase_id:
+            return self.collection
+        # Handles are revalidated when the workbase version changes, so a shard dropped by
+        # another process is not used after the fact.
+        version = self.registry.get_version(workbase_id)
+        with self._shards_lock:
+            cached = self._shards.get(workbase_id)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            if create:
+                shard = self._open_collection(self._shard_name(workbase_id), workbase_id)
+            else:
+                try:
+                    shard = self.client.get_collection(
+                        self._shard_name(workbase_id), embedding_function=self.embedding_fn
+                    )
+                except Exception:
+                    return self.collection
+            self._shards[workbase_id] = (version, shard)
+        return shard
+
+    def _all_collections(self) -> List[Any]:
+        """Every collection holding memories: the shared one plus, when sharding, all workbase shards."""
+        found = [self.collection]
+        if not config.SHARD_BY_WORKBASE:
+            return found
+        for entry in self.client.list_collections():
+            name = entry if isinstance(entry, str) else entry.name
+            if name.startswith(self._shard_prefix()):
+                found.append(self.client.get_collection(name, embedding_function=self.embedding_fn))
+        return found
+
+    def _locate(self, ids: List[str]) -> List[tuple]:
+        """
+        Find the collections holding `ids`.
+        Returns (collection, ids, metadatas) groups. With sharding, shards guessed from the
+        workbase hash embedded in the ids are tried before scanning every collection.
+        """
+        groups = []
+        remaining = list(ids)
+
+        def probe(collection):
+            nonlocal remaining
+            results = collection.get(ids=remaining, include=["metadatas"])
+            if results["ids"]:
+                groups.append((collection, results["ids"], results["metadatas"]))
+                found = set(results["ids"])
+                remaining = [i for i in remaining if i not in found]
+
+        if not config.SHARD_BY_WORKBASE:
+            probe(self.collection)
+            return groups
+
+        guessed = []
+        for memory_id in ids:
+            match = re.search(r"[0-9a-f]{64}", memory_id)
+            if match and match.group(0) not in guessed:
+                guessed.append(match.group(0))
+        tried = set()
+        for collection in [self._collection_for(wb) for wb in guessed] + self._all_collections():
+            if not remaining:
+                break
+            if collection.name in tried:
+                continue
+            tried.add(collection.name)
+            probe(collection)
+        return groups
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Encode texts with the collection's embedding function as a float32 matrix."""
+        metrics.observe("mybrain_embedding_batch_size", len(texts))
+        with metrics.phase("embed"):
+            return np.asarray(self.embedding_fn(list(texts)), dtype=np.float32)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts with this process's backend (served to other processes by the HTTP server)."""
+        return self._embed(texts)
+
+    def _get_matrix(self, workbase_id: str) -> Optional[WorkbaseMatrix]:
+        """
+        Return the exact-search matrix of a workbase if it is small enough, loading it lazily.
+        A cached matrix is reused as long as its version matches the registry.
+        """
+        if config.EXACT_SEARCH_MAX_ITEMS <= 0:
+            return None
+        if self.registry.get_total(workbase_id) > config.EXACT_SEARCH_MAX_ITEMS:
+            with self._matrices_lock:
+                self._matrices.pop(workbase_id, None)
+            return None
+
+        version = self.registry.get_version(workbase_id)
+        with self._matrices_lock:
+            if self._matrix_misses.get(workbase_id) == version:
+                return None
+            cached = self._matrices.get(workbase_id)
+            if cached is not None and cached.version == version:
+                self._matrices.move_to_end(workbase_id)
+                return cached
+
+        data = self.get_workbase_embeddings(workbase_id)
+        if len(data["embeddings"]) != len(data["ids"]):
+            # Another process wrote vectors this process's Chroma segment has not loaded:
+            # an exact matrix would be misaligned, so query the collection instead until the
+            # workbase version changes (remembered so the workbase is not re-fetched per query).
+            with self._matrices_lock:
+                self._matrices.pop(workbase_id, None)
+                first = workbase_id not in self._matrix_misses
+                self._matrix_misses[workbase_id] = version
+            metrics.inc("mybrain_exact_search_skipped_total")
+            if first:
+                print(f"EXACT SEARCH SKIPPED for {workbase_id}: {len(data['ids'])} ids, "
+                      f"{len(data['embeddings'])} embeddings visible (written by another process); "
+                      f"using HNSW until its version changes. Logged once per workbase.", file=sys.stderr)
+            return None
+        matrix = WorkbaseMatrix(data["ids"], data["documents"], data["metadatas"], data["embeddings"], version)
+        with self._matrices_lock:
+            self._matrices[workbase_id] = matrix
+            while len(self._matrices) > config.EXACT_SEARCH_CACHE_WORKBASES:
+                self._matrices.popitem(last=False)
+        return matrix
+
+    def _get_lexical(self, workbase_id: str) -> Optional[BM25Index]:
+        """
+        Return the BM25 index of a workbase, building it lazily from its documents.
+        A cached index is reused as long as its version matches the registry.
+        """
+        if not config.HYBRID_SEARCH:
+            return None
+        if self.registry.get_total(workbase_id) > config.LEXICAL_MAX_ITEMS:
+            with self._lexical_lock:
+                self._lexical.pop(workbase_id, None)
+            return None
+
+        version = self.registry.get_version(workbase_id)
+        with self._lexical_lock:
+            cached = self._lexical.get(workbase_id)
+            if cached is not None and cached.version == version:
+                self._lexical.move_to_end(workbase_id)
+                return cached
+
+        results = self._collection_for(workbase_id).get(
+            where={"workbase_id": workbase_id}, include=["documents", "metadatas"]
         )
+        index = BM25Index(results["ids"], results["documents"], results["metadatas"], version)
+        with self._lexical_lock:
+            self._lexical[workbase_id] = index
+            while len(self._lexical) > config.LEXICAL_CACHE_WORKBASES:
+                self._lexical.popitem(last=False)
+        return index
+
+    def _refresh_caches(self, versions: Dict[str, int], rows: Optional[List[tuple]] = None,
+                        removed_ids: List[str] = ()):
+        """
+        Patch cached matrices and BM25 indexes after a write made through this process.
+        `rows` are (id, document, metadata, embedding) tuples that were upserted; when None the
+        change is unknown and affected caches are dropped. Caches that also missed a write
+        from another process (version gap) are dropped and reloaded lazily.
+        """
+        for cache, lock in ((self._matrices, self._matrices_lock), (self._lexical, self._lexical_lock)):
+            with lock:
+                for wb_id, version in versions.items():
+                    entry = cache.get(wb_id)
+                    if entry is None:
+                        continue
+                    if rows is None or entry.version + 1 != version:
+                        del cache[wb_id]
+                        continue
+                    entry.remove(list(removed_ids) + [r[0] for r in rows], version)
+                    own = [r for r in rows if r[2].get("workbase_id") == wb_id]
+                    if own:
+                        entry.upsert(
+                            [r[0] for r in own], [r[1] for r in own], [r[2] for r in own],
+                            np.vstack([r[3] for r in own]), version
+                        )
+
+    def _existing_metadatas(self, ids: List[str]) -> List[Dict[str, Any]]:
+        """Metadata of the memories among `ids` that already exist (metadata-only lookup by id)."""
+        return [meta for _, _, metas in self._locate(ids) for meta in metas]
+
+    def rebuild_registry(self):
+        """Recompute the workbase registry from a full metadata scan of every collection."""
+        metadatas = []
+        for collection in self._all_collections():
+            metadatas.extend(collection.get(include=["metadatas"])["metadatas"] or [])
+        self.registry.rebuild(metadatas)
+
+    def _stored_dim(self) -> Optional[int]:
+        """Dimension of the stored embeddings, or None while the brain is empty."""
+        for collection in self._all_collections():
+            sample = collection.get(limit=1, include=["embeddings"])
+            if len(sample["ids"]) and len(sample["embeddings"]):
+                return len(sample["embeddings"][0])
+        return None
+
+    def _record_embedding_space(self, space: Dict[str, Any]):
+        self.registry.set_meta({
+            "embedding_backend": space["backend"],
+            "embedding_model": space["model"],
+            "embedding_dim": space["dim"] or self._stored_dim()
+        })
+
+    def _check_embedding_space(self):
+        """
+        Check that the configured embedding backend produces the vector space the stored memories
+        are in. The backend, model and dimension are recorded in the registry on first use; brains
+        from before that record hold sentence-transformers vectors (the only backend back then).
+        Raises ValueError on a mismatch. A "remote" backend is checked by the server it calls.
+        """
+        current = self.embedding_fn.describe()
+        if current is None:
+            return
+        recorded = self.registry.get_meta("embedding_")
+        if not recorded.get("embedding_backend"):
+            if self._stored_dim() is None:
+                self._record_embedding_space(current)
+                return
+            self._record_embedding_space({"backend": "sentence-transformers", "model": config.EMBEDDING_MODEL, "dim": None})
+            recorded = self.registry.get_meta("embedding_")
+        elif not recorded.get("embedding_dim") and self._stored_dim() is not None:
+            self.registry.set_meta({"embedding_dim": self._stored_dim()})
+            recorded = self.registry.get_meta("embedding_")
+
+        dim = recorded.get("embedding_dim")
+        if (recorded["embedding_backend"] != current["backend"] or recorded["embedding_model"] != current["model"]
+                or (current["dim"] and dim and int(dim) != current["dim"])):
+            raise ValueError(
+                f"Stored memories were embedded with {recorded['embedding_backend']} "
+                f"({recorded['embedding_model']}, dim {dim or 'unknown'}) but the configured backend is "
+                f"{current['backend']} ({current['model']}{', dim ' + str(current['dim']) if current['dim'] else ''}); "
+                "their similarities are not comparable. "
+                "Restore MYBRAIN_EMBEDDING_BACKEND / MYBRAIN_EMBEDDING_MODEL, or re-embed every memory "
+                "with `python cli.py rebuild-index --reembed`."
+            )
+
+    def get_workbase_version(self, workbase_id: str) -> int:
+        """Return the write version of a workbase; it changes whenever one of its memories is written."""
+        return self.registry.get_version(workbase_id)
+
+    def get_workbase(self, workbase_id: str) -> Optional[Dict[str, Any]]:
+        """Registry entry (project_name, root_path, version) for a workbase, or None if unknown."""
+        return self.registry.get_workbase(workbase_id)
+
+    def get_workbase_stats(self, workbase_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Materialized memory counts per (workbase, type, category)."""
+        return self.registry.get_stats(workbase_id)
 
     @retry(
         stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
         wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
-        retry=retry_if_exception_type(sqlite3.OperationalError)
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
     )
     def add_memory(self, memory_id: str, text: str, metadata: Dict[str, Any]):
         """Add a new memory chunk with metadata."""
-        # Ensure mandatory metadata fields
-        metadata.setdefault("created_at", datetime.datetime.now(datetime.timezone.utc).isoformat())
-        metadata.setdefault("schema_version", config.DB_SCHEMA_VERSION)
+        # Ensure mandatory metadata fields (current schema: created_at, created_ts, schema_version)
+        stamp(metadata)
         
-        self.collection.upsert(
+        target = self._collection_for(metadata.get("workbase_id"), create=True)
+        located = self._locate([memory_id])
+        previous = [meta for _, _, metas in located for meta in metas]
+        # The memory moved to another workbase shard: drop the stale copy
+        for collection, ids, _ in located:
+            if collection.name != target.name:
+                collection.delete(ids=ids)
+
+        embeddings = self._embed([text])
+        target.upsert(
             ids=[memory_id],
             documents=[text],
-            metadatas=[metadata]
+            metadatas=[metadata],
+            embeddings=embeddings.tolist()
         )
+        versions = self.registry.apply_changes(added=[metadata], removed=previous)
+        self._refresh_caches(versions, rows=[(memory_id, text, metadata, embeddings[0])])
 
     @retry(
         stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
         wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
-        retry=retry_if_exception_type(sqlite3.OperationalError)
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
+    )
+    def sync_structure_context(self, workbase_id: str, memories: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Bring a workbase's project-structure context in line with `memories`
+        ({"id", "document", "metadata"} with a `content_hash` in metadata): only memories whose
+        hash changed are embedded (in one call) and upserted, and structure memories no longer
+        produced (metadata carries `structure_path`, plus the root `context_{workbase_id}`) are deleted.
+        """
+        summary_id = f"context_{workbase_id}"
+        source = self._collection_for(workbase_id)
+        target = self._collection_for(workbase_id, create=True)
+        existing = source.get(
+            where={"$and": [{"workbase_id": workbase_id}, {"category": "project_structure"}]},
+            include=["metadatas"]
+        )
+        stored = {
+            memory_id: meta for memory_id, meta in zip(existing["ids"], existing["metadatas"])
+            if memory_id == summary_id or "structure_path" in meta
+        }
+
+        wanted = {m["id"] for m in memories}
+        moved = source.name != target.name  # first write since the workbase got its own shard
+        changed = [
+            m for m in memories
+            if moved or (stored.get(m["id"]) or {}).get("content_hash") != m["metadata"]["content_hash"]
+        ]
+        stale = [memory_id for memory_id in stored if moved or memory_id not in wanted]
+
+        rows = []
+        if changed:
+            for m in changed:
+                stamp(m["metadata"])
+            embeddings = self._embed([m["document"] for m in changed])
+            target.upsert(
+                ids=[m["id"] for m in changed],
+                documents=[m["document"] for m in changed],
+                metadatas=[m["metadata"] for m in changed],
+                embeddings=embeddings.tolist()
+            )
+            rows = [(m["id"], m["document"], m["metadata"], embeddings[i]) for i, m in enumerate(changed)]
+        if stale:
+            source.delete(ids=stale)
+
+        if changed or stale:
+            previous = [stored[i] for i in stale] + [stored[m["id"]] for m in changed if m["id"] in stored and not moved]
+            versions = self.registry.apply_changes(added=[m["metadata"] for m in changed], removed=previous)
+            self._refresh_caches(versions, rows=rows, removed_ids=stale)
+        return {"chunks": len(memories), "upserted": len(changed), "deleted": len(stale),
+                "unchanged": len(memories) - len(changed)}
+
+    @retry(
+        stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
+        wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
     )
     def update_memory(self, memory_id: str, new_text: str):
         """Update existing memory text."""
-        self.collection.update(
-            ids=[memory_id],
-            documents=[new_text]
-        )
+        located = self._locate([memory_id])
+        previous = [meta for _, _, metas in located for meta in metas]
+        embeddings = self._embed([new_text])
+        for collection, ids, _ in located:
+            collection.update(
+                ids=ids,
+                documents=[new_text],
+                embeddings=embeddings.tolist()
+            )
+        # Counts are unchanged (same metadata in and out); the rules version only moves for rules
+        versions = self.registry.apply_changes(added=previous, removed=previous)
+        self._refresh_caches(versions, rows=[(memory_id, new_text, m, embeddings[0]) for m in previous])
 
     @retry(
         stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
         wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
-        retry=retry_if_exception_type(sqlite3.OperationalError)
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
     )
+    def update_memories(self, updates: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Apply a batch of edits: each update is {"id", "text"?, "metadata"?}, where metadata
+        holds only the changed fields (merged into the stored metadata).
+        Metadata-only edits go out in one update per collection without re-embedding; the
+        texts that changed are embedded together in a single call.
+        Returns the number of updated memories and of re-embedded texts.
+        """
+        by_id: Dict[str, Dict[str, Any]] = {}
+        for u in updates:
+            merged = by_id.setdefault(u["id"], {"text": None, "metadata": {}})
+            if u.get("text") is not None:
+                merged["text"] = u["text"]
+            merged["metadata"].update(u.get("metadata") or {})
+        by_id = {k: u for k, u in by_id.items() if u["text"] is not None or u["metadata"]}
+        if not by_id:
+            return {"updated": 0, "reembedded": 0}
+        located = self._locate(list(by_id))
+
+        previous, current, pending = [], [], []
+        for collection, ids, metas in located:
+            for memory_id, old in zip(ids, metas):
+                new = {**(old or {}), **by_id[memory_id]["metadata"]}
+                previous.append(old or {})
+                current.append(new)
+                pending.append((collection, memory_id, by_id[memory_id]["text"], new))
+
+        reembed = [p for p in pending if p[2] is not None]
+        embeddings = self._embed([p[2] for p in reembed]) if reembed else None
+        vectors = {p[1]: embeddings[i] for i, p in enumerate(reembed)}
+
+        for collection, _, _ in located:
+            own = [p for p in pending if p[0] is collection]
+            metadata_only = [p for p in own if p[2] is None]
+            if metadata_only:
+                collection.update(ids=[p[1] for p in metadata_only], metadatas=[p[3] for p in metadata_only])
+            changed = [p for p in own if p[2] is not None]
+            if changed:
+                collection.update(
+                    ids=[p[1] for p in changed],
+                    documents=[p[2] for p in changed],
+                    metadatas=[p[3] for p in changed],
+                    embeddings=np.vstack([vectors[p[1]] for p in changed]).tolist()
+                )
+
+        versions = self.registry.apply_changes(added=current, removed=previous)
+        # Cached matrices can be patched only when every edited row comes with its new vector
+        rows = None
+        if len(reembed) == len(pending):
+            rows = [(p[1], p[2], p[3], vectors[p[1]]) for p in pending]
+        self._refresh_caches(versions, rows=rows)
+        return {"updated": len(pending), "reembedded": len(reembed)}
+
     def delete_memory(self, memory_id: str):
-        """Delete memory by ID."""
-        self.collection.delete(ids=[memory_id])
+        """Delete memory by ID (delete_memories retries on a locked database)."""
+        self.delete_memories([memory_id])
+
+    @retry(
+        stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
+        wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
+    )
+    def delete_memories(self, memory_ids: List[str]):
+        """Delete a batch of memories by ID in a single call."""
+        if not memory_ids:
+            return
+        located = self._locate(memory_ids)
+        previous = [meta for _, _, metas in located for meta in metas]
+        for collection, ids, _ in located:
+            collection.delete(ids=ids)
+        versions = self.registry.apply_changes(removed=previous)
+        self._refresh_caches(versions, rows=[], removed_ids=memory_ids)
 
     @retry(
         stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
         wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
-        retry=retry_if_exception_type(sqlite3.OperationalError)
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
     )
-    def search(self, query: str, workbase_id: str, limit: int = 5, category: Optional[str] = None) -> Dict[str, Any]:
-        """Search memories using vector similarity, filtered by workbase."""
-        where = {"workbase_id": workbase_id}
+    def search(self, query: str, workbase_id: str, limit: int = 5, category: Optional[str] = None,
+               where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Search memories of a workbase (hybrid lexical + vector).
+        Short identifier/keyword queries with a confident BM25 match are answered lexically
+        without an embedding call (distances are None). Otherwise vector results (exact in
+        memory for small workbases, HNSW for larger ones) are fused with BM25 hits through
+        reciprocal rank fusion; lexical-only hits carry a None distance.
+        `where` is an extra flat metadata filter (equality or {"$ne": value} per key).
+        """
+        filters = self._search_filters(category, where)
+        lexical = self._get_lexical(workbase_id)
+        hits = []
+        if lexical is not None:
+            with metrics.phase("lexical_query"):
+                hits = lexical.search(query, limit, where=filters)
+        if hits and lexical.is_confident(query, hits):
+            return lexical.to_results(hits)
+
+        vector = self._vector_search(query, workbase_id, limit, filters)
+        if not hits:
+            return vector
+        return reciprocal_rank_fusion([vector, lexical.to_results(hits)], limit)
+
+    def _vector_search(self, query: str, workbase_id: str, limit: int,
+                       filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Search memories using vector similarity, filtered by workbase.
+        Small workbases are searched exactly in memory; larger ones use the HNSW index.
+        """
+        return self._vector_query(self._embed([query]), workbase_id, limit, filters)
+
+    def _vector_query(self, embeddings: np.ndarray, workbase_id: str, limit: int,
+                      filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Run already-encoded queries against the exact matrix (small workbases) or the HNSW index."""
+        matrix = self._get_matrix(workbase_id)
+        if matrix is not None:
+            with metrics.phase("exact_query"):
+                return matrix.query(embeddings, limit, where=filters)
+
+        with metrics.phase("hnsw_query"):
+            return self._collection_for(workbase_id).query(
+                query_embeddings=embeddings.tolist(),
+                n_results=limit,
+                where=self._filtered_where(workbase_id, filters)
+            )
+
+    @staticmethod
+    def _search_filters(category: Optional[str] = None,
+                        where: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Merge the category shortcut into a flat search filter (None when unfiltered)."""
+        filters = dict(where or {})
         if category:
-            where["category"] = category
-            
-        return self.collection.query(
-            query_texts=[query],
-            n_results=limit,
-            where=where
-        )
+            filters["category"] = category
+        return filters or None
+
+    @staticmethod
+    def _filtered_where(workbase_id: str, filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Chroma `where` for a workbase plus a flat search filter."""
+        if not filters:
+            return {"workbase_id": workbase_id}
+        return {"$and": [{"workbase_id": workbase_id}] + [{k: v} for k, v in filters.items()]}
+
+    @retry(
+        stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
+        wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
+    )
+    def search_diverse(self, query: str, workbase_id: str, limit: int = 5, fetch_k: Optional[int] = None,
+                       lambda_mult: Optional[float] = None, category: Optional[str] = None,
+                       where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Search with maximal marginal relevance: over-fetch `fetch_k` vector candidates (plus
+        BM25 hits the vector search missed) with their embeddings, then greedily pick `limit`
+        that are relevant to the query but not redundant with each other, so paraphrases of the
+        same rule do not crowd out other memories. One embedding call; same result shape as search().
+        """
+        fetch_k = max(fetch_k or config.RECALL_FETCH_K, limit)
+        lambda_mult = config.RECALL_MMR_LAMBDA if lambda_mult is None else lambda_mult
+        embedding = self._embed([query])
+        filters = self._search_filters(category, where)
+
+        matrix = self._get_matrix(workbase_id)
+        if matrix is not None:
+            with metrics.phase("exact_query"):
+                found = matrix.query(embedding, fetch_k, where=filters, include_embeddings=True)
+        else:
+            with metrics.phase("hnsw_query"):
+                found = self._collection_for(workbase_id).query(
+                    query_embeddings=embedding.tolist(),
+                    n_results=fetch_k,
+                    where=self._filtered_where(workbase_id, filters),
+                    include=["documents", "metadatas", "distances", "embeddings"]
+                )
+        ids, documents, metadatas = list(found["ids"][0]), list(found["documents"][0]), list(found["metadatas"][0])
+        vectors = list(found["embeddings"][0])
+
+        # Exact identifier/keyword matches the vector search ranked below fetch_k
+        lexical = self._get_lexical(workbase_id)
+        if lexical is not None:
+            with metrics.phase("lexical_query"):
+                hits = lexical.search(query, fetch_k, where=filters)
+            seen = set(ids)
+            missing = [memory_id for memory_id, _, _ in hits if memory_id not in seen]
+            if missing:
+                if matrix is not None:
+                    extra = matrix.rows(missing)
+                else:
+                    extra = self._collection_for(workbase_id).get(
+                        ids=missing, include=["documents", "metadatas", "embeddings"]
+                    )
+                if len(extra["embeddings"]) == len(extra["ids"]):
+                    ids += extra["ids"]
+                    documents += extra["documents"]
+                    metadatas += extra["metadatas"]
+                    vectors += list(extra["embeddings"])
+
+        if not ids:
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        picked, relevance = maximal_marginal_relevance(embedding[0], np.vstack(vectors), limit, lambda_mult)
+        return {
+            "ids": [[ids[i] for i in picked]],
+            "documents": [[documents[i] for i in picked]],
+            "metadatas": [[metadatas[i] for i in picked]],
+            "distances": [np.clip(1.0 - relevance, 0.0, 2.0).astype(float).tolist()]
+        }
+
+    @retry(
+        stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
+        wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
+    )
+    def search_many(self, queries: List[str], workbase_id: str, limit: int = 5,
+                    category: Optional[str] = None, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Vector search for several queries at once: the queries are encoded in one batch and
+        sent as a single multi-query search. Results hold one list per query, in order.
+        """
+        if not queries:
+            return {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        return self._vector_query(self._embed(queries), workbase_id, limit, self._search_filters(category, where))
+
+    @staticmethod
+    def _build_where(workbase_id: Optional[str] = None, categories: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Compose a Chroma `where` filter from optional workbase and category constraints."""
+        clauses = []
+        if workbase_id:
+            clauses.append({"workbase_id": workbase_id})
+        if categories:
+            clauses.append({"category": {"$in": list(categories)}})
+
+        if not clauses:
+            return None
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$and": clauses}
+
+    @retry(
+        stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
+        wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
+    )
+    def count_memories(self, workbase_id: Optional[str] = None, categories: Optional[List[str]] = None, search: Optional[str] = None) -> int:
+        """Count memories matching the filters without loading documents or embeddings."""
+        collections_ = [self._collection_for(workbase_id)] if workbase_id else self._all_collections()
+        total = 0
+        for collection in collections_:
+            results = collection.get(
+                where=self._build_where(workbase_id, categories),
+                where_document={"$contains": search} if search else None,
+                include=[]
+            )
+            total += len(results["ids"])
+        return total
+
+    @retry(
+        stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
+        wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
+    )
+    def get_memory_ids(self, workbase_id: str) -> List[str]:
+        """Retrieve the ids of every memory in a workbase (no documents or embeddings)."""
+        return self._collection_for(workbase_id).get(where={"workbase_id": workbase_id}, include=[])["ids"]
+
+    @retry(
+        stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
+        wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
+    )
+    def get_memories_page(self, workbase_id: Optional[str] = None, categories: Optional[List[str]] = None,
+                          search: Optional[str] = None, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Retrieve a single page of memories.
+        Filtering (workbase, categories, substring search) is pushed down to Chroma so that
+        only the requested page is materialized.
+        """
+        where = self._build_where(workbase_id, categories)
+        where_document = {"$contains": search} if search else None
+        collections_ = [self._collection_for(workbase_id)] if workbase_id else self._all_collections()
+
+        memories = []
+        for collection in collections_:
+            if limit <= 0:
+                break
+            results = collection.get(
+                where=where,
+                where_document=where_document,
+                offset=offset,
+                limit=limit,
+                include=["documents", "metadatas"]
+            )
+            if not results["ids"]:
+                # The page starts after this collection's matches: skip past them
+                skipped = collection.get(where=where, where_document=where_document, include=[])
+                offset = max(0, offset - len(skipped["ids"]))
+                continue
+
+            for i in range(len(results["ids"])):
+                memories.append({
+                    "id": results["ids"][i],
+                    "text": results["documents"][i],
+                    "metadata": results["metadatas"][i]
+                })
+            offset = 0
+            limit -= len(results["ids"])
+        return memories
 
     @retry(
         stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
         wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
-        retry=retry_if_exception_type(sqlite3.OperationalError)
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
     )
     def check_conflict(self, text: str, workbase_id: str, category: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
@@ -95,19 +780,27 @@ class BrainDB:
         Returns the most similar conflicting rule if distance < CONFLICT_DISTANCE_THRESHOLD.
         If category is provided, it prioritizes findings within that category.
         """
-        where_clauses = [
-            {"workbase_id": workbase_id},
-            {"type": "rule"}
-        ]
-        
-        if category:
-            where_clauses.append({"category": category})
+        embeddings = self._embed([text])
+        matrix = self._get_matrix(workbase_id)
+        if matrix is not None:
+            where = {"type": "rule", "category": category} if category else {"type": "rule"}
+            with metrics.phase("exact_query"):
+                results = matrix.query(embeddings, 1, where=where)
+        else:
+            where_clauses = [
+                {"workbase_id": workbase_id},
+                {"type": "rule"}
+            ]
 
-        results = self.collection.query(
-            query_texts=[text],
-            n_results=1,
-            where={"$and": where_clauses}
-        )
+            if category:
+                where_clauses.append({"category": category})
+
+            with metrics.phase("hnsw_query"):
+                results = self._collection_for(workbase_id).query(
+                    query_embeddings=embeddings.tolist(),
+                    n_results=1,
+                    where={"$and": where_clauses}
+                )
         
         if results["ids"] and results["ids"][0]:
             distance = results["distances"][0][0]
@@ -123,18 +816,19 @@ class BrainDB:
     @retry(
         stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
         wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
-        retry=retry_if_exception_type(sqlite3.OperationalError)
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
     )
     def export_memory_to_json(self, workbase_id: Optional[str] = None) -> str:
         """Export memories (optionally filtered by workbase_id) to a JSON string."""
         import json
         if workbase_id:
-            results = self.collection.get(where={"workbase_id": workbase_id})
+            batches = [self._collection_for(workbase_id).get(where={"workbase_id": workbase_id})]
         else:
-            results = self.collection.get()
+            batches = [collection.get() for collection in self._all_collections()]
             
         export_data = []
-        if results["ids"]:
+        for results in batches:
             for i in range(len(results["ids"])):
                 export_data.append({
                     "id": results["ids"][i],
@@ -146,7 +840,8 @@ class BrainDB:
     @retry(
         stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
         wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
-        retry=retry_if_exception_type(sqlite3.OperationalError)
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
     )
     def import_memory_from_json(self, json_data: str, target_workbase_id: Optional[str] = None, target_project_name: Optional[str] = None) -> int:
         """
@@ -164,7 +859,7 @@ class BrainDB:
 
         for item in data:
             doc = item["document"]
-            meta = item["metadata"]
+            meta = upgrade(item["metadata"])
             
             if target_workbase_id:
                 meta["workbase_id"] = target_workbase_id
@@ -182,52 +877,788 @@ class BrainDB:
             final_docs.append(doc)
             final_metadatas.append(meta)
 
-        self.collection.upsert(
-            ids=final_ids,
-            documents=final_docs,
-            metadatas=final_metadatas
-        )
+        previous = self._existing_metadatas(final_ids)
+        by_workbase = collections.defaultdict(list)
+        for i, meta in enumerate(final_metadatas):
+            by_workbase[meta.get("workbase_id")].append(i)
+        for wb_id, idx in by_workbase.items():
+            self._collection_for(wb_id, create=True).upsert(
+                ids=[final_ids[i] for i in idx],
+                documents=[final_docs[i] for i in idx],
+                metadatas=[final_metadatas[i] for i in idx]
+            )
+        versions = self.registry.apply_changes(added=final_metadatas, removed=previous)
+        self._refresh_caches(versions)
         return len(final_ids)
 
     @retry(
         stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
         wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
-        retry=retry_if_exception_type(sqlite3.OperationalError)
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
     )
     def get_known_workbases(self) -> List[Dict[str, str]]:
-        """Retrieve all unique workbase IDs with project names and root paths."""
-        results = self.collection.get(where={"type": "context"})
-        workbases = {}
-        if results["ids"]:
-            for i in range(len(results["ids"])):
-                meta = results["metadatas"][i]
-                wb_id = meta.get("workbase_id")
-                if wb_id and wb_id not in workbases:
-                    workbases[wb_id] = {
-                        "workbase_id": wb_id,
-                        "project_name": meta.get("project_name", "Unknown"),
-                        "root_path": meta.get("root_path", "")
-                    }
-        return list(workbases.values())
+        """Retrieve all unique workbase IDs with project names and root paths (registry read)."""
+        return [
+            {
+                "workbase_id": wb["workbase_id"],
+                "project_name": wb["project_name"] or "Unknown",
+                "root_path": wb["root_path"]
+            }
+            for wb in self.registry.list_workbases()
+        ]
 
     @retry(
         stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
         wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
-        retry=retry_if_exception_type(sqlite3.OperationalError)
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
     )
     def get_rules(self, workbase_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Retrieve all rules for a specific workbase (or all if None)."""
+        """
+        Retrieve all rules for a specific workbase (or all if None).
+        A workbase's rules are cached until one of them is added, updated or deleted (its
+        rules version changes), so repeated calls return the same list: treat it as read-only.
+        """
+        if workbase_id:
+            version = self.registry.get_rules_version(workbase_id)
+            with self._rules_lock:
+                cached = self._rules.get(workbase_id)
+                if cached is not None and cached[0] == version:
+                    self._rules.move_to_end(workbase_id)
+                    return cached[1]
+
         where = {"type": "rule"}
+        collections_ = self._all_collections()
         if workbase_id:
             where = {"$and": [{"workbase_id": workbase_id}, {"type": "rule"}]}
+            collections_ = [self._collection_for(workbase_id)]
             
-        results = self.collection.get(where=where)
-        
         memories = []
-        for i in range(len(results["ids"])):
-            memories.append({
-                "id": results["ids"][i],
-                "text": results["documents"][i],
-                "metadata": results["metadatas"][i]
-            })
+        for collection in collections_:
+            with metrics.phase("chroma_get"):
+                results = collection.get(where=where)
+            for i in range(len(results["ids"])):
+                memories.append({
+                    "id": results["ids"][i],
+                    "text": results["documents"][i],
+                    "metadata": results["metadatas"][i]
+                })
+
+        if workbase_id and config.RULES_CACHE_WORKBASES > 0:
+            with self._rules_lock:
+                self._rules[workbase_id] = (version, memories)
+                while len(self._rules) > config.RULES_CACHE_WORKBASES:
+                    self._rules.popitem(last=False)
         return memories
+
+    def get_rules_version(self, workbase_id: str) -> int:
+        """Return the rules version of a workbase; it changes only when one of its rules is written."""
+        return self.registry.get_rules_version(workbase_id)
+
+    @retry(
+        stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
+        wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
+    )
+    def get_workbase_embeddings(self, workbase_id: str, categories: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Retrieve the stored embeddings of a workbase (optionally restricted to categories)
+        as an L2-normalized float32 matrix, alongside ids, documents and metadata.
+        """
+        results = self._collection_for(workbase_id).get(
+            where=self._build_where(workbase_id, categories),
+            include=["embeddings", "documents", "metadatas"]
+        )
+        ids = results["ids"]
+        embeddings = results["embeddings"] if len(ids) else []
+        return {
+            "ids": ids,
+            "documents": results["documents"] or [],
+            "metadatas": results["metadatas"] or [],
+            "embeddings": normalize_rows(embeddings) if len(ids) else np.empty((0, 0), dtype=np.float32)
+        }
+
+    def build_knn_graph(self, workbase_id: str, categories: Optional[List[str]] = None, k: Optional[int] = None,
+                        threshold: Optional[float] = None, max_edges: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Build a semantic k-nearest-neighbour graph for a workbase from its stored embeddings.
+        Edges are undirected, above the similarity threshold and pruned to the `max_edges`
+        strongest. The result is cached until the workbase is written again.
+        """
+        k = k or config.GRAPH_NEIGHBORS
+        threshold = config.GRAPH_SIMILARITY_THRESHOLD if threshold is None else threshold
+        max_edges = max_edges or config.GRAPH_MAX_EDGES
+
+        cache_key = (workbase_id, tuple(sorted(categories or [])), k, threshold, max_edges)
+        version = self.get_workbase_version(workbase_id)
+        cached = self._graph_cache.get(cache_key)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        data = self.get_workbase_embeddings(workbase_id, categories)
+        rows, cols, sims = blocked_topk_neighbors(data["embeddings"], k, threshold)
+        rows, cols, sims = prune_edges(rows, cols, sims, max_edges)
+
+        nodes = []
+        for i, memory_id in enumerate(data["ids"]):
+            meta = data["metadatas"][i]
+            nodes.append({
+                "id": memory_id,
+                "text": data["documents"][i],
+                "type": meta.get("type", "unknown"),
+                "category": meta.get("category", "unknown")
+            })
+        edges = [
+            {"source": data["ids"][r], "target": data["ids"][c], "similarity": float(sim)}
+            for r, c, sim in zip(rows.tolist(), cols.tolist(), sims.tolist())
+        ]
+
+        graph = {"nodes": nodes, "edges": edges, "version": version}
+        if len(self._graph_cache) >= 32:
+            self._graph_cache.clear()
+        self._graph_cache[cache_key] = (version, graph)
+        return graph
+
+    def find_duplicate_clusters(self, workbase_id: str, threshold: Optional[float] = None,
+                                types: tuple = ("rule", "context")) -> List[Dict[str, Any]]:
+        """
+        Find clusters of near-identical memories (same type and category). Each cluster is built
+        around the memory to keep (manual entries first, then the newest) and only holds memories
+        whose cosine similarity to it is at least `threshold`, so a chain of merely similar
+        memories is never merged. Per-directory structure chunks are never merged
+        (initialize_workbase owns them).
+        """
+        threshold = config.CONSOLIDATION_THRESHOLD if threshold is None else threshold
+        data = self.get_workbase_embeddings(workbase_id)
+        if not data["ids"]:
+            return []
+
+        metadatas = data["metadatas"]
+        groups = np.array([
+            f"{meta.get('type', 'unknown')}/{meta.get('category', 'unknown')}"
+            if meta.get("type") in types and "structure_path" not in meta else ""
+            for meta in metadatas
+        ])
+        rows, cols, sims = blocked_similar_pairs(data["embeddings"], threshold)
+        same_group = (groups[rows] == groups[cols]) & (groups[rows] != "")
+        rows, cols, sims = rows[same_group], cols[same_group], sims[same_group]
+
+        priority = sorted(range(len(data["ids"])), reverse=True, key=lambda i: (
+            metadatas[i].get("source") == "manual",
+            metadatas[i].get("created_at", "")
+        ))
+        clusters = []
+        for keep, members in star_clusters(priority, rows, cols, sims):
+            clusters.append({
+                "keep": data["ids"][keep],
+                "keep_text": data["documents"][keep],
+                "type": metadatas[keep].get("type", "unknown"),
+                "category": metadatas[keep].get("category", "unknown"),
+                "merged_count": int(metadatas[keep].get("merged_count", 0)),
+                "remove": [
+                    {"id": data["ids"][i], "text": data["documents"][i], "similarity": float(sim)}
+                    for i, sim in members
+                ]
+            })
+        clusters.sort(key=lambda c: len(c["remove"]), reverse=True)
+        return clusters
+
+    def consolidate_workbase(self, workbase_id: str, threshold: Optional[float] = None, apply: bool = False,
+                             batch_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Propose (apply=False) or apply near-duplicate merges for a workbase.
+        Merged memories are deleted in batches; each kept memory records how many
+        duplicates it absorbed in its `merged_count` metadata.
+        Returns a report with the clusters and how much the index shrank.
+        """
+        batch_size = batch_size or config.CONSOLIDATION_BATCH_SIZE
+        before = self.count_memories(workbase_id)
+        clusters = self.find_duplicate_clusters(workbase_id, threshold)
+        to_remove = [m["id"] for c in clusters for m in c["remove"]]
+
+        if apply and to_remove:
+            for start in range(0, len(to_remove), batch_size):
+                self.delete_memories(to_remove[start:start + batch_size])
+            self._collection_for(workbase_id).update(
+                ids=[c["keep"] for c in clusters],
+                metadatas=[{"merged_count": c["merged_count"] + len(c["remove"])} for c in clusters]
+            )
+            versions = self.registry.apply_changes(touched=[workbase_id])
+            self._refresh_caches(versions)
+            after = self.count_memories(workbase_id)
+        else:
+            after = before - len(to_remove)
+
+        return {
+            "workbase_id": workbase_id,
+            "threshold": config.CONSOLIDATION_THRESHOLD if threshold is None else threshold,
+            "applied": apply,
+            "clusters": clusters,
+            "memories_before": before,
+            "memories_after": after,
+            "removed": before - after,
+            "index_shrink_pct": round(100.0 * (before - after) / before, 2) if before else 0.0
+        }
+
+    def delete_workbase(self, workbase_id: str, batch_size: Optional[int] = None, progress=None) -> int:
+        """
+        Delete every memory of a workbase and return how many were removed.
+        With sharding this drops the workbase's collection instead of deleting ids one by one.
+        Rows in the shared collection are deleted through a `where` filter in bounded chunks;
+        `progress(removed, total)` is called after each chunk. Each step retries on a locked
+        database by itself, so a retry never repeats (and recounts) the steps before it.
+        """
+        batch_size = batch_size or config.WORKBASE_BATCH_SIZE
+        total = self.registry.get_total(workbase_id)
+        removed = 0
+        if config.SHARD_BY_WORKBASE:
+            shard = self._collection_for(workbase_id)
+            if shard.name != self.collection.name:
+                removed = shard.count()
+                self.client.delete_collection(shard.name)
+            with self._shards_lock:
+                self._shards.pop(workbase_id, None)
+            if progress:
+                progress(removed, total)
+
+        # Rows still living in the shared collection (unsharded mode or not yet migrated)
+        while True:
+            count = self._delete_workbase_batch(workbase_id, batch_size)
+            if not count:
+                break
+            removed += count
+            if progress:
+                progress(removed, max(total, removed))
+
+        version = self._clear_workbase_registry(workbase_id)
+        self._refresh_caches({workbase_id: version})
+        return removed
+
+    @retry(
+        stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
+        wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
+    )
+    def _clear_workbase_registry(self, workbase_id: str) -> int:
+        return self.registry.clear_workbase(workbase_id)
+
+    @retry(
+        stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
+        wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
+    )
+    def _delete_workbase_batch(self, workbase_id: str, batch_size: int) -> int:
+        batch = self.collection.get(where={"workbase_id": workbase_id}, limit=batch_size, include=["metadatas"])
+        if not batch["ids"]:
+            return 0
+        self.collection.delete(ids=batch["ids"])
+        versions = self.registry.apply_changes(removed=batch["metadatas"])
+        self._refresh_caches(versions, rows=[], removed_ids=batch["ids"])
+        return len(batch["ids"])
+
+    def rename_workbase(self, workbase_id: str, project_name: Optional[str] = None, root_path: Optional[str] = None,
+                        batch_size: Optional[int] = None, progress=None) -> int:
+        """
+        Change a workbase's project name and/or root path (same workbase id).
+        Memories carrying these fields (e.g. the project context) are rewritten in place, metadata
+        only, in chunks; embeddings are kept. Returns how many memories were rewritten.
+        `progress(scanned, total)` is called after each chunk.
+        """
+        if project_name is None and root_path is None:
+            return 0
+        batch_size = batch_size or config.WORKBASE_BATCH_SIZE
+        collection = self._collection_for(workbase_id)
+        total = self.registry.get_total(workbase_id)
+        changes = {k: v for k, v in (("project_name", project_name), ("root_path", root_path)) if v is not None}
+
+        rewritten, offset = 0, 0
+        while True:
+            # Metadata-only updates do not change the filter's matches, so paging by offset is stable
+            batch = collection.get(where={"workbase_id": workbase_id}, offset=offset, limit=batch_size,
+                                   include=["metadatas"])
+            if not batch["ids"]:
+                break
+            offset += len(batch["ids"])
+            ids, metadatas = [], []
+            for memory_id, meta in zip(batch["ids"], batch["metadatas"]):
+                if any(key in meta for key in changes):
+                    ids.append(memory_id)
+                    metadatas.append({**meta, **{k: v for k, v in changes.items() if k in meta}})
+            if ids:
+                self._update_metadatas(collection, ids, metadatas)
+                rewritten += len(ids)
+            if progress:
+                progress(offset, max(total, offset))
+
+        version = self.registry.set_identity(workbase_id, project_name, root_path)
+        self._refresh_caches({workbase_id: version})
+        return rewritten
+
+    @retry(
+        stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
+        wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
+    )
+    def _update_metadatas(self, collection, ids: List[str], metadatas: List[Dict[str, Any]]):
+        collection.update(ids=ids, metadatas=metadatas)
+
+    def move_workbase(self, old_id: str, new_id: str, project_name: Optional[str] = None,
+                      root_path: Optional[str] = None, batch_size: Optional[int] = None, progress=None) -> int:
+        """
+        Re-key every memory of `old_id` to `new_id` (e.g. the project moved to another directory).
+        Works in bounded chunks through a `where` filter: each chunk is copied with its stored
+        embeddings (nothing is re-embedded) under ids and metadata rewritten for the new
+        workbase, then deleted from the old one. Safe to re-run after an interruption.
+        `progress(moved, total)` is called after each chunk. Returns how many memories moved.
+        """
+        if old_id == new_id:
+            return 0
+        batch_size = batch_size or config.WORKBASE_BATCH_SIZE
+        total = self.registry.get_total(old_id)
+        moved = 0
+        while True:
+            count = self._move_workbase_batch(old_id, new_id, project_name, root_path, batch_size)
+            if not count:
+                break
+            moved += count
+            if progress:
+                progress(moved, max(total, moved))
+
+        if config.SHARD_BY_WORKBASE:
+            shard = self._collection_for(old_id)
+            if shard.name != self.collection.name and shard.count() == 0:
+                self.client.delete_collection(shard.name)
+            with self._shards_lock:
+                self._shards.pop(old_id, None)
+        versions = {old_id: self.registry.clear_workbase(old_id)}
+        if project_name is not None or root_path is not None:
+            versions[new_id] = self.registry.set_identity(new_id, project_name, root_path)
+        self._refresh_caches(versions)
+        return moved
+
+    @retry(
+        stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
+        wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
+    )
+    def _move_workbase_batch(self, old_id: str, new_id: str, project_name: Optional[str], root_path: Optional[str],
+                             batch_size: int) -> int:
+        source = self._collection_for(old_id)
+        batch = source.get(where={"workbase_id": old_id}, limit=batch_size,
+                           include=["embeddings", "documents", "metadatas"])
+        if not batch["ids"]:
+            return 0
+
+        new_ids, new_metadatas = [], []
+        for memory_id, document, meta in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+            # Ids embed the workbase (type_wb_hash); others get the same scheme as imports
+            if old_id in memory_id:
+                new_ids.append(memory_id.replace(old_id, new_id))
+            else:
+                new_ids.append(f"{meta.get('type', 'context')}_{new_id}_{hashlib.md5(document.encode('utf-8')).hexdigest()}")
+            new_meta = {**meta, "workbase_id": new_id}
+            if project_name is not None and "project_name" in meta:
+                new_meta["project_name"] = project_name
+            if root_path is not None and "root_path" in meta:
+                new_meta["root_path"] = root_path
+            new_metadatas.append(new_meta)
+
+        embeddings = np.asarray(batch["embeddings"], dtype=np.float32)
+        if len(embeddings) != len(batch["ids"]):
+            raise RuntimeError(
+                "Stored embeddings written by another process are not visible here yet; "
+                "restart this process (or stop the other one) and run the move again."
+            )
+        self._collection_for(new_id, create=True).upsert(
+            ids=new_ids,
+            embeddings=embeddings.tolist(),
+            documents=batch["documents"],
+            metadatas=new_metadatas
+        )
+        source.delete(ids=batch["ids"])
+        versions = self.registry.apply_changes(added=new_metadatas, removed=batch["metadatas"])
+        self._refresh_caches(versions, rows=list(zip(new_ids, batch["documents"], new_metadatas, embeddings)),
+                             removed_ids=batch["ids"])
+        return len(batch["ids"])
+
+    def list_shards(self) -> List[Dict[str, Any]]:
+        """List every memory collection with its workbase (None for the shared one) and size."""
+        return [
+            {
+                "collection": collection.name,
+                "workbase_id": (collection.metadata or {}).get("workbase_id"),
+                "count": collection.count()
+            }
+            for collection in self._all_collections()
+        ]
+
+    def migrate_to_shards(self, batch_size: Optional[int] = None, progress=None) -> Dict[str, int]:
+        """
+        Move memories from the shared collection into per-workbase collections.
+        Works in bounded batches and copies the stored embeddings, so nothing is re-embedded.
+        Memories without a workbase_id stay in the shared collection.
+        `progress(moved, total)` is called after each batch.
+        """
+        if not config.SHARD_BY_WORKBASE:
+            raise RuntimeError("Sharding is disabled. Set MYBRAIN_SHARD_BY_WORKBASE=true first.")
+        batch_size = batch_size or config.SHARD_MIGRATION_BATCH_SIZE
+
+        total = self.collection.count()
+        moved, skipped = 0, 0
+        workbases = set()
+        while True:
+            # Moved rows are deleted, so only rows we keep (no workbase) shift the offset
+            batch = self.collection.get(
+                offset=skipped,
+                limit=batch_size,
+                include=["embeddings", "documents", "metadatas"]
+            )
+            if not batch["ids"]:
+                break
+
+            by_workbase = collections.defaultdict(list)
+            for i, meta in enumerate(batch["metadatas"]):
+                wb_id = (meta or {}).get("workbase_id")
+                if wb_id:
+                    by_workbase[wb_id].append(i)
+                else:
+                    skipped += 1
+
+            moved_ids = []
+            for wb_id, idx in by_workbase.items():
+                self._collection_for(wb_id, create=True).upsert(
+                    ids=[batch["ids"][i] for i in idx],
+                    embeddings=np.asarray([batch["embeddings"][i] for i in idx], dtype=np.float32).tolist(),
+                    documents=[batch["documents"][i] for i in idx],
+                    metadatas=[batch["metadatas"][i] for i in idx]
+                )
+                moved_ids.extend(batch["ids"][i] for i in idx)
+                workbases.add(wb_id)
+            if moved_ids:
+                self.collection.delete(ids=moved_ids)
+            moved += len(moved_ids)
+
+            if progress:
+                progress(moved, total)
+            if not moved_ids and len(batch["ids"]) < batch_size:
+                break
+
+        versions = self.registry.apply_changes(touched=workbases)
+        self._refresh_caches(versions)
+        return {"moved": moved, "skipped": skipped, "workbases": len(workbases)}
+
+    def migrate_schema(self, target: Optional[int] = None, batch_size: Optional[int] = None,
+                       stop_event: Optional[threading.Event] = None, progress=None) -> Dict[str, Any]:
+        """
+        Upgrade stored metadata to schema `target` (default DB_SCHEMA_VERSION) with the steps
+        registered in core.migrations. Each collection is paged with a `schema_version $lt target`
+        filter in bounded batches and only metadata is rewritten (nothing is re-embedded).
+        Upgraded rows drop out of the filter, so a stopped or interrupted run resumes where it
+        left off. Progress is recorded in the registry; `progress(migrated)` is called per batch.
+        """
+        target = target or config.DB_SCHEMA_VERSION
+        batch_size = batch_size or config.MIGRATION_BATCH_SIZE
+        state = self.registry.get_meta("migration_")
+        migrated = int(state.get("migration_migrated") or 0) if state.get("migration_target") == str(target) else 0
+        self.registry.set_meta({
+            "migration_target": target, "migration_state": "running", "migration_migrated": migrated,
+            "migration_started_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
+        })
+
+        done = 0
+        stopped = False
+        for collection in self._all_collections():
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    stopped = True
+                    break
+                count = self._migrate_batch(collection, target, batch_size)
+                if not count:
+                    break
+                done += count
+                self.registry.set_meta({"migration_migrated": migrated + done})
+                if progress:
+                    progress(migrated + done)
+                if stop_event is not None:
+                    stop_event.wait(config.MIGRATION_PAUSE_SECONDS)
+            if stopped:
+                break
+
+        self.registry.set_meta({
+            "migration_state": "stopped" if stopped else "complete",
+            "migration_finished_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
+        })
+        return {"target": target, "migrated": done, "complete": not stopped}
+
+    @retry(
+        stop=stop_after_delay(config.DB_LOCK_RETRY_SECONDS),
+        wait=wait_fixed(config.DB_LOCK_RETRY_INTERVAL),
+        retry=retry_if_exception_type(sqlite3.OperationalError),
+        before_sleep=metrics.record_retry
+    )
+    def _migrate_batch(self, collection, target: int, batch_size: int) -> int:
+        """Upgrade one batch of memories below `target`; returns how many were rewritten."""
+        batch = collection.get(
+            where={"schema_version": {"$lt": target}},
+            limit=batch_size,
+            include=["metadatas"]
+        )
+        if not batch["ids"]:
+            return 0
+        upgraded = [upgrade(meta, target) for meta in batch["metadatas"]]
+        collection.update(ids=batch["ids"], metadatas=upgraded)
+        versions = self.registry.apply_changes(added=upgraded, removed=batch["metadatas"])
+        self._refresh_caches(versions)
+        return len(batch["ids"])
+
+    def get_migration_status(self) -> Dict[str, Any]:
+        """Progress of the last schema migration and memories still below DB_SCHEMA_VERSION."""
+        state = self.registry.get_meta("migration_")
+        pending = sum(
+            len(collection.get(where={"schema_version": {"$lt": config.DB_SCHEMA_VERSION}}, include=[])["ids"])
+            for collection in self._all_collections()
+        )
+        return {
+            "schema_version": config.DB_SCHEMA_VERSION,
+            "pending": pending,
+            **{key[len("migration_"):]: value for key, value in state.items()}
+        }
+
+    def sample_embeddings(self, workbase_id: Optional[str] = None, limit: int = 20000) -> np.ndarray:
+        """Up to `limit` stored embeddings (one workbase or the whole brain), for benchmarking."""
+        if workbase_id:
+            return self.get_workbase_embeddings(workbase_id)["embeddings"][:limit]
+
+        chunks = []
+        remaining = limit
+        for collection in self._all_collections():
+            if remaining <= 0:
+                break
+            results = collection.get(limit=remaining, include=["embeddings"])
+            if len(results["ids"]):
+                chunks.append(np.asarray(results["embeddings"], dtype=np.float32))
+                remaining -= len(results["ids"])
+        return np.vstack(chunks) if chunks else np.empty((0, 0), dtype=np.float32)
+
+    def rebuild_index(self, batch_size: Optional[int] = None, progress=None, reembed: bool = False) -> List[Dict[str, Any]]:
+        """
+        Recreate every memory collection with the HNSW parameters currently configured.
+        Stored embeddings are copied in batches into a fresh collection which then replaces
+        the original, so nothing is re-embedded. With reembed the documents are embedded again
+        by the configured backend instead, and that backend is recorded as the brain's (the
+        way to switch MYBRAIN_EMBEDDING_BACKEND or the model). Other processes using the same
+        data directory should be stopped while this runs.
+        `progress(collection_name, copied, total)` is called after each batch.
+        """
+        batch_size = batch_size or config.HNSW_REBUILD_BATCH_SIZE
+        self._recover_rebuilds()
+        reports = []
+        for collection in self._all_collections():
+            reports.append(self._rebuild_collection(collection, batch_size, progress, reembed))
+
+        self.collection = self._open_collection(config.CHROMA_COLLECTION)
+        with self._shards_lock:
+            self._shards.clear()
+        if reembed:
+            space = self.embedding_fn.describe()
+            if space is not None:
+                self._record_embedding_space(space)
+            # New versions invalidate every matrix, graph and lexical cache built from the old vectors
+            self.registry.apply_changes(touched=[w["workbase_id"] for w in self.registry.list_workbases()])
+        return reports
+
+    def apply_retention(self, age_rules: Dict[tuple, float], keep_latest: List[str] = (), now: Optional[float] = None,
+                        dry_run: bool = False, batch_size: Optional[int] = None,
+                        stop_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Delete memories outside the retention policy (see core.retention):
+        - `age_rules` {(type, source or None): days}: memories older than `days` by `created_ts`
+          (schema v2; memories not migrated yet are skipped until they are), in bounded batches.
+        - `keep_latest` types: only the newest memory of that type is kept per workbase (the
+          project-structure summary and each per-directory chunk are kept separately).
+        With dry_run nothing is deleted and the report counts what each part would remove on its own.
+        """
+        now = now or time.time()
+        batch_size = batch_size or config.RETENTION_BATCH_SIZE
+        report = {"expired": 0, "superseded": 0, "dry_run": dry_run, "rules": {}}
+
+        for (memory_type, source), days in age_rules.items():
+            clauses = [{"type": memory_type}, {"created_ts": {"$lt": now - days * 86400}}]
+            if source:
+                clauses.append({"source": source})
+            where = {"$and": clauses}
+            expired = 0
+            for collection in self._all_collections():
+                offset = 0
+                while not (stop_event is not None and stop_event.is_set()):
+                    ids = collection.get(where=where, offset=offset, limit=batch_size, include=[])["ids"]
+                    if not ids:
+                        break
+                    if dry_run:
+                        offset += len(ids)
+                    else:
+                        self.delete_memories(ids)
+                    expired += len(ids)
+            report["rules"][f"{memory_type}:{source}" if source else memory_type] = expired
+            report["expired"] += expired
+
+        totals = collections.Counter()
+        for row in self.registry.get_stats():
+            if row["type"] in keep_latest:
+                totals[(row["workbase_id"], row["type"])] += row["count"]
+        for (workbase_id, memory_type), total in totals.items():
+            if total < 2:
+                continue
+            if stop_event is not None and stop_event.is_set():
+                break
+            batch = self._collection_for(workbase_id).get(
+                where={"$and": [{"workbase_id": workbase_id}, {"type": memory_type}]},
+                include=["metadatas"]
+            )
+            ranked = sorted(
+                zip(batch["ids"], batch["metadatas"]),
+                key=lambda item: item[1].get("created_ts") or 0,
+                reverse=True
+            )
+            # The project-structure summary and each per-directory chunk are separate slots (each
+            # keeps its own newest copy); initialize_workbase does not re-stamp unchanged ones,
+            # so they must not compete with newer unrelated memories of the same type
+            summary_id = f"context_{workbase_id}"
+            seen, stale = set(), []
+            for memory_id, meta in ranked:
+                slot = ("summary",) if memory_id == summary_id else meta.get("structure_path")
+                if slot in seen:
+                    stale.append(memory_id)
+                seen.add(slot)
+            if stale and not dry_run:
+                self.delete_memories(stale)
+            report["superseded"] += len(stale)
+        return report
+
+    def _probe_query_latency(self, samples: int) -> Dict[str, float]:
+        """p50/p99 (ms) of HNSW queries with up to `samples` stored vectors per collection."""
+        latencies = []
+        for collection in self._all_collections():
+            vectors = collection.get(limit=samples, include=["embeddings"])["embeddings"]
+            for vector in vectors if vectors is not None else []:
+                start = time.perf_counter()
+                collection.query(query_embeddings=[np.asarray(vector).tolist()], n_results=5, include=[])
+                latencies.append((time.perf_counter() - start) * 1000)
+        if not latencies:
+            return {"p50_ms": 0.0, "p99_ms": 0.0, "queries": 0}
+        return {
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            "queries": len(latencies)
+        }
+
+    def compact(self, samples: int = 50, batch_size: Optional[int] = None, progress=None) -> Dict[str, Any]:
+        """
+        Reclaim the space left behind by deletes: rebuild every collection's HNSW index from
+        its stored embeddings (see rebuild_index) and VACUUM the SQLite stores (Chroma, registry,
+        observer journal). Reports bytes on disk and HNSW query latency before and after.
+        Other processes using the same data directory should be stopped while this runs.
+        """
+        size_before = _directory_size(config.BASE_DATA_DIR)
+        latency_before = self._probe_query_latency(samples)
+
+        collections_rebuilt = self.rebuild_index(batch_size=batch_size, progress=progress)
+        vacuumed = []
+        for name in ("chroma.sqlite3", config.REGISTRY_FILE, config.OBSERVER_JOURNAL_FILE):
+            path = config.BASE_DATA_DIR / name
+            if not path.exists():
+                continue
+            conn = sqlite3.connect(str(path), timeout=config.DB_LOCK_RETRY_SECONDS, isolation_level=None)
+            try:
+                conn.execute("VACUUM")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                conn.close()
+            vacuumed.append(name)
+
+        size_after = _directory_size(config.BASE_DATA_DIR)
+        latency_after = self._probe_query_latency(samples)
+        return {
+            "bytes_before": size_before,
+            "bytes_after": size_after,
+            "bytes_reclaimed": size_before - size_after,
+            "latency_before": latency_before,
+            "latency_after": latency_after,
+            "collections": [r["collection"] for r in collections_rebuilt],
+            "vacuumed": vacuumed
+        }
+
+    def _rebuild_collection(self, collection, batch_size: int, progress=None, reembed: bool = False) -> Dict[str, Any]:
+        name = collection.name
+        before = dict(collection.metadata or {})
+        metadata = hnsw_metadata()
+        if before.get("workbase_id"):
+            metadata["workbase_id"] = before["workbase_id"]
+
+        # The copy is recorded in the registry until it has replaced the original, so a crash
+        # at any point can be finished or rolled back by _recover_rebuilds()
+        temp_name = f"{name[:54]}_rebuild"
+        self.registry.set_meta({f"rebuild_{temp_name}": name})
+        target = self.client.create_collection(temp_name, embedding_function=self.embedding_fn, metadata=metadata)
+
+        total = collection.count()
+        copied = 0
+        for offset in range(0, total, batch_size):
+            batch = collection.get(offset=offset, limit=batch_size, include=["embeddings", "documents", "metadatas"])
+            if not batch["ids"]:
+                break
+            embeddings = self._embed(batch["documents"]) if reembed else np.asarray(batch["embeddings"], dtype=np.float32)
+            target.add(
+                ids=batch["ids"],
+                embeddings=embeddings.tolist(),
+                documents=batch["documents"],
+                metadatas=batch["metadatas"]
+            )
+            copied += len(batch["ids"])
+            if progress:
+                progress(name, copied, total)
+
+        self.client.delete_collection(name)
+        target.modify(name=name)
+        self.registry.set_meta({f"rebuild_{temp_name}": None})
+        return {"collection": name, "memories": copied, "before": before, "after": metadata}
+
+    def _recover_rebuilds(self):
+        """
+        Finish or roll back collection rebuilds interrupted by a crash.
+        A copy whose original is gone (or was recreated empty) holds the only data and is renamed
+        into place; a partial copy next to its intact original is dropped.
+        """
+        for key, name in self.registry.get_meta("rebuild_").items():
+            if not name:
+                continue
+            temp_name = key[len("rebuild_"):]
+            try:
+                temp = self.client.get_collection(temp_name, embedding_function=self.embedding_fn)
+            except Exception:
+                temp = None
+            if temp is not None:
+                try:
+                    original_count = self.client.get_collection(name).count()
+                except Exception:
+                    original_count = None
+                if original_count:
+                    self.client.delete_collection(temp_name)
+                    print(f"Dropped partial rebuild copy {temp_name}; {name} is intact", file=sys.stderr)
+                else:
+                    if original_count is not None:
+                        self.client.delete_collection(name)
+                    temp.modify(name=name)
+                    print(f"Finished interrupted rebuild of {name} from {temp_name}", file=sys.stderr)
+            self.registry.set_meta({key: None})
+
+
+def _directory_size(path) -> int:
+    """Total size in bytes of the files under `path`."""
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
@@ -0,0 +1,221 @@
+import re
+import json
+import socket
+import hashlib
+import threading
+import http.client
+import urllib.parse
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+from core import config
+from core.similarity import normalize_rows
+
+
+class SentenceTransformerBackend(EmbeddingFunction[Documents]):
+    """PyTorch sentence-transformers model (the original backend). The model loads on first use."""
+
+    def __init__(self, model_name: str, batch_size: int, num_threads: int = 0):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                if self.num_threads > 0:
+                    import torch
+                    torch.set_num_threads(self.num_threads)
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def describe(self) -> Dict[str, Any]:
+        """Vector space this backend produces (recorded with the brain, see BrainDB)."""
+        return {"backend": "sentence-transformers", "model": self.model_name, "dim": None}
+
+    def __call__(self, input: Documents) -> Embeddings:
+        model = self._model or self._load()
+        vectors = model.encode(list(input), batch_size=self.batch_size, convert_to_numpy=True)
+        return [v for v in vectors.astype(np.float32)]
+
+
+class OnnxBackend(EmbeddingFunction[Documents]):
+    """
+    ONNX Runtime CPU inference of a sentence-transformers model exported to ONNX
+    (optionally int8-quantized, see `cli.py quantize-onnx`).
+    `model_dir` must contain `tokenizer.json` and the model file. Embeddings are mean-pooled
+    over the attention mask and L2-normalized, matching sentence-transformers output for the
+    same model (so distances and conflict thresholds agree across backends).
+    """
+
+    def __init__(self, model_dir: Path, model_file: str, batch_size: int, num_threads: int = 0,
+                 max_length: int = 256):
+        self.model_dir = Path(model_dir).expanduser()
+        self.model_file = model_file
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.max_length = max_length
+        self._session = None
+        self._tokenizer = None
+        self._input_names: List[str] = []
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._session is None:
+                import onnxruntime as ort
+                from tokenizers import Tokenizer
+
+                model_path = self.model_dir / self.model_file
+                tokenizer_path = self.model_dir / "tokenizer.json"
+                if not model_path.exists() or not tokenizer_path.exists():
+                    raise ValueError(f"ONNX backend needs {model_path} and {tokenizer_path}")
+
+                options = ort.SessionOptions()
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                options.inter_op_num_threads = 1
+                if self.num_threads > 0:
+                    options.intra_op_num_threads = self.num_threads
+                session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+
+                tokenizer = Tokenizer.from_file(str(tokenizer_path))
+                tokenizer.enable_truncation(max_length=self.max_length)
+                tokenizer.enable_padding()
+
+                self._input_names = [i.name for i in session.get_inputs()]
+                self._tokenizer = tokenizer
+                self._session = session
+        return self._session
+
+    def describe(self) -> Dict[str, Any]:
+        """Vector space this backend produces (recorded with the brain, see BrainDB)."""
+        return {"backend": "onnx", "model": f"{self.model_dir.name}/{self.model_file}", "dim": None}
+
+    def __call__(self, input: Documents) -> Embeddings:
+        session = self._session or self._load()
+        texts = list(input)
+        out = []
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self._tokenizer.encode_batch(texts[start:start + self.batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+            hidden = session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            # sentence-transformers pipelines (e.g. all-MiniLM-L6-v2) end with a Normalize step
+            out.extend(normalize_rows(pooled))
+        return out
+
+
+class HashingBackend(EmbeddingFunction[Documents]):
+    """
+    Deterministic feature-hashing embeddings (word unigrams and bigrams, signed).
+    No model and no network: meant for tests, benchmarks and offline load testing,
+    not for semantic quality.
+    """
+
+    _TOKEN_RE = re.compile(r"\w+")
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        tokens = self._TOKEN_RE.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if (value >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+            return vector
+        return vector / norm
+
+    def describe(self) -> Dict[str, Any]:
+        """Vector space this backend produces (recorded with the brain, see BrainDB)."""
+        return {"backend": "hashing", "model": "feature-hashing", "dim": self.dim}
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return [self._vector(text) for text in input]
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class RemoteBackend(EmbeddingFunction[Documents]):
+    """
+    Embeddings computed by a shared myBrAIn server (`server.py --transport streamable-http`)
+    through its /embed route, so the process using it never loads a model.
+    `url` is http://host:port or unix:///path/to/socket.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+
+    def _connection(self) -> http.client.HTTPConnection:
+        parsed = urllib.parse.urlparse(self.url)
+        if parsed.scheme == "unix":
+            return _UnixHTTPConnection(parsed.path, self.timeout)
+        return http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=self.timeout)
+
+    def describe(self) -> None:
+        """The space is the server's, which checks it against the brain itself."""
+        return None
+
+    def __call__(self, input: Documents) -> Embeddings:
+        texts = list(input)
+        if not texts:
+            return []
+        connection = self._connection()
+        try:
+            connection.request("POST", "/embed", body=json.dumps({"texts": texts}),
+                               headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            payload = json.loads(response.read() or b"{}")
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise ValueError(f"Remote embedding failed ({response.status}): {payload.get('message', '')}")
+        return [v for v in np.asarray(payload["embeddings"], dtype=np.float32)]
+
+
+def get_embedding_function(backend: Optional[str] = None) -> EmbeddingFunction:
+    """Build the embedding backend selected by MYBRAIN_EMBEDDING_BACKEND (or `backend`)."""
+    backend = (backend or config.EMBEDDING_BACKEND).lower()
+    if backend in ("sentence-transformers", "sentence_transformers", "torch"):
+        return SentenceTransformerBackend(
+            config.EMBEDDING_MODEL, config.EMBEDDING_BATCH_SIZE, config.EMBEDDING_THREADS
+        )
+    if backend == "onnx":
+        if not config.ONNX_MODEL_PATH:
+            raise ValueError("MYBRAIN_ONNX_MODEL_PATH must point to a directory with the ONNX model and tokenizer.json")
+        return OnnxBackend(
+            Path(config.ONNX_MODEL_PATH), config.ONNX_MODEL_FILE, config.EMBEDDING_BATCH_SIZE,
+            config.EMBEDDING_THREADS, config.EMBEDDING_MAX_LENGTH
+        )
+    if backend == "hashing":
+        return HashingBackend(config.HASHING_EMBEDDING_DIM)
+    if backend == "remote":
+        return RemoteBackend(config.SERVER_URL, config.REMOTE_EMBEDDING_TIMEOUT)
+    raise ValueError(f"Unknown embedding backend: {backend}")
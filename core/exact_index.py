@@ -0,0 +1,128 @@
+import threading
+from typing import List, Optional, Dict, Any
+
+import numpy as np
+
+from core.similarity import normalize_rows
+
+
+def metadata_matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluate a flat metadata filter the way Chroma would: each key must equal its value, or,
+    for a {"$ne": value} condition, differ from it.
+    """
+    for key, condition in (where or {}).items():
+        if isinstance(condition, dict) and "$ne" in condition:
+            if metadata.get(key) == condition["$ne"]:
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class WorkbaseMatrix:
+    """
+    In-memory float32 matrix of a single workbase's (L2-normalized) embeddings.
+    Queries are exact: one matrix-vector product per query instead of an HNSW traversal
+    over the shared collection. Results use the same shape as `collection.query`.
+    """
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+                 embeddings: np.ndarray, version: int):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = list(metadatas)
+        self.embeddings = normalize_rows(embeddings) if len(self.ids) else np.empty((0, 0), dtype=np.float32)
+        self.version = version
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # --- Incremental refresh ---
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], embeddings, version: int):
+        """Insert or replace rows after a write made through this process."""
+        vectors = normalize_rows(embeddings)
+        with self._lock:
+            positions = {memory_id: i for i, memory_id in enumerate(self.ids)}
+            new_rows = []
+            for j, memory_id in enumerate(ids):
+                i = positions.get(memory_id)
+                if i is None:
+                    self.ids.append(memory_id)
+                    self.documents.append(documents[j])
+                    self.metadatas.append(metadatas[j])
+                    new_rows.append(vectors[j])
+                else:
+                    self.documents[i] = documents[j]
+                    self.metadatas[i] = metadatas[j]
+                    self.embeddings[i] = vectors[j]
+            if new_rows:
+                stacked = np.vstack(new_rows)
+                self.embeddings = stacked if self.embeddings.size == 0 else np.vstack([self.embeddings, stacked])
+            self.version = version
+
+    def remove(self, ids: List[str], version: int):
+        """Drop rows after a delete made through this process."""
+        doomed = set(ids)
+        with self._lock:
+            keep = [i for i, memory_id in enumerate(self.ids) if memory_id not in doomed]
+            self.ids = [self.ids[i] for i in keep]
+            self.documents = [self.documents[i] for i in keep]
+            self.metadatas = [self.metadatas[i] for i in keep]
+            self.embeddings = self.embeddings[keep] if keep else np.empty((0, 0), dtype=np.float32)
+            self.version = version
+
+    # --- Queries ---
+    def rows(self, ids: List[str]) -> Dict[str, List]:
+        """Stored rows (documents, metadata, normalized embeddings) of the given ids that are present."""
+        with self._lock:
+            positions = {memory_id: i for i, memory_id in enumerate(self.ids)}
+            found = [positions[memory_id] for memory_id in ids if memory_id in positions]
+            return {
+                "ids": [self.ids[i] for i in found],
+                "documents": [self.documents[i] for i in found],
+                "metadatas": [self.metadatas[i] for i in found],
+                "embeddings": [self.embeddings[i] for i in found]
+            }
+
+    def query(self, query_embeddings, limit: int, where: Optional[Dict[str, Any]] = None,
+              include_embeddings: bool = False) -> Dict[str, List]:
+        """
+        Exact cosine search for one or more query vectors.
+        `where` is a flat filter on metadata (e.g. {"type": "rule", "category": {"$ne": "naming"}}).
+        With include_embeddings the (normalized) embeddings of the results are returned too.
+        """
+        queries = normalize_rows(query_embeddings)
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if include_embeddings:
+            results["embeddings"] = []
+
+        with self._lock:
+            candidates = np.arange(len(self.ids))
+            if where:
+                mask = np.fromiter(
+                    (metadata_matches(meta, where) for meta in self.metadatas),
+                    dtype=bool, count=len(self.metadatas)
+                )
+                candidates = candidates[mask]
+
+            if candidates.size == 0:
+                for _ in range(len(queries)):
+                    for key in results:
+                        results[key].append([])
+                return results
+
+            sims = queries @ self.embeddings[candidates].T
+            k = min(limit, candidates.size)
+            for row in sims:
+                top = np.argpartition(-row, k - 1)[:k]
+                top = top[np.argsort(-row[top], kind="stable")]
+                idx = candidates[top]
+                results["ids"].append([self.ids[i] for i in idx])
+                results["documents"].append([self.documents[i] for i in idx])
+                results["metadatas"].append([self.metadatas[i] for i in idx])
+                results["distances"].append(np.clip(1.0 - row[top], 0.0, 2.0).astype(float).tolist())
+                if include_embeddings:
+                    results["embeddings"].append([self.embeddings[i] for i in idx])
+        return results
@@ -0,0 +1,20 @@
+import os
+import tempfile
+import contextlib
+from pathlib import Path
+
+
+def atomic_write(path: Path, text: str):
+    """
+    Replace `path` with `text` atomically: write a temp file in the same directory, then
+    os.replace, so readers (the admin, metric scrapers) never see a partial file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except Exception:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,124 @@
+import sqlite3
+import datetime
+import threading
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Tuple
+
+from core import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts          TEXT NOT NULL,
+    kind        TEXT NOT NULL,
+    workbase_id TEXT,
+    file        TEXT,
+    drift_type  TEXT,
+    rule_id     TEXT,
+    message     TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS events_drift ON events (kind, workbase_id, id);
+"""
+
+
+class ObserverJournal:
+    """
+    Append-only SQLite (WAL) journal of Silent Observer events: log lines, scan start/end
+    and per-file drift findings. Writers only ever INSERT; readers keep the last event id
+    they have seen as a cursor and fetch only newer rows.
+    Old events beyond OBSERVER_JOURNAL_MAX_EVENTS are pruned from the head.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or (config.BASE_DATA_DIR / config.OBSERVER_JOURNAL_FILE)
+        self._lock = threading.Lock()
+        self._appended = 0
+        self._conn = sqlite3.connect(
+            str(self.path),
+            timeout=config.DB_LOCK_RETRY_SECONDS,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    # --- Writes ---
+    def append(self, kind: str, message: str = "", workbase_id: Optional[str] = None, file: Optional[str] = None,
+               drift_type: Optional[str] = None, rule_id: Optional[str] = None) -> int:
+        """Append one event and return its id (the cursor value that includes it)."""
+        return self.append_many([{
+            "kind": kind, "message": message, "workbase_id": workbase_id,
+            "file": file, "drift_type": drift_type, "rule_id": rule_id
+        }])
+
+    def append_many(self, events: List[Dict[str, Any]]) -> int:
+        """Append several events in one transaction; returns the id of the last one."""
+        if not events:
+            return self.last_id()
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.executemany(
+                    "INSERT INTO events (ts, kind, workbase_id, file, drift_type, rule_id, message) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(e.get("ts", now), e["kind"], e.get("workbase_id"), e.get("file"), e.get("drift_type"),
+                      e.get("rule_id"), e.get("message", "")) for e in events]
+                )
+                last_id = cur.lastrowid
+                self._appended += len(events)
+                if self._appended >= config.OBSERVER_JOURNAL_PRUNE_EVERY:
+                    self._appended = 0
+                    cur.execute("DELETE FROM events WHERE id <= ?", (last_id - config.OBSERVER_JOURNAL_MAX_EVENTS,))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return last_id
+
+    # --- Reads ---
+    def last_id(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(id) FROM events").fetchone()
+        return row[0] or 0
+
+    def read_since(self, cursor: int = 0, limit: int = 500, kinds: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Events with id > cursor, oldest first (at most `limit`).
+        Returns (events, new_cursor); pass new_cursor to the next call to get only newer events.
+        """
+        query = "SELECT * FROM events WHERE id > ?"
+        params: list = [cursor]
+        if kinds:
+            query += f" AND kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = [dict(row) for row in self._conn.execute(query, params).fetchall()]
+        return rows, (rows[-1]["id"] if rows else cursor)
+
+    def drift_history(self, workbase_id: Optional[str] = None, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Drift findings, newest first, optionally for a single workbase (indexed, paged in SQL)."""
+        query = "SELECT * FROM events WHERE kind = 'drift'"
+        params: list = []
+        if workbase_id:
+            query += " AND workbase_id = ?"
+            params.append(workbase_id)
+        query += " ORDER BY id DESC LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(query, params).fetchall()]
+
+    def count_drifts(self, workbase_id: Optional[str] = None) -> int:
+        query = "SELECT COUNT(*) FROM events WHERE kind = 'drift'"
+        params: list = []
+        if workbase_id:
+            query += " AND workbase_id = ?"
+            params.append(workbase_id)
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
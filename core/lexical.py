@@ -0,0 +1,173 @@
+import re
+import math
+import threading
+import collections
+from typing import List, Optional, Dict, Any, Tuple
+
+from core import config
+from core.exact_index import metadata_matches
+
+_WORD_RE = re.compile(r"\w+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Identifier-aware tokenization: every word is kept whole (lowercased) and, when it is
+    a compound identifier, also split into its snake_case / camelCase parts.
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        lowered = word.lower()
+        tokens.append(lowered)
+        parts = [p.lower() for chunk in word.split("_") for p in _CAMEL_RE.findall(chunk)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p != lowered)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over one workbase's memory documents.
+    Maintained incrementally (upsert/remove) like the exact-search matrices, so identifier
+    and keyword queries can be answered without an embedding call.
+    """
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], version: int):
+        self.version = version
+        self.postings: Dict[str, Dict[str, int]] = collections.defaultdict(dict)
+        self.doc_terms: Dict[str, collections.Counter] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.documents: Dict[str, str] = {}
+        self.metadatas: Dict[str, Dict[str, Any]] = {}
+        self.total_length = 0
+        self._lock = threading.Lock()
+        for memory_id, document, metadata in zip(ids, documents, metadatas):
+            self._add(memory_id, document, metadata)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    # --- Incremental maintenance ---
+    def _add(self, memory_id: str, document: str, metadata: Dict[str, Any]):
+        terms = collections.Counter(tokenize(document or ""))
+        self.doc_terms[memory_id] = terms
+        self.doc_lengths[memory_id] = sum(terms.values())
+        self.documents[memory_id] = document
+        self.metadatas[memory_id] = metadata
+        self.total_length += self.doc_lengths[memory_id]
+        for term, tf in terms.items():
+            self.postings[term][memory_id] = tf
+
+    def _remove(self, memory_id: str):
+        terms = self.doc_terms.pop(memory_id, None)
+        if terms is None:
+            return
+        self.documents.pop(memory_id, None)
+        self.metadatas.pop(memory_id, None)
+        self.total_length -= self.doc_lengths.pop(memory_id, 0)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(memory_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], embeddings, version: int):
+        """Insert or replace documents after a write made through this process (embeddings are unused)."""
+        with self._lock:
+            for memory_id, document, metadata in zip(ids, documents, metadatas):
+                self._remove(memory_id)
+                self._add(memory_id, document, metadata)
+            self.version = version
+
+    def remove(self, ids: List[str], version: int):
+        with self._lock:
+            for memory_id in ids:
+                self._remove(memory_id)
+            self.version = version
+
+    # --- Queries ---
+    def search(self, query: str, limit: int, where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float, float]]:
+        """
+        Score documents with BM25. `where` is a flat metadata filter (see metadata_matches).
+        Returns (memory_id, score, coverage) tuples, coverage being the fraction of distinct
+        query terms the document contains.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        k1, b = config.BM25_K1, config.BM25_B
+        with self._lock:
+            n = len(self.documents)
+            if n == 0:
+                return []
+            avg_length = self.total_length / n
+            scores: Dict[str, float] = collections.defaultdict(float)
+            matched: Dict[str, int] = collections.defaultdict(int)
+            for term in terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for memory_id, tf in posting.items():
+                    length = self.doc_lengths[memory_id]
+                    scores[memory_id] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+                    matched[memory_id] += 1
+
+            hits = []
+            for memory_id, score in scores.items():
+                if where and not metadata_matches(self.metadatas[memory_id], where):
+                    continue
+                hits.append((memory_id, score, matched[memory_id] / len(terms)))
+        hits.sort(key=lambda h: h[1], reverse=True)
+        return hits[:limit]
+
+    def is_confident(self, query: str, hits: List[Tuple[str, float, float]]) -> bool:
+        """
+        A lexical answer is trusted on its own for short identifier/keyword queries whose best
+        hit contains every query word and scores above MYBRAIN_LEXICAL_CONFIDENT_SCORE.
+        """
+        if not hits or len(_WORD_RE.findall(query)) > config.LEXICAL_MAX_QUERY_WORDS:
+            return False
+        _, score, coverage = hits[0]
+        return coverage >= 1.0 and score >= config.LEXICAL_CONFIDENT_SCORE
+
+    def to_results(self, hits: List[Tuple[str, float, float]]) -> Dict[str, List]:
+        """Format hits like a single-query `collection.query` result (no vector distance)."""
+        with self._lock:
+            return {
+                "ids": [[h[0] for h in hits]],
+                "documents": [[self.documents[h[0]] for h in hits]],
+                "metadatas": [[self.metadatas[h[0]] for h in hits]],
+                "distances": [[None for _ in hits]]
+            }
+
+
+def reciprocal_rank_fusion(result_sets: List[Dict[str, List]], limit: int, k: Optional[int] = None) -> Dict[str, List]:
+    """
+    Merge single-query result sets (collection.query shape) with reciprocal rank fusion:
+    score(d) = sum over result sets of 1 / (k + rank). The first known vector distance
+    of each document is kept.
+    """
+    k = k or config.RRF_K
+    scores: Dict[str, float] = collections.defaultdict(float)
+    entries: Dict[str, tuple] = {}
+    for results in result_sets:
+        if not results["ids"]:
+            continue
+        for rank, memory_id in enumerate(results["ids"][0]):
+            scores[memory_id] += 1.0 / (k + rank + 1)
+            distance = results["distances"][0][rank] if results.get("distances") else None
+            known = entries.get(memory_id)
+            if known is None or (known[2] is None and distance is not None):
+                entries[memory_id] = (results["documents"][0][rank], results["metadatas"][0][rank], distance)
+
+    ranked = sorted(scores, key=lambda memory_id: scores[memory_id], reverse=True)[:limit]
+    return {
+        "ids": [ranked],
+        "documents": [[entries[m][0] for m in ranked]],
+        "metadatas": [[entries[m][1] for m in ranked]],
+        "distances": [[entries[m][2] for m in ranked]]
+    }
@@ -0,0 +1,288 @@
+import os
+import sys
+import json
+import time
+import atexit
+import random
+import socket
+import threading
+import functools
+import contextlib
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Tuple
+
+from core import config
+from core.fileutil import atomic_write
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Reservoir:
+    """
+    Latency/size distribution with a bounded memory footprint: exact count and sum, plus a
+    uniform reservoir sample (Algorithm R) of at most `size` observations for quantiles.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.count = 0
+        self.total = 0.0
+        self.samples: List[float] = []
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.size:
+                self.samples[slot] = value
+
+    def quantiles(self) -> Dict[float, float]:
+        if not self.samples:
+            return {q: 0.0 for q in QUANTILES}
+        ordered = sorted(self.samples)
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(labels) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = []
+    for k, v in pairs:
+        value = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{k}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+class Metrics:
+    """
+    Process-wide counters and distributions (tool latency, per-phase latency, retries,
+    embedding batch sizes, observer scans). Exported as a JSON snapshot (MCP resource,
+    admin) and as a Prometheus text file under BASE_DATA_DIR, one pair of files per process
+    (every stdio agent runs its own server); see load_snapshots / aggregate_snapshots.
+    """
+
+    def __init__(self, reservoir_size: int):
+        self.reservoir_size = reservoir_size
+        self._lock = threading.Lock()
+        self._distributions: Dict[tuple, Reservoir] = {}
+        self._counters: Dict[tuple, float] = {}
+        self._last_export = 0.0
+        self._exported = False
+        self.started_at = time.time()
+        # Host and pid: containers sharing the data directory each have their own pid 1
+        self.process_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    # --- Recording ---
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            reservoir = self._distributions.get(key)
+            if reservoir is None:
+                reservoir = self._distributions[key] = Reservoir(self.reservoir_size)
+            reservoir.add(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        """Record the duration of the block (seconds) into the `name` distribution."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def phase(self, phase: str):
+        """Shorthand for timing one phase of a tool call (embedding, Chroma query, filesystem walk...)."""
+        return self.timer("mybrain_phase_seconds", phase=phase)
+
+    def record_retry(self, retry_state):
+        """tenacity `before_sleep` hook: count every retried attempt per decorated method."""
+        self.inc("mybrain_retries_total", method=getattr(retry_state.fn, "__name__", "unknown"))
+
+    # --- Export ---
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            distributions = [
+                {
+                    "name": name, "labels": dict(labels), "count": r.count, "sum": round(r.total, 6),
+                    **{f"p{int(q * 100)}": round(v, 6) for q, v in r.quantiles().items()},
+                    "samples": [round(v, 6) for v in r.samples]
+                }
+                for (name, labels), r in self._distributions.items()
+            ]
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in self._counters.items()]
+        return {
+            "pid": os.getpid(),
+            "process": self.process_id,
+            "started_at": self.started_at,
+            "generated_at": time.time(),
+            "distributions": distributions,
+            "counters": counters
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text format; every series carries a `process` label so files from several processes merge."""
+        process = {"process": self.process_id}
+        lines = []
+        with self._lock:
+            for name in sorted({k[0] for k in self._distributions}):
+                lines.append(f"# TYPE {name} summary")
+                for (n, labels), r in self._distributions.items():
+                    if n != name:
+                        continue
+                    for q, v in r.quantiles().items():
+                        lines.append(f"{name}{_format_labels(labels, {**process, 'quantile': str(q)})} {v}")
+                    lines.append(f"{name}_sum{_format_labels(labels, process)} {r.total}")
+                    lines.append(f"{name}_count{_format_labels(labels, process)} {r.count}")
+            for name in sorted({k[0] for k in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (n, labels), value in self._counters.items():
+                    if n == name:
+                        lines.append(f"{name}{_format_labels(labels, process)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, force: bool = False):
+        """
+        Write this process's metrics.<host>-<pid>.prom (Prometheus text format) and .json under
+        BASE_DATA_DIR, at most once every METRICS_EXPORT_INTERVAL seconds unless forced. Files
+        are replaced atomically so scrapers and the admin never read a partial file. Files left
+        by dead processes of this host are removed, and this process's own at exit.
+        """
+        now = time.time()
+        if not force and now - self._last_export < config.METRICS_EXPORT_INTERVAL:
+            return
+        self._last_export = now
+        try:
+            atomic_write(_process_file(config.METRICS_PROM_FILE, self.process_id), self.to_prometheus())
+            atomic_write(_process_file(config.METRICS_JSON_FILE, self.process_id), json.dumps(self.snapshot(), indent=2))
+            if not self._exported:
+                self._exported = True
+                atexit.register(self.remove_export)
+            _prune_dead_exports()
+        except Exception as e:
+            print(f"FAILED TO EXPORT METRICS: {e}", file=sys.stderr)
+
+    def remove_export(self):
+        """Delete this process's exported files (its numbers leave the aggregate with it)."""
+        for filename in (config.METRICS_PROM_FILE, config.METRICS_JSON_FILE):
+            with contextlib.suppress(OSError):
+                _process_file(filename, self.process_id).unlink()
+
+
+def _process_file(filename: str, process_id: str) -> Path:
+    """metrics.json -> BASE_DATA_DIR/metrics.<host>-<pid>.json"""
+    name = Path(filename)
+    return config.BASE_DATA_DIR / f"{name.stem}.{process_id}{name.suffix}"
+
+
+def _exported_files(filename: str) -> List[Path]:
+    name = Path(filename)
+    return sorted(config.BASE_DATA_DIR.glob(f"{name.stem}.*{name.suffix}"))
+
+
+def _prune_dead_exports():
+    """Remove exported files of processes on this host that are no longer running."""
+    prefix = f"{socket.gethostname()}-"
+    for filename in (config.METRICS_PROM_FILE, config.METRICS_JSON_FILE):
+        stem = Path(filename).stem
+        for path in _exported_files(filename):
+            process_id = path.name[len(stem) + 1:-len(path.suffix) or None]
+            pid = process_id[len(prefix):]
+            if not process_id.startswith(prefix) or not pid.isdigit():
+                continue
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                with contextlib.suppress(OSError):
+                    path.unlink()
+            except OSError:
+                pass  # alive, owned by another user
+
+
+def load_snapshots() -> List[Dict[str, Any]]:
+    """JSON snapshots exported by every process sharing BASE_DATA_DIR."""
+    snapshots = []
+    for path in _exported_files(config.METRICS_JSON_FILE):
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # removed or being replaced meanwhile
+    return snapshots
+
+
+def aggregate_snapshots(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge per-process snapshots into one with the same shape: counters, counts and sums add up,
+    and quantiles are taken over the pooled reservoir samples, each weighted by how many
+    observations it stands for in its process.
+    """
+    distributions: Dict[tuple, Dict[str, Any]] = {}
+    counters: Dict[tuple, Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        for dist in snapshot["distributions"]:
+            merged = distributions.setdefault(_key(dist["name"], dist["labels"]), {
+                "name": dist["name"], "labels": dist["labels"], "count": 0, "sum": 0.0, "weighted": []
+            })
+            merged["count"] += dist["count"]
+            merged["sum"] += dist["sum"]
+            samples = dist.get("samples") or []
+            merged["weighted"].extend((v, dist["count"] / len(samples)) for v in samples)
+        for counter in snapshot["counters"]:
+            merged = counters.setdefault(_key(counter["name"], counter["labels"]),
+                                         {"name": counter["name"], "labels": counter["labels"], "value": 0})
+            merged["value"] += counter["value"]
+
+    for merged in distributions.values():
+        weighted = sorted(merged.pop("weighted"))
+        total = sum(w for _, w in weighted)
+        for q in QUANTILES:
+            value, seen = 0.0, 0.0
+            for value, weight in weighted:
+                seen += weight
+                if seen > q * total:
+                    break
+            merged[f"p{int(q * 100)}"] = round(value, 6)
+        merged["sum"] = round(merged["sum"], 6)
+    return {
+        "processes": [s.get("process", str(s.get("pid"))) for s in snapshots],
+        "generated_at": max((s["generated_at"] for s in snapshots), default=time.time()),
+        "distributions": list(distributions.values()),
+        "counters": list(counters.values())
+    }
+
+
+def timed_tool(fn):
+    """
+    Wrap an MCP tool: record its latency and call count (labelled by tool name and outcome)
+    and refresh the exported metrics files. Tools report errors as {"status": "error"}.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = fn(*args, **kwargs)
+            if not (isinstance(result, dict) and result.get("status") == "error"):
+                outcome = "ok"
+            return result
+        finally:
+            metrics.observe("mybrain_tool_seconds", time.perf_counter() - start, tool=fn.__name__)
+            metrics.inc("mybrain_tool_calls_total", tool=fn.__name__, outcome=outcome)
+            metrics.export()
+    return wrapper
+
+
+metrics = Metrics(config.METRICS_RESERVOIR_SIZE)
@@ -0,0 +1,87 @@
+import sys
+import datetime
+import threading
+from typing import Callable, Dict, Any, Optional
+
+from core import config
+
+# Schema version -> step that brings one memory's metadata from `version - 1` to `version`.
+# Steps only fill or rewrite metadata fields (never documents or embeddings) and must be
+# idempotent: new writes run every step (see stamp()).
+MIGRATIONS: Dict[int, Callable[[Dict[str, Any]], Dict[str, Any]]] = {}
+
+
+def migration(version: int):
+    """Register the metadata step that upgrades memories to schema `version`."""
+    def decorator(fn):
+        if version in MIGRATIONS:
+            raise ValueError(f"Duplicate migration for schema version {version}")
+        MIGRATIONS[version] = fn
+        return fn
+    return decorator
+
+
+def upgrade(metadata: Dict[str, Any], target: Optional[int] = None) -> Dict[str, Any]:
+    """Apply the steps between the metadata's schema_version (1 when missing) and `target`."""
+    target = target or config.DB_SCHEMA_VERSION
+    metadata = dict(metadata or {})
+    current = int(metadata.get("schema_version") or 1)
+    for version in range(current + 1, target + 1):
+        step = MIGRATIONS.get(version)
+        if step:
+            metadata = step(metadata)
+        metadata["schema_version"] = version
+    return metadata
+
+
+def stamp(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill every field of the current schema on a memory being written (in place)."""
+    metadata.setdefault("created_at", datetime.datetime.now(datetime.timezone.utc).isoformat())
+    for version in sorted(MIGRATIONS):
+        if version <= config.DB_SCHEMA_VERSION:
+            metadata.update(MIGRATIONS[version](dict(metadata)))
+    metadata["schema_version"] = config.DB_SCHEMA_VERSION
+    return metadata
+
+
+def _timestamp(value: Any) -> Optional[float]:
+    try:
+        parsed = datetime.datetime.fromisoformat(str(value))
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+@migration(2)
+def _add_created_ts(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """v2: numeric `created_ts` (epoch seconds) next to `created_at`, so age filters can use `$lt`."""
+    if isinstance(metadata.get("created_ts"), (int, float)):
+        return metadata
+    created = _timestamp(metadata.get("created_at"))
+    if created is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        metadata["created_at"] = now.isoformat()
+        created = now.timestamp()
+    metadata["created_ts"] = created
+    return metadata
+
+
+def start_background_migration(db, stop_event: Optional[threading.Event] = None) -> threading.Thread:
+    """
+    Run db.migrate_schema() in a daemon thread so tools are served while old memories are
+    upgraded. Reads work on either schema version while it runs.
+    """
+    def run():
+        try:
+            report = db.migrate_schema(stop_event=stop_event)
+            if report["migrated"]:
+                print(f"MIGRATION: upgraded {report['migrated']} memories to schema v{report['target']}",
+                      file=sys.stderr)
+        except Exception as e:
+            print(f"MIGRATION FAILED (will resume on next start): {e}", file=sys.stderr)
+
+    thread = threading.Thread(target=run, name="mybrain-migrations", daemon=True)
+    thread.start()
+    return thread
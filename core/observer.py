@@ -1,3 +1,4 @@
+import os
 import threading
 import time
 import json
@@ -8,124 +9,376 @@ from typing import List, Dict, Any, Optional
 from core import config
 from core.db import BrainDB
 from core.analyzer import ProjectAnalyzer
+from core.walker import ParallelWalker, suffix_filter
+from core.journal import ObserverJournal
+from core.fileutil import atomic_write
+from core.metrics import metrics
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+SCAN_EXTENSIONS = {".py", ".js", ".ts", ".go", ".rs"}
+
+
+class ScanBudget:
+    """
+    Per-cycle resource budget for the observer thread.
+    Files are paced to at most `files_per_second` (sleeping on the stop event, which also
+    releases the GIL for request handlers), and the cycle ends once the thread has used
+    `cpu_seconds` of CPU time (measured with time.thread_time, so other threads don't count).
+    """
+
+    def __init__(self, files_per_second: float, cpu_seconds: float, stop_event: threading.Event):
+        self.files_per_second = files_per_second
+        self.cpu_seconds = cpu_seconds
+        self.stop_event = stop_event
+        self.files = 0
+        self._wall_start = time.monotonic()
+        self._cpu_start = time.thread_time()
+
+    def cpu_used(self) -> float:
+        return time.thread_time() - self._cpu_start
+
+    def exhausted(self) -> bool:
+        return self.cpu_seconds > 0 and self.cpu_used() >= self.cpu_seconds
+
+    def consume(self):
+        """Account for one file read and sleep if the cycle is ahead of the allowed rate."""
+        self.files += 1
+        if self.files_per_second <= 0:
+            return
+        ahead = self.files / self.files_per_second - (time.monotonic() - self._wall_start)
+        if ahead > 0:
+            self.stop_event.wait(ahead)
+
+
+class ObserverLock:
+    """
+    Exclusive lock file shared by every server process using the same data directory, so only
+    one of them scans (the others stand by). The OS releases it if the holder dies.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        """Take the lock without blocking; True if this process holds it."""
+        if self._file is not None:
+            return True
+        f = open(self.path, "a+")
+        try:
+            if sys.platform == "win32":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()  # closing the descriptor drops the lock
+            self._file = None
+
 
 class SilentObserver(threading.Thread):
-    def __init__(self, data_dir: Path, active_workbase: dict = None, interval: int = 300):
+    def __init__(self, data_dir: Path, active_workbase=None, interval: int = 300):
         super().__init__()
         self.data_dir = data_dir
         self.interval = interval
         self.state_file = data_dir / "observer_state.json"
         self.daemon = True
         self.stop_event = threading.Event()
-        
+        self.lock = ObserverLock(data_dir / config.OBSERVER_LOCK_FILE)
+
         self.db = None # Lazy init to avoid issues with thread affinity if any
         self.analyzer = ProjectAnalyzer()
-        self.active_workbase = active_workbase or {}
-        
+        self.active_workbase = active_workbase if active_workbase is not None else {}
+
+        # In-memory scan bookkeeping per workbase (file mtimes, drift findings, cached rules)
+        self.schedule: Dict[str, Dict[str, Any]] = {}
+
+        # Append-only event journal (logs, scans, drift findings); the JSON file is only a status snapshot
+        self.journal = ObserverJournal(data_dir / config.OBSERVER_JOURNAL_FILE)
+
         # Initial state
         self.state = {
             "status": "Starting",
             "last_run": "Never",
             "checked_files": 0,
             "drift_detected": False,
-            "logs": ["Observer thread initialized."]
+            "workbases": self._load_workbase_status(),
+            "last_event_id": 0
         }
-        self._write_state()
+        # The state file belongs to the process holding the lock; it is written once scanning starts
+        self._log("Observer thread initialized.")
 
-    def _log(self, message: str):
+    def _load_workbase_status(self) -> Dict[str, Dict[str, Any]]:
+        """Per-workbase status persisted by a previous run (used to resume scheduling)."""
+        try:
+            with open(self.state_file, "r") as f:
+                return json.load(f).get("workbases", {})
+        except Exception:
+            return {}
+
+    def _log(self, message: str, workbase_id: Optional[str] = None, kind: str = "log"):
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
         log_entry = f"[{timestamp}] {message}"
-        self.state["logs"] = [log_entry] + self.state["logs"][:4]
         # Never print to stdout as it breaks MCP protocol
         print(f"SILENT_OBSERVER: {log_entry}", file=sys.stderr)
+        try:
+            self.state["last_event_id"] = self.journal.append(kind, message, workbase_id=workbase_id)
+        except Exception as e:
+            print(f"FAILED TO APPEND OBSERVER EVENT: {e}", file=sys.stderr)
 
     def _write_state(self):
         try:
-            with open(self.state_file, "w") as f:
-                json.dump(self.state, f, indent=2)
+            atomic_write(self.state_file, json.dumps(self.state, indent=2))
         except Exception as e:
             print(f"FAILED TO WRITE OBSERVER STATE: {e}", file=sys.stderr)
 
+    def _lower_priority(self):
+        """Run scans at a lower CPU priority than the MCP request path (per-thread nice on Linux)."""
+        if config.OBSERVER_NICE <= 0:
+            return
+        try:
+            if sys.platform.startswith("linux"):
+                # On Linux, setpriority on a thread id only affects that thread
+                current = os.getpriority(os.PRIO_PROCESS, threading.get_native_id())
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), current + config.OBSERVER_NICE)
+        except Exception as e:
+            print(f"SILENT_OBSERVER: could not lower thread priority: {e}", file=sys.stderr)
+
     def run(self):
-        self.db = BrainDB()
-        self._log("Observer daemon started.")
-        
+        self._lower_priority()
+        try:
+            self._run()
+        finally:
+            self.lock.release()
+
+    def _run(self):
+        standing_by = False
         while not self.stop_event.is_set():
             try:
+                if not self.lock.acquire():
+                    if not standing_by:
+                        self._log("Another server process is running the observer; standing by.")
+                        standing_by = True
+                    if self.stop_event.wait(self.interval):
+                        break
+                    continue
+                if self.db is None:
+                    # Resume from the status the previous lock holder persisted
+                    self.state["workbases"] = self._load_workbase_status()
+                    self.db = BrainDB()
+                    self._log("Observer daemon started.")
+
                 self.state["status"] = "Running"
                 self._write_state()
-                
-                self._perform_scan()
-                
+
+                with metrics.timer("mybrain_observer_cycle_seconds"):
+                    self._perform_scan()
+                metrics.export()
+
                 self.state["status"] = "Sleeping"
                 self.state["last_run"] = datetime.datetime.now().isoformat()
                 self._write_state()
-                
+
                 # Wait for interval or stop event
                 if self.stop_event.wait(self.interval):
                     break
-                    
+
             except Exception as e:
                 self.state["status"] = "Error"
                 self._log(f"Error in scan loop: {e}")
-                self._write_state()
+                if self.lock.acquire():
+                    self._write_state()
                 if self.stop_event.wait(60): # Retry after 1 min on error
                     break
 
+    # --- Scheduling ---
+    def _refresh_schedule(self):
+        """Track every workbase known to the registry; the one used by the last tool call counts as active now."""
+        now = time.time()
+        known = self.db.registry.list_workbases()
+        # Workbases deleted since (no memories left) are neither scheduled nor reported any more
+        known_ids = {wb["workbase_id"] for wb in known}
+        for wb_id in set(self.schedule) - known_ids:
+            del self.schedule[wb_id]
+        for wb_id in set(self.state["workbases"]) - known_ids:
+            del self.state["workbases"][wb_id]
+
+        for wb in known:
+            entry = self.schedule.setdefault(wb["workbase_id"], {
+                "mtimes": {}, "drifts": {}, "rules": None, "rules_loaded": None,
+                **self._restored(wb["workbase_id"])
+            })
+            entry["project_name"] = wb["project_name"] or "Unknown"
+            entry["root_path"] = wb["root_path"]
+            entry["rules_version"] = wb["rules_version"]
+            if wb.get("updated_at"):
+                written = datetime.datetime.fromisoformat(wb["updated_at"]).timestamp()
+                entry["last_activity"] = max(entry["last_activity"], written)
+
+        # Every connected session's workbase counts as active now
+        for active in self._active_entries():
+            active_id = active.get("workbase_id")
+            if active_id in self.schedule:
+                self.schedule[active_id]["last_activity"] = now
+                if active.get("root_path"):
+                    self.schedule[active_id]["root_path"] = active["root_path"]
+
+    def _active_entries(self) -> List[Dict[str, Any]]:
+        """Active workbases: one per session (core.sessions.ActiveWorkbases) or a single plain dict."""
+        if isinstance(self.active_workbase, dict):
+            return [self.active_workbase]
+        return self.active_workbase.all()
+
+    def _restored(self, workbase_id: str) -> Dict[str, Any]:
+        persisted = self.state["workbases"].get(workbase_id, {})
+        return {
+            "last_activity": persisted.get("last_activity", 0.0),
+            "last_scan": persisted.get("last_scan", 0.0),
+            "change_rate": persisted.get("change_rate", 1.0)
+        }
+
+    def _priority(self, entry: Dict[str, Any], now: float) -> float:
+        """
+        Higher runs first: recent activity (exponential decay), observed change rate, and
+        staleness (so idle workbases are still rescanned eventually).
+        """
+        idle_hours = (now - entry["last_activity"]) / 3600
+        activity = 0.5 ** (idle_hours / max(config.OBSERVER_ACTIVITY_HALF_LIFE_HOURS, 1e-6))
+        staleness = min(1.0, (now - entry["last_scan"]) / max(config.OBSERVER_MAX_STALENESS_SECONDS, 1))
+        return activity + entry["change_rate"] + staleness
+
     def _perform_scan(self):
         self._log("Starting codebase scan...")
-        
-        # Read the active workbase set by MCP tools
-        wb_id = self.active_workbase.get("workbase_id")
-        root_path_str = self.active_workbase.get("root_path", "")
-        project_name = self.active_workbase.get("project_name", "Unknown")
-        
-        if not wb_id:
-            self._log("No active workbase yet. Waiting for first tool call.")
-            self.state["drift_detected"] = False
-            return
-        
-        if not root_path_str:
-            self._log(f"Active workbase '{project_name}' has no root_path. Skipping.")
+        self._refresh_schedule()
+
+        if not self.schedule:
+            self._log("No known workbases yet. Waiting for first tool call.")
             self.state["drift_detected"] = False
             return
-        
-        root = Path(root_path_str)
-        if not root.exists() or not root.is_dir():
-            self._log(f"Path for '{project_name}' not accessible. Skipping.")
-            self.state["drift_detected"] = False
+
+        now = time.time()
+        ordered = sorted(self.schedule.items(), key=lambda item: self._priority(item[1], now), reverse=True)
+        budget = ScanBudget(config.OBSERVER_FILES_PER_SECOND, config.OBSERVER_CPU_BUDGET_SECONDS, self.stop_event)
+
+        for wb_id, entry in ordered:
+            if self.stop_event.is_set():
+                return
+            if budget.exhausted():
+                self._set_status(wb_id, entry, "Deferred", priority=self._priority(entry, now))
+                continue
+            self._scan_workbase(wb_id, entry, budget, priority=self._priority(entry, now))
+            self._write_state()
+
+        statuses = self.state["workbases"].values()
+        self.state["checked_files"] = sum(s.get("checked_files", 0) for s in statuses)
+        self.state["drift_detected"] = any(s.get("drifts", 0) > 0 for s in statuses)
+        self._log(f"Cycle complete. {budget.files} files read, {budget.cpu_used():.2f}s CPU.")
+
+    def _set_status(self, wb_id: str, entry: Dict[str, Any], status: str, **extra):
+        persisted = self.state["workbases"].setdefault(wb_id, {})
+        persisted.update({
+            "project_name": entry.get("project_name", "Unknown"),
+            "status": status,
+            "last_activity": entry["last_activity"],
+            "last_scan": entry["last_scan"],
+            "change_rate": round(entry["change_rate"], 4),
+            **extra
+        })
+
+    def _scan_workbase(self, wb_id: str, entry: Dict[str, Any], budget: ScanBudget, priority: float):
+        project_name = entry["project_name"]
+        root = Path(entry["root_path"]) if entry["root_path"] else None
+        if root is None or not root.exists() or not root.is_dir():
+            self._set_status(wb_id, entry, "Unreachable", priority=priority)
             return
-        
-        # Retrieve rules for the active workbase
-        rules = self.db.get_rules(wb_id)
-        
+
+        # Rules are re-read only when one of them changed (writes of other memory types leave the
+        # rules version alone); a rules change forces a full rescan
+        if entry["rules_loaded"] != entry["rules_version"]:
+            entry["rules"] = self.db.get_rules(wb_id)
+            entry["rules_loaded"] = entry["rules_version"]
+            entry["mtimes"].clear()
+            entry["drifts"].clear()
+        rules = entry["rules"]
         if not rules:
-            self._log(f"No rules for '{project_name}'. Skipping.")
-            self.state["drift_detected"] = False
+            self._set_status(wb_id, entry, "No rules", priority=priority)
             return
-        
-        self._log(f"Scanning '{project_name}' ({len(rules)} rules)...")
-        
-        drifts_found = 0
-        files_checked = 0
-        
-        for p in root.rglob("*"):
-            if self.stop_event.is_set(): return
-            
-            if p.is_file() and p.suffix.lower() in [".py", ".js", ".ts", ".go", ".rs"]:
-                if any(ignored in p.parts for ignored in config.IGNORED_DIRS):
+
+        self._log(f"Scanning '{project_name}' ({len(rules)} rules)...", workbase_id=wb_id, kind="scan_start")
+        findings: List[Dict[str, Any]] = []
+        try:
+            with metrics.timer("mybrain_observer_scan_seconds"):
+                self._scan_files(wb_id, entry, root, rules, budget, priority, findings)
+        finally:
+            # Drift findings of this workbase are journaled in one transaction
+            if findings:
+                self.state["last_event_id"] = self.journal.append_many(findings)
+
+    def _scan_files(self, wb_id: str, entry: Dict[str, Any], root: Path, rules: List[Dict], budget: ScanBudget,
+                    priority: float, findings: List[Dict[str, Any]]):
+        project_name = entry["project_name"]
+        seen = set()
+        changed = 0
+        # Walked in this thread (workers=0): the walk is lazy, paced by the budget below, and its
+        # readdir/stat CPU time counts towards OBSERVER_CPU_BUDGET_SECONDS
+        walker = ParallelWalker(root, file_filter=suffix_filter(SCAN_EXTENSIONS), stop_event=self.stop_event,
+                                workers=0)
+        with walker:
+            for f in walker.files():
+                if self.stop_event.is_set():
+                    return
+                if budget.exhausted():
+                    # Files read so far keep their mtimes: the next cycle resumes incrementally
+                    self._set_status(wb_id, entry, "Partial", priority=priority, checked_files=len(seen),
+                                     drifts=sum(len(d) for d in entry["drifts"].values()))
+                    return
+
+                key = str(f.path)
+                seen.add(key)
+                if entry["mtimes"].get(key) == f.mtime:
                     continue
-                
-                files_checked += 1
-                drifts = self.analyzer.detect_memory_drift(p, rules)
+
+                changed += 1
+                metrics.inc("mybrain_observer_files_read_total")
+                budget.consume()
+                entry["mtimes"][key] = f.mtime
+                drifts = self.analyzer.detect_memory_drift(f.path, rules)
                 if drifts:
-                    drifts_found += len(drifts)
+                    entry["drifts"][key] = drifts
                     for d in drifts:
-                        self._log(f"Drift in {project_name}/{p.name}: {d['drift_type']}")
-        
-        self.state["checked_files"] = files_checked
-        self.state["drift_detected"] = drifts_found > 0
-        self._log(f"Scan complete. {files_checked} files, {drifts_found} drifts.")
+                        findings.append({
+                            "kind": "drift", "workbase_id": wb_id, "file": key, "drift_type": d["drift_type"],
+                            "rule_id": d.get("rule_id"), "message": d.get("evidence", "")
+                        })
+                    print(f"SILENT_OBSERVER: Drift in {project_name}/{f.name}: {len(drifts)} finding(s)", file=sys.stderr)
+                else:
+                    entry["drifts"].pop(key, None)
+        if self.stop_event.is_set():
+            return  # the walk was cut short: `seen` is incomplete
+
+        # Forget files that disappeared since the last complete scan
+        for key in set(entry["mtimes"]) - seen:
+            entry["mtimes"].pop(key, None)
+            entry["drifts"].pop(key, None)
+
+        entry["last_scan"] = time.time()
+        entry["change_rate"] = 0.5 * entry["change_rate"] + 0.5 * (changed / max(1, len(seen)))
+        drift_count = sum(len(d) for d in entry["drifts"].values())
+        self._set_status(wb_id, entry, "Scanned", priority=priority, checked_files=len(seen),
+                         changed_files=changed, drifts=drift_count)
+        self._log(f"Scanned '{project_name}': {len(seen)} files ({changed} changed), {drift_count} drifts.",
+                  workbase_id=wb_id, kind="scan_complete")
 
     def stop(self):
         self.stop_event.set()
@@ -0,0 +1,116 @@
+import sys
+import json
+import time
+import pstats
+import inspect
+import hashlib
+import cProfile
+import datetime
+import threading
+import functools
+import collections
+from pathlib import Path
+from typing import Dict
+
+from core import config
+
+
+class StackSampler(threading.Thread):
+    """
+    Sampling profiler for one thread: every `interval` seconds the target thread's stack is
+    captured and counted, producing collapsed stacks ("outer;inner;leaf count") that
+    flamegraph.pl, speedscope or inferno can render.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Dict[str, int] = collections.Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+def _enabled_for(tool: str) -> bool:
+    return "all" in config.PROFILE_TOOLS or tool in config.PROFILE_TOOLS
+
+
+def _rotate(directory: Path):
+    """Keep only the newest PROFILE_KEEP profiles (a profile is its .pstats + .collapsed pair)."""
+    profiles = sorted(directory.glob("*.pstats"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in profiles[config.PROFILE_KEEP:]:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".collapsed").unlink(missing_ok=True)
+
+
+def run_profiled(tool: str, fn, args, kwargs):
+    """
+    Run `fn` under cProfile (deterministic, written as .pstats) and a stack sampler
+    (written as .collapsed) and save both to BASE_DATA_DIR/profiles.
+    Returns (result, path of the .pstats file without suffix).
+    """
+    directory = config.BASE_DATA_DIR / config.PROFILE_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha1(
+        json.dumps([args, {k: v for k, v in kwargs.items() if k != "ctx"}], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:12]
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    base = directory / f"{stamp}_{tool}_{digest}"
+
+    sampler = StackSampler(threading.get_ident(), config.PROFILE_SAMPLE_INTERVAL)
+    profiler = cProfile.Profile()
+    sampler.start()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        return fn(*args, **kwargs), base
+    finally:
+        profiler.disable()
+        sampler.stop()
+        elapsed = time.perf_counter() - start
+        try:
+            pstats.Stats(profiler).dump_stats(str(base.with_suffix(".pstats")))
+            base.with_suffix(".collapsed").write_text(sampler.collapsed())
+            _rotate(directory)
+            print(f"PROFILE: {tool} took {elapsed:.3f}s, saved {base}.pstats", file=sys.stderr)
+        except Exception as e:
+            print(f"FAILED TO WRITE PROFILE: {e}", file=sys.stderr)
+
+
+def profiled(fn):
+    """
+    Opt-in profiling for an MCP tool: enabled for every call when the tool is listed in
+    MYBRAIN_PROFILE ("all" or comma-separated tool names), or per call with `profile=True`
+    when the tool accepts that argument. When neither applies the call goes straight
+    through. A per-call profile adds its file path to the tool's result.
+    """
+    tool = fn.__name__
+    if "profile" not in inspect.signature(fn).parameters and not _enabled_for(tool):
+        return fn  # nothing can turn profiling on for this tool: no wrapper at all
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not kwargs.get("profile") and not _enabled_for(tool):
+            return fn(*args, **kwargs)
+        result, base = run_profiled(tool, fn, args, kwargs)
+        if kwargs.get("profile") and isinstance(result, dict):
+            result["profile"] = str(base.with_suffix(".pstats"))
+        return result
+    return wrapper
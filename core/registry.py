@@ -0,0 +1,272 @@
+import sqlite3
+import datetime
+import threading
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Iterable
+
+from core import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workbases (
+    workbase_id  TEXT PRIMARY KEY,
+    project_name TEXT NOT NULL DEFAULT '',
+    root_path    TEXT NOT NULL DEFAULT '',
+    version      INTEGER NOT NULL DEFAULT 0,
+    updated_at   TEXT,
+    rules_version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS counts (
+    workbase_id TEXT NOT NULL,
+    type        TEXT NOT NULL,
+    category    TEXT NOT NULL,
+    count       INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (workbase_id, type, category)
+);
+CREATE TABLE IF NOT EXISTS registry_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class WorkbaseRegistry:
+    """
+    SQLite sidecar holding one row per workbase (name, root path, write version, and a
+    rules version that only moves when one of its rules is written) and materialized
+    memory counts per (type, category).
+    BrainDB keeps it in sync on every write so lookups and dashboard metrics are O(1) reads
+    instead of collection scans. It is shared by every process using the same BASE_DATA_DIR.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or (config.BASE_DATA_DIR / config.REGISTRY_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path),
+            timeout=config.DB_LOCK_RETRY_SECONDS,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(workbases)")}
+            if "rules_version" not in columns:
+                # Registries created before rules were versioned separately
+                self._conn.execute("ALTER TABLE workbases ADD COLUMN rules_version INTEGER NOT NULL DEFAULT 0")
+
+    # --- Writes ---
+    def apply_changes(self, added: Iterable[Dict[str, Any]] = (), removed: Iterable[Dict[str, Any]] = (),
+                      touched: Iterable[Optional[str]] = ()) -> Dict[str, int]:
+        """
+        Record a write in one transaction: increment counts for `added` metadata, decrement
+        them for `removed` metadata and bump the version of every affected workbase.
+        The rules version is bumped too when a rule is among the changes, or for `touched`
+        workbases (the nature of their change is unknown).
+        Returns the new version of each affected workbase.
+        """
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                versions = self._apply_changes(cur, added, removed, touched)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return versions
+
+    @staticmethod
+    def _apply_changes(cur: sqlite3.Cursor, added: Iterable[Dict[str, Any]], removed: Iterable[Dict[str, Any]],
+                       touched: Iterable[Optional[str]]) -> Dict[str, int]:
+        """Body of apply_changes; the caller holds the lock and an open transaction."""
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        added, removed, touched = list(added), list(removed), set(touched)
+        affected = {m.get("workbase_id") for m in added + removed} | touched
+        affected.discard(None)
+        rules_changed = {m.get("workbase_id") for m in added + removed if m.get("type") == "rule"} | touched
+
+        for meta, delta in [(m, -1) for m in removed] + [(m, 1) for m in added]:
+            if not meta.get("workbase_id"):
+                continue
+            cur.execute(
+                "INSERT INTO counts (workbase_id, type, category, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(workbase_id, type, category) DO UPDATE SET count = MAX(0, count + excluded.count)",
+                (meta["workbase_id"], meta.get("type", "unknown"), meta.get("category", "unknown"), delta)
+            )
+        cur.execute("DELETE FROM counts WHERE count <= 0")
+
+        # Only memories carrying project identity (e.g. contexts) update name/root path
+        names = {
+            m["workbase_id"]: m for m in added
+            if m.get("workbase_id") and (m.get("project_name") or m.get("root_path"))
+        }
+        versions = {}
+        for wb_id in affected:
+            meta = names.get(wb_id, {})
+            rules_bump = 1 if wb_id in rules_changed else 0
+            cur.execute(
+                "INSERT INTO workbases (workbase_id, project_name, root_path, version, updated_at, rules_version) "
+                "VALUES (?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT(workbase_id) DO UPDATE SET "
+                "project_name = CASE WHEN excluded.project_name != '' THEN excluded.project_name ELSE project_name END, "
+                "root_path = CASE WHEN excluded.root_path != '' THEN excluded.root_path ELSE root_path END, "
+                "version = version + 1, updated_at = excluded.updated_at, "
+                "rules_version = rules_version + excluded.rules_version",
+                (wb_id, meta.get("project_name") or "", meta.get("root_path") or "", now, rules_bump)
+            )
+            versions[wb_id] = cur.execute(
+                "SELECT version FROM workbases WHERE workbase_id = ?", (wb_id,)
+            ).fetchone()[0]
+        return versions
+
+    def clear_workbase(self, workbase_id: str) -> int:
+        """Drop every count of a workbase (all its memories were deleted) and return its new version."""
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.execute("DELETE FROM counts WHERE workbase_id = ?", (workbase_id,))
+                cur.execute(
+                    "UPDATE workbases SET version = version + 1, rules_version = rules_version + 1, updated_at = ? "
+                    "WHERE workbase_id = ?",
+                    (now, workbase_id)
+                )
+                row = cur.execute("SELECT version FROM workbases WHERE workbase_id = ?", (workbase_id,)).fetchone()
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return row[0] if row else 0
+
+    def set_identity(self, workbase_id: str, project_name: Optional[str] = None, root_path: Optional[str] = None) -> int:
+        """Rename a workbase and/or change its root path; returns its new version."""
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.execute(
+                    "UPDATE workbases SET project_name = COALESCE(?, project_name), root_path = COALESCE(?, root_path), "
+                    "version = version + 1, updated_at = ? WHERE workbase_id = ?",
+                    (project_name, root_path, now, workbase_id)
+                )
+                row = cur.execute("SELECT version FROM workbases WHERE workbase_id = ?", (workbase_id,)).fetchone()
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return row[0] if row else 0
+
+    def rebuild(self, metadatas: Iterable[Dict[str, Any]]):
+        """
+        Recompute every count and workbase row from a full scan of memory metadata.
+        Runs as one transaction, so other processes never see a half-rebuilt registry, and
+        marks the registry bootstrapped only once the rebuild has succeeded.
+        """
+        metadatas = list(metadatas)
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                versions = {
+                    row["workbase_id"]: (row["version"], row["rules_version"])
+                    for row in cur.execute("SELECT workbase_id, version, rules_version FROM workbases").fetchall()
+                }
+                cur.execute("DELETE FROM counts")
+                cur.execute("DELETE FROM workbases")
+                self._apply_changes(cur, metadatas, (), ())
+                # Versions keep increasing across rebuilds so caches keyed on them are invalidated
+                cur.executemany(
+                    "UPDATE workbases SET version = version + ?, rules_version = rules_version + ? "
+                    "WHERE workbase_id = ?",
+                    [(version, rules_version, wb_id) for wb_id, (version, rules_version) in versions.items()]
+                )
+                cur.execute("INSERT OR REPLACE INTO registry_meta (key, value) VALUES ('bootstrapped', '1')")
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def set_meta(self, values: Dict[str, Any]):
+        """Store key/value bookkeeping (e.g. migration progress) in one transaction."""
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.executemany(
+                    "INSERT OR REPLACE INTO registry_meta (key, value) VALUES (?, ?)",
+                    [(k, None if v is None else str(v)) for k, v in values.items()]
+                )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    # --- Reads ---
+    def get_meta(self, prefix: str = "") -> Dict[str, Optional[str]]:
+        """Bookkeeping values whose key starts with `prefix`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM registry_meta WHERE key LIKE ? ORDER BY key", (prefix + "%",)
+            ).fetchall()
+        return {row["key"]: row["value"] for row in rows}
+
+    def is_bootstrapped(self) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM registry_meta WHERE key = 'bootstrapped'").fetchone()
+        return row is not None
+
+    def get_workbase(self, workbase_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT workbase_id, project_name, root_path, version, rules_version, updated_at "
+                "FROM workbases WHERE workbase_id = ?",
+                (workbase_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get_version(self, workbase_id: str) -> int:
+        workbase = self.get_workbase(workbase_id)
+        return workbase["version"] if workbase else 0
+
+    def get_rules_version(self, workbase_id: str) -> int:
+        """Version that changes only when a rule of the workbase is added, updated or deleted."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT rules_version FROM workbases WHERE workbase_id = ?", (workbase_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get_total(self, workbase_id: str) -> int:
+        """Number of memories stored for a workbase."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(count), 0) FROM counts WHERE workbase_id = ?", (workbase_id,)
+            ).fetchone()
+        return row[0]
+
+    def list_workbases(self) -> List[Dict[str, Any]]:
+        """All workbases that still hold memories, with their total count."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT w.workbase_id, w.project_name, w.root_path, w.version, w.rules_version, w.updated_at, "
+                "SUM(c.count) AS total "
+                "FROM workbases w JOIN counts c ON c.workbase_id = w.workbase_id "
+                "GROUP BY w.workbase_id ORDER BY w.project_name"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_stats(self, workbase_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Memory counts per (workbase, type, category), optionally for a single workbase."""
+        query = "SELECT workbase_id, type, category, count FROM counts"
+        params = ()
+        if workbase_id:
+            query += " WHERE workbase_id = ?"
+            params = (workbase_id,)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,52 @@
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from core import config
+
+# (type, source or None) -> maximum age in days
+AgeRules = Dict[Tuple[str, Optional[str]], float]
+
+
+def parse_age_rules(spec: str) -> AgeRules:
+    """Parse MYBRAIN_RETENTION_DAYS ("context:agent=30,insight=365") into age rules."""
+    rules: AgeRules = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        key, _, days = part.partition("=")
+        memory_type, _, source = key.strip().partition(":")
+        if not memory_type or not days.strip():
+            raise ValueError(f"Invalid retention rule: {part!r} (expected type[:source]=days)")
+        rules[(memory_type, source or None)] = float(days)
+    return rules
+
+
+def retention_policy() -> Tuple[AgeRules, List[str]]:
+    """The configured policy: age rules and the types of which only the newest memory is kept."""
+    return parse_age_rules(config.RETENTION_DAYS), sorted(config.RETENTION_KEEP_LATEST)
+
+
+def start_retention_job(db, stop_event: threading.Event) -> Optional[threading.Thread]:
+    """
+    Enforce the retention policy every RETENTION_INTERVAL_SECONDS in a daemon thread.
+    Returns None when no policy is configured.
+    """
+    age_rules, keep_latest = retention_policy()
+    if not age_rules and not keep_latest:
+        return None
+
+    def run():
+        while not stop_event.is_set():
+            try:
+                report = db.apply_retention(age_rules, keep_latest, stop_event=stop_event)
+                if report["expired"] or report["superseded"]:
+                    print(f"RETENTION: expired {report['expired']}, superseded {report['superseded']} memories",
+                          file=sys.stderr)
+            except Exception as e:
+                print(f"RETENTION FAILED: {e}", file=sys.stderr)
+            stop_event.wait(config.RETENTION_INTERVAL_SECONDS)
+
+    thread = threading.Thread(target=run, name="mybrain-retention", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,47 @@
+import threading
+import weakref
+from typing import Any, Dict, List, Optional
+
+
+class ActiveWorkbases:
+    """
+    The workbase each MCP session is working on. Over stdio there is a single session; a
+    shared HTTP server has one per connected agent. Entries are dropped with their session.
+    Calls made without a session (direct calls, benchmarks) share one local entry.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+        self._local = self._empty()
+        self._last = self._local
+
+    @staticmethod
+    def _empty() -> Dict[str, Any]:
+        return {"workbase_id": None, "root_path": None, "project_name": None}
+
+    def for_session(self, session: Optional[Any]) -> Dict[str, Any]:
+        """The (mutable) entry of a session, created on first use; also marks it most recent."""
+        with self._lock:
+            if session is None:
+                entry = self._local
+            else:
+                entry = self._sessions.get(session)
+                if entry is None:
+                    entry = self._sessions[session] = self._empty()
+            self._last = entry
+            return entry
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Read from the most recently used session (dict-style, like the former global dict)."""
+        return self._last.get(key, default)
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Entries of live sessions that have a workbase."""
+        with self._lock:
+            entries = list(self._sessions.values()) + [self._local]
+        return [dict(e) for e in entries if e.get("workbase_id")]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
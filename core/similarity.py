@@ -0,0 +1,158 @@
+from typing import Tuple
+
+import numpy as np
+
+from core import config
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of `matrix` with L2-normalized rows (zero rows stay zero)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def blocked_topk_neighbors(embeddings: np.ndarray, k: int, threshold: float,
+                           block_size: int = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute the top-k cosine neighbours of every row of `embeddings`.
+    Similarities are computed one block of rows at a time (block x N matrix product), so peak
+    memory stays bounded regardless of corpus size. Self-matches and neighbours below
+    `threshold` are dropped.
+    Returns parallel arrays (rows, cols, similarities).
+    """
+    block_size = block_size or config.SIMILARITY_BLOCK_SIZE
+    matrix = normalize_rows(embeddings)
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    if n < 2 or k <= 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+
+    all_rows, all_cols, all_sims = [], [], []
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        sims = matrix[start:end] @ matrix.T
+        # Exclude self-similarity
+        sims[np.arange(end - start), np.arange(start, end)] = -np.inf
+
+        cols = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(sims, cols, axis=1)
+        rows = np.repeat(np.arange(start, end), k).reshape(end - start, k)
+
+        keep = top >= threshold
+        all_rows.append(rows[keep])
+        all_cols.append(cols[keep])
+        all_sims.append(top[keep])
+
+    return np.concatenate(all_rows), np.concatenate(all_cols), np.concatenate(all_sims).astype(np.float32)
+
+
+def prune_edges(rows: np.ndarray, cols: np.ndarray, sims: np.ndarray,
+                max_edges: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Collapse directed neighbour pairs into undirected edges and keep the `max_edges`
+    strongest ones.
+    """
+    if rows.size == 0:
+        return rows, cols, sims
+
+    lo = np.minimum(rows, cols)
+    hi = np.maximum(rows, cols)
+    # Sort by similarity (desc) so the first occurrence of each pair is its strongest
+    order = np.argsort(-sims, kind="stable")
+    lo, hi, sims = lo[order], hi[order], sims[order]
+    _, first = np.unique(np.stack([lo, hi], axis=1), axis=0, return_index=True)
+    first = np.sort(first)[:max_edges]
+    return lo[first], hi[first], sims[first]
+
+
+def blocked_similar_pairs(embeddings: np.ndarray, threshold: float,
+                          block_size: int = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find every pair (i < j) whose cosine similarity is at least `threshold`.
+    Only the upper triangle is materialized, one block of rows at a time.
+    Returns parallel arrays (rows, cols, similarities).
+    """
+    block_size = block_size or config.SIMILARITY_BLOCK_SIZE
+    matrix = normalize_rows(embeddings)
+    n = matrix.shape[0]
+
+    all_rows, all_cols, all_sims = [], [], []
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        sims = matrix[start:end] @ matrix[start:].T
+        # Keep only j > i (strict upper triangle relative to the global index)
+        _mask_lower(sims)
+        r, c = np.nonzero(sims >= threshold)
+        all_rows.append(r + start)
+        all_cols.append(c + start)
+        all_sims.append(sims[r, c])
+
+    if not all_rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    return np.concatenate(all_rows), np.concatenate(all_cols), np.concatenate(all_sims).astype(np.float32)
+
+
+def _mask_lower(sims: np.ndarray):
+    """Set the diagonal and lower triangle of a (b x m) block, b <= m, to -inf in place."""
+    b = sims.shape[0]
+    lower = np.tril(np.ones((b, b), dtype=bool))
+    sims[:, :b][lower] = -np.inf
+
+
+def star_clusters(priority: list, rows: np.ndarray, cols: np.ndarray, sims: np.ndarray) -> list:
+    """
+    Group node indices linked by (rows[i], cols[i]) edges around centers, taken in `priority`
+    order (best first): each unassigned node becomes a center and claims its unassigned direct
+    neighbours. Every member is therefore linked to its own center, never only through a chain.
+    Returns [(center, [(member, similarity), ...])]; singletons are omitted.
+    """
+    neighbours = {}
+    for a, b, sim in zip(rows.tolist(), cols.tolist(), sims.tolist()):
+        neighbours.setdefault(a, []).append((b, sim))
+        neighbours.setdefault(b, []).append((a, sim))
+
+    assigned = set()
+    clusters = []
+    for center in priority:
+        if center in assigned or center not in neighbours:
+            continue
+        assigned.add(center)
+        members = [(i, sim) for i, sim in neighbours[center] if i not in assigned]
+        assigned.update(i for i, _ in members)
+        if members:
+            clusters.append((center, sorted(members)))
+    return clusters
+
+
+def maximal_marginal_relevance(query: np.ndarray, candidates: np.ndarray, k: int,
+                               lambda_mult: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Greedy maximal marginal relevance over `candidates` (one embedding per row): each pick
+    maximizes lambda * sim(query, c) - (1 - lambda) * max sim(c, already picked).
+    Vectorized: one candidates x vector product per pick keeps the running redundancy.
+    Returns (picked row indices in order, their query similarities).
+    """
+    matrix = normalize_rows(candidates)
+    n = matrix.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    relevance = matrix @ normalize_rows(query)[0]
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    picked = []
+    for _ in range(k):
+        scores = np.where(available, lambda_mult * relevance - (1.0 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, matrix @ matrix[best], out=redundancy)
+    picked = np.asarray(picked, dtype=np.int64)
+    return picked, relevance[picked]
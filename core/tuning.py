@@ -0,0 +1,85 @@
+import time
+import uuid
+import itertools
+from typing import List, Optional, Dict, Any
+
+import numpy as np
+import chromadb
+
+from core import config
+from core.similarity import normalize_rows
+
+
+def hnsw_metadata(m: Optional[int] = None, construction_ef: Optional[int] = None,
+                  search_ef: Optional[int] = None) -> Dict[str, Any]:
+    """Collection metadata for a cosine HNSW index (defaults come from config)."""
+    return {
+        "hnsw:space": "cosine",
+        "hnsw:M": m or config.HNSW_M,
+        "hnsw:construction_ef": construction_ef or config.HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": search_ef or config.HNSW_SEARCH_EF,
+    }
+
+
+def exact_topk(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Brute-force ground truth: indices of the k most similar corpus rows for each query."""
+    sims = normalize_rows(queries) @ normalize_rows(corpus).T
+    k = min(k, corpus.shape[0])
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def tune_hnsw(embeddings: np.ndarray, m_values: List[int], construction_ef_values: List[int],
+              search_ef_values: List[int], k: int = 10, num_queries: int = 100,
+              seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Benchmark a grid of HNSW settings on real embeddings.
+    `num_queries` rows are held out as queries; the rest are indexed into a throwaway
+    in-memory collection per setting. Each setting reports recall@k against exact
+    brute-force ground truth, p50/p99 query latency and build time.
+    """
+    embeddings = normalize_rows(embeddings)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(embeddings.shape[0])
+    num_queries = min(num_queries, max(1, embeddings.shape[0] // 5))
+    queries = embeddings[order[:num_queries]]
+    corpus = embeddings[order[num_queries:]]
+    if corpus.shape[0] <= k:
+        raise ValueError(f"Not enough embeddings to tune: need more than {k + num_queries}.")
+
+    truth = exact_topk(corpus, queries, k)
+    ids = [str(i) for i in range(corpus.shape[0])]
+    client = chromadb.EphemeralClient()
+    batch = client.get_max_batch_size()
+
+    results = []
+    for m, construction_ef, search_ef in itertools.product(m_values, construction_ef_values, search_ef_values):
+        name = f"tune_{uuid.uuid4().hex[:12]}"
+        collection = client.create_collection(name, metadata=hnsw_metadata(m, construction_ef, search_ef))
+        try:
+            start = time.perf_counter()
+            for offset in range(0, len(ids), batch):
+                collection.add(ids=ids[offset:offset + batch], embeddings=corpus[offset:offset + batch].tolist())
+            build_seconds = time.perf_counter() - start
+
+            latencies = []
+            hits = 0
+            for qi in range(queries.shape[0]):
+                start = time.perf_counter()
+                found = collection.query(query_embeddings=[queries[qi].tolist()], n_results=k, include=[])
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += len({int(i) for i in found["ids"][0]} & set(truth[qi].tolist()))
+
+            results.append({
+                "M": m,
+                "construction_ef": construction_ef,
+                "search_ef": search_ef,
+                "recall_at_k": round(hits / (k * queries.shape[0]), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+                "build_seconds": round(build_seconds, 3)
+            })
+        finally:
+            client.delete_collection(name)
+    return results
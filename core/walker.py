@@ -0,0 +1,229 @@
+import os
+import threading
+import collections
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from core import config
+
+
+class FileEntry(NamedTuple):
+    name: str
+    path: Path
+    size: int
+    mtime: float
+
+
+Listing = Tuple[List[str], List[FileEntry]]
+
+
+def suffix_filter(suffixes: Iterable[str], exclude: bool = False) -> Callable[[str], bool]:
+    """File-name predicate keeping (or, with exclude=True, dropping) the given lowercase suffixes."""
+    suffixes = frozenset(suffixes)
+    if exclude:
+        return lambda name: os.path.splitext(name)[1].lower() not in suffixes
+    return lambda name: os.path.splitext(name)[1].lower() in suffixes
+
+
+class ParallelWalker:
+    """
+    Directory walker that fans `os.scandir` and the per-file `stat` calls out over a pool of
+    threads, for trees where readdir/stat latency (network or overlay filesystems) dominates.
+
+    Each worker owns a deque: it pushes the subdirectories it finds onto its own tail and pops
+    from there (depth-first, close to the order the consumer asks for), and an idle worker
+    steals from the head of another worker's deque. Iteration is still deterministic: like a
+    top-down `os.walk` with sorted names, listings are yielded in pre-order with sorted
+    subdirectories and files, whatever order the workers finished in.
+
+    Directories named in `ignored_dirs` are not entered and symlinked directories are not
+    followed. Only files accepted by `file_filter` (called with the bare name) are stat'ed and
+    yielded. The walk ends early when `stop_event` is set or the walker is closed (use it as a
+    context manager when the loop may break out early).
+
+    Workers stay at most WALKER_MAX_AHEAD listings ahead of the consumer, so a slow or throttled
+    consumer also slows the walk. With `workers=0` directories are scanned lazily in the
+    consuming thread itself (no pool), so its time.thread_time() covers the whole walk.
+    """
+
+    def __init__(self, root: Path, ignored_dirs: Optional[Iterable[str]] = None,
+                 file_filter: Optional[Callable[[str], bool]] = None,
+                 stop_event: Optional[threading.Event] = None, workers: Optional[int] = None):
+        self.root = Path(root)
+        self.ignored_dirs = set(config.IGNORED_DIRS if ignored_dirs is None else ignored_dirs)
+        self.file_filter = file_filter
+        self.stop_event = stop_event
+        self.workers = max(0, config.WALKER_THREADS if workers is None else workers)
+        self.max_ahead = max(1, config.WALKER_MAX_AHEAD)
+
+        self._cond = threading.Condition()
+        self._queues = [collections.deque() for _ in range(self.workers)]
+        self._listings: Dict[Path, Listing] = {}
+        self._wanted: Optional[Path] = None  # directory the consumer is waiting for
+        self._queued: set = set()  # directories in a deque and not claimed yet
+        self._pending = 0  # directories queued or being scanned
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._threads: List[threading.Thread] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Stop the workers; directories not yet scanned are abandoned."""
+        with self._cond:
+            self._closed = True
+            self._listings.clear()
+            self._cond.notify_all()
+
+    def _cancelled(self) -> bool:
+        return self._closed or (self.stop_event is not None and self.stop_event.is_set())
+
+    def _next_directory(self, index: int) -> Optional[Path]:
+        """Own tail first, then steal from the head of the fullest other deque. Caller holds the lock."""
+        if len(self._listings) >= self.max_ahead:
+            # Lookahead is full: only the directory the consumer is blocked on may be scanned.
+            # It stays in its deque and is skipped there once claimed.
+            if self._wanted in self._queued:
+                self._queued.discard(self._wanted)
+                return self._wanted
+            return None
+        own = self._queues[index]
+        while own:
+            directory = own.pop()
+            if directory in self._queued:
+                self._queued.discard(directory)
+                return directory
+        while True:
+            victim = max(self._queues, key=len)
+            if not victim:
+                return None
+            directory = victim.popleft()
+            if directory in self._queued:
+                self._queued.discard(directory)
+                return directory
+
+    def _work(self, index: int):
+        while True:
+            with self._cond:
+                while True:
+                    if self._cancelled() or self._pending == 0:
+                        self._cond.notify_all()
+                        return
+                    directory = self._next_directory(index)
+                    if directory is not None:
+                        break
+                    self._cond.wait(0.1)
+
+            try:
+                dirs, files = self._scan(directory)
+            except BaseException as e:
+                with self._cond:
+                    self._error = self._error or e
+                    self._closed = True
+                    self._cond.notify_all()
+                return
+
+            with self._cond:
+                self._listings[directory] = (dirs, files)
+                # Reversed so the first subdirectory is popped (and yielded) first
+                subdirs = [directory / d for d in reversed(dirs)]
+                self._queues[index].extend(subdirs)
+                self._queued.update(subdirs)
+                self._pending += len(dirs) - 1
+                self._cond.notify_all()
+
+    def _scan(self, directory: Path) -> Listing:
+        dirs, files = [], []
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            return dirs, files  # unreadable directory: skipped, like os.walk
+
+        for entry in entries:
+            if self._cancelled():
+                break
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name not in self.ignored_dirs and not entry.is_symlink():
+                    dirs.append(entry.name)
+                continue
+            if self.file_filter is not None and not self.file_filter(entry.name):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue  # vanished or dangling symlink
+            files.append(FileEntry(entry.name, directory / entry.name, st.st_size, st.st_mtime))
+
+        dirs.sort()
+        files.sort(key=lambda f: f.name)
+        return dirs, files
+
+    def _take(self, directory: Path) -> Optional[Listing]:
+        with self._cond:
+            self._wanted = directory
+            self._cond.notify_all()
+            while directory not in self._listings:
+                if self._error is not None:
+                    raise self._error
+                if self._cancelled():
+                    return None
+                self._cond.wait(0.1)
+            self._wanted = None
+            listing = self._listings.pop(directory)
+            self._cond.notify_all()  # room in the lookahead again
+            return listing
+
+    def __iter__(self) -> Iterator[Tuple[Path, List[str], List[FileEntry]]]:
+        """Yield (directory, subdirectory names, files) in deterministic pre-order."""
+        if not self.workers:
+            yield from self._iter_inline()
+            return
+        self._queues[0].append(self.root)
+        self._queued.add(self.root)
+        self._pending = 1
+        self._threads = [
+            threading.Thread(target=self._work, args=(i,), name=f"mybrain-walker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+        try:
+            stack = [self.root]
+            while stack:
+                directory = stack.pop()
+                listing = self._take(directory)
+                if listing is None:
+                    return
+                dirs, files = listing
+                yield directory, dirs, files
+                stack.extend(directory / d for d in reversed(dirs))
+        finally:
+            self.close()
+
+    def _iter_inline(self) -> Iterator[Tuple[Path, List[str], List[FileEntry]]]:
+        stack = [self.root]
+        try:
+            while stack and not self._cancelled():
+                directory = stack.pop()
+                dirs, files = self._scan(directory)
+                if self._cancelled():
+                    return
+                yield directory, dirs, files
+                stack.extend(directory / d for d in reversed(dirs))
+        finally:
+            self.close()
+
+    def files(self) -> Iterator[FileEntry]:
+        """Every accepted file in the tree, in the same deterministic order."""
+        for _, _, files in self:
+            yield from files
@@ -1,57 +1,111 @@
 import sys
 import hashlib
 import json
+import argparse
+import functools
 from pathlib import Path
 from typing import Optional
 
-from mcp.server.fastmcp import FastMCP
+import anyio
+from mcp.server.fastmcp import FastMCP, Context
+from mcp.server.transport_security import TransportSecuritySettings
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 
-from core.config import CONFLICT_DISTANCE_THRESHOLD
+from core import config
+from core.config import (
+    CONFLICT_DISTANCE_THRESHOLD, CRITIQUE_RULES_PER_CHUNK, RECALL_FETCH_K, RECALL_STRUCTURE_CHUNKS, CHARS_PER_TOKEN
+)
 from core.db import BrainDB
 from core.analyzer import ProjectAnalyzer
+from core.walker import ParallelWalker, suffix_filter
+from core.metrics import metrics, timed_tool
+from core.profiling import profiled
+from core.sessions import ActiveWorkbases
 
-# Initialize MCP server
-mcp = FastMCP("myBrAIn")
+# Initialize MCP server (host/port only apply to the HTTP transports)
+mcp = FastMCP("myBrAIn", host=config.SERVER_HOST, port=config.SERVER_PORT)
 
 # Initialize components
 db = BrainDB()
 analyzer = ProjectAnalyzer()
 
-# Shared state: tracks the workbase the user is currently interacting with.
-# The SilentObserver reads this to know which project to scan.
-active_workbase = {"workbase_id": None, "root_path": None, "project_name": None}
+# Shared state: tracks the workbase each session (agent) is currently interacting with.
+# The SilentObserver reads this to know which projects are active.
+active_workbases = ActiveWorkbases()
 
-def _set_active_workbase(workbase_id: str, root_path: str = None, project_name: str = None):
-    """Update the active workbase reference. Called by every tool."""
+# True when serving many sessions over HTTP: the process's working directory belongs to no agent
+shared_server = False
+
+def threaded_tool(fn):
+    """
+    Register `fn` as an MCP tool whose body runs in a worker thread. FastMCP would run a
+    synchronous tool on the event loop, where one slow call (audit, initialization) stalls
+    every session of a shared server and /health. `fn` itself stays a plain function for
+    direct callers.
+    """
+    @functools.wraps(fn)
+    async def run(*args, **kwargs):
+        return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs))
+    mcp.tool()(run)
+    return fn
+
+def _set_active_workbase(ctx: Optional[Context], workbase_id: str, root_path: str = None, project_name: str = None):
+    """Update the calling session's active workbase. Called by every tool."""
+    active_workbase = active_workbases.for_session(ctx.session if ctx else None)
+    if active_workbase["workbase_id"] != workbase_id:
+        active_workbase["root_path"] = active_workbase["project_name"] = None
     active_workbase["workbase_id"] = workbase_id
     if root_path:
         active_workbase["root_path"] = root_path
     if project_name:
         active_workbase["project_name"] = project_name
-    # If we don't have root_path yet, try to look it up from DB context
+    # If we don't have root_path yet, try to look it up from the workbase registry
     if not active_workbase["root_path"]:
         try:
-            ctx = db.collection.get(ids=[f"context_{workbase_id}"])
-            if ctx["metadatas"]:
-                active_workbase["root_path"] = ctx["metadatas"][0].get("root_path", "")
-                active_workbase["project_name"] = ctx["metadatas"][0].get("project_name", "")
+            known = db.get_workbase(workbase_id)
+            if known:
+                active_workbase["root_path"] = known["root_path"]
+                active_workbase["project_name"] = known["project_name"]
         except Exception:
             pass
     print(f"ACTIVE_WORKBASE: {active_workbase.get('project_name', '?')}", file=sys.stderr)
 
-@mcp.tool()
-def initialize_workbase(root_path: str) -> dict:
+def _resolve_root(ctx: Optional[Context], directory_path: Optional[str]) -> Path:
+    """
+    Project directory for a tool call; without a path, the calling session's active workbase root.
+    Over stdio relative paths resolve against the agent's own working directory (the server runs
+    in it). A shared server's working directory belongs to no agent, so they are rejected there.
+    """
+    if not directory_path:
+        directory_path = active_workbases.for_session(ctx.session if ctx else None).get("root_path")
+        if not directory_path:
+            if shared_server:
+                raise ValueError("No directory given and this session has no active workbase; pass an absolute path.")
+            directory_path = "."
+    elif shared_server and not Path(directory_path).expanduser().is_absolute():
+        raise ValueError(f"Relative path '{directory_path}' is ambiguous on a shared server; pass an absolute path.")
+    return analyzer.normalize_path(directory_path)
+
+@threaded_tool
+@timed_tool
+@profiled
+def initialize_workbase(root_path: Optional[str] = None, profile: bool = False, ctx: Context = None) -> dict:
     """
-    Validate, normalize and analyze a project directory.
+    Validate, normalize and analyze a project directory (an absolute path when the server is
+    shared; defaults to this session's active workbase).
     Creates or updates the workbase context.
+    Set profile=True to capture a profile of this call (saved under the data directory).
     """
     try:
-        path = analyzer.normalize_path(root_path)
+        path = _resolve_root(ctx, root_path)
         workbase_id = analyzer.get_workbase_id(path)
         
         # Analyze project
-        structure = analyzer.scan_structure(path)
-        style = analyzer.detect_style(path)
+        with metrics.phase("fs_walk"):
+            structure = analyzer.scan_structure(path)
+            chunks = analyzer.scan_structure_chunks(path)
+            style = analyzer.detect_style(path)
         
         # Save context to DB
         metadata = {
@@ -63,27 +117,41 @@ def initialize_workbase(root_path: str) -> dict:
             "source": "agent"
         }
         
-        # Update/Add context
-        db.add_memory(
-            memory_id=f"context_{workbase_id}",
-            text=f"Structure:\n{structure}\n\nStyle:\n{json.dumps(style)}",
-            metadata=metadata
-        )
+        # Root summary (context_{workbase_id}) plus one chunk per directory; only chunks whose
+        # content changed since the last call are re-embedded, vanished directories are dropped
+        summary = f"Structure:\n{structure}\n\nStyle:\n{json.dumps(style)}"
+        memories = [{
+            "id": f"context_{workbase_id}",
+            "document": summary,
+            "metadata": {**metadata, "content_hash": hashlib.md5(summary.encode("utf-8")).hexdigest()}
+        }]
+        for chunk in chunks:
+            path_hash = hashlib.md5(chunk["path"].encode("utf-8")).hexdigest()
+            memories.append({
+                "id": f"context_{workbase_id}_{path_hash}",
+                "document": chunk["text"],
+                "metadata": {**metadata, "structure_path": chunk["path"], "content_hash": chunk["content_hash"]}
+            })
+        synced = db.sync_structure_context(workbase_id, memories)
         
         # Set as active workbase
-        _set_active_workbase(workbase_id, root_path=str(path), project_name=path.name)
+        _set_active_workbase(ctx, workbase_id, root_path=str(path), project_name=path.name)
         
         return {
             "workbase_id": workbase_id,
             "status": "linked",
-            "style": style
+            "style": style,
+            "structure_chunks": synced
         }
     except Exception as e:
         print(f"Error initializing workbase: {e}", file=sys.stderr)
         return {"status": "error", "message": str(e)}
 
-@mcp.tool()
-def store_insight(content: str, category: str, workbase_id: str, force: bool = False, replace_id: Optional[str] = None) -> dict:
+@threaded_tool
+@timed_tool
+@profiled
+def store_insight(content: str, category: str, workbase_id: str, force: bool = False, replace_id: Optional[str] = None,
+                  ctx: Context = None) -> dict:
     """
     Store a project rule or insight.
     Performs semantic conflict detection before saving.
@@ -92,7 +160,7 @@ def store_insight(content: str, category: str, workbase_id: str, force: bool = F
     try:
         # Normalize workbase_id to hash
         workbase_id = analyzer.get_workbase_id(workbase_id)
-        _set_active_workbase(workbase_id)
+        _set_active_workbase(ctx, workbase_id)
         # If explicit replacement is requested
         if replace_id:
             try:
@@ -139,71 +207,133 @@ def store_insight(content: str, category: str, workbase_id: str, force: bool = F
         print(f"Error storing insight: {e}", file=sys.stderr)
         return {"status": "error", "message": str(e)}
 
-@mcp.tool()
-def recall_context(query: str, workbase_id: str) -> dict:
+@threaded_tool
+@timed_tool
+@profiled
+def recall_context(query: str, workbase_id: str, diverse: bool = False, max_chars: Optional[int] = None,
+                   max_tokens: Optional[int] = None, limit: int = 5, ctx: Context = None) -> dict:
     """
     Retrieve relevant project rules and context for a query.
+    Set diverse=True to re-rank an over-fetched candidate set for diversity (no near-duplicate
+    paraphrases), and/or max_chars / max_tokens to get as many results as fit in that budget
+    in one call (diverse ranking is then used automatically).
+    Project-structure memories come after the others, at most RECALL_STRUCTURE_CHUNKS of them.
     """
     try:
         # Normalize workbase_id to hash
         workbase_id = analyzer.get_workbase_id(workbase_id)
-        _set_active_workbase(workbase_id)
-        results = db.search(query, workbase_id, limit=5)
-        
-        memories = []
-        if results["ids"]:
-            for i in range(len(results["ids"][0])):
-                memories.append({
-                    "id": results["ids"][0][i],
-                    "text": results["documents"][0][i],
-                    "category": results["metadatas"][0][i].get("category", "unknown"),
-                    "type": results["metadatas"][0][i].get("type", "unknown")
-                })
+        _set_active_workbase(ctx, workbase_id)
+        budget = max_chars or (int(max_tokens * CHARS_PER_TOKEN) if max_tokens else None)
+        # Per-directory structure chunks would otherwise outnumber and crowd out the rules
+        not_structure = {"category": {"$ne": "project_structure"}}
+        if diverse or budget:
+            # With a budget, rank the whole candidate pool; packing decides how many are returned
+            results = db.search_diverse(query, workbase_id, limit=RECALL_FETCH_K if budget else limit,
+                                        where=not_structure)
+        else:
+            results = db.search(query, workbase_id, limit=limit, where=not_structure)
+        memories = _to_memories(results)
+
+        # Structure memories fill the slots left over (with a budget, packing decides)
+        slots = RECALL_STRUCTURE_CHUNKS if budget else min(RECALL_STRUCTURE_CHUNKS, limit - len(memories))
+        if slots > 0:
+            memories += _to_memories(db.search(query, workbase_id, limit=slots,
+                                               where={"category": "project_structure"}))
         
+        if budget:
+            packed = _pack_to_budget(memories, budget)
+            return {"results": packed, "budget_chars": budget, "used_chars": sum(len(m["text"]) for m in packed),
+                    "omitted": len(memories) - len(packed)}
         return {"results": memories}
     except Exception as e:
         print(f"Error recalling context: {e}", file=sys.stderr)
         return {"status": "error", "message": str(e)}
 
-@mcp.tool()
-def critique_code(code_snippet: str, workbase_id: str) -> dict:
+def _to_memories(results: dict) -> list:
+    """Flatten single-query search results into recall_context entries."""
+    memories = []
+    if results["ids"]:
+        for i in range(len(results["ids"][0])):
+            memories.append({
+                "id": results["ids"][0][i],
+                "text": results["documents"][0][i],
+                "category": results["metadatas"][0][i].get("category", "unknown"),
+                "type": results["metadatas"][0][i].get("type", "unknown")
+            })
+    return memories
+
+def _pack_to_budget(memories: list, budget: int) -> list:
+    """
+    Keep memories in rank order while their texts fit in `budget` characters; ones that do
+    not fit are skipped so smaller lower-ranked ones can still use the remaining space.
+    The top memory is always returned (truncated if it alone exceeds the budget).
+    """
+    packed, used = [], 0
+    for memory in memories:
+        if used + len(memory["text"]) <= budget:
+            packed.append(memory)
+            used += len(memory["text"])
+    if not packed and memories:
+        packed.append({**memories[0], "text": memories[0]["text"][:budget], "truncated": True})
+    return packed
+
+@threaded_tool
+@timed_tool
+@profiled
+def critique_code(code_snippet: str, workbase_id: str, ctx: Context = None) -> dict:
     """
     Analyze a code snippet against stored project rules.
     """
     try:
         # Normalize workbase_id to hash
         workbase_id = analyzer.get_workbase_id(workbase_id)
-        _set_active_workbase(workbase_id)
+        _set_active_workbase(ctx, workbase_id)
         # In a real scenario, this would involve LLM reasoning.
         # For Core v1, we perform semantic search to find relevant rules.
-        relevant_rules = db.search(code_snippet, workbase_id, limit=3, category=None)
-        
+        # Long snippets are split (function/class boundaries, or line windows) so the tail is not
+        # truncated by the model; all chunks go through one batched multi-query search.
+        chunks = analyzer.split_code(code_snippet)
+        results = db.search_many([c["text"] for c in chunks], workbase_id, limit=CRITIQUE_RULES_PER_CHUNK,
+                                 where={"type": "rule"})
+
+        # Aggregate per rule: best distance and the line ranges of the chunks that matched it
+        matches = {}
+        for chunk, ids, documents, distances in zip(chunks, results["ids"], results["documents"], results["distances"]):
+            for memory_id, document, distance in zip(ids, documents, distances):
+                match = matches.setdefault(memory_id, {"rule": document, "distance": distance, "lines": []})
+                match["distance"] = min(match["distance"], distance)
+                match["lines"].append([chunk["start_line"], chunk["end_line"]])
+
         violations = []
-        if relevant_rules["ids"]:
-            for i in range(len(relevant_rules["ids"][0])):
-                # Heuristic: if distance is small, it's a "relevant rule" that might be violated
-                # In Core v1, we return these as potential matches to check against.
-                violations.append({
-                    "rule": relevant_rules["documents"][0][i],
-                    "severity": "info",
-                    "message": "Review this snippet against the found project pattern."
-                })
+        for match in sorted(matches.values(), key=lambda m: m["distance"]):
+            # Heuristic: if distance is small, it's a "relevant rule" that might be violated
+            # In Core v1, we return these as potential matches to check against.
+            violations.append({
+                "rule": match["rule"],
+                "severity": "info",
+                "message": "Review this snippet against the found project pattern.",
+                "lines": match["lines"]
+            })
         
         return {"violations": violations}
     except Exception as e:
         print(f"Error critiquing code: {e}", file=sys.stderr)
         return {"status": "error", "message": str(e)}
 
-@mcp.tool()
-def audit_codebase(directory_path: Optional[str] = None) -> dict:
+@threaded_tool
+@timed_tool
+@profiled
+def audit_codebase(directory_path: Optional[str] = None, profile: bool = False, ctx: Context = None) -> dict:
     """
     Scan the codebase for architectural drift against stored memories.
     Identifies contradictions and suggests self-healing updates.
+    Without directory_path the session's active workbase is audited.
+    Set profile=True to capture a profile of this call (saved under the data directory).
     """
     try:
-        root = analyzer.normalize_path(directory_path or ".")
+        root = _resolve_root(ctx, directory_path)
         workbase_id = analyzer.get_workbase_id(root)
-        _set_active_workbase(workbase_id, root_path=str(root))
+        _set_active_workbase(ctx, workbase_id, root_path=str(root))
         
         # Retrieve architecture and constraint rules
         all_rules = db.get_rules(workbase_id)
@@ -217,12 +347,11 @@ def audit_codebase(directory_path: Optional[str] = None) -> dict:
             
         drifts = []
         # Scan files (limited to relevant extensions)
-        for p in root.rglob("*"):
-            if p.is_file() and p.suffix.lower() in [".py", ".js", ".ts", ".go", ".rs"]:
-                if any(ignored in p.parts for ignored in analyzer.ignored_dirs):
-                    continue
-                
-                file_drifts = analyzer.detect_memory_drift(p, architectural_rules)
+        with metrics.phase("fs_walk"):
+            source_files = suffix_filter({".py", ".js", ".ts", ".go", ".rs"})
+            walker = ParallelWalker(root, analyzer.ignored_dirs, file_filter=source_files)
+            for f in walker.files():
+                file_drifts = analyzer.detect_memory_drift(f.path, architectural_rules)
                 drifts.extend(file_drifts)
         
         report = []
@@ -243,14 +372,111 @@ def audit_codebase(directory_path: Optional[str] = None) -> dict:
         print(f"Error auditing codebase: {e}", file=sys.stderr)
         return {"status": "error", "message": str(e)}
 
+@mcp.resource("mybrain://metrics", mime_type="application/json")
+def metrics_resource() -> str:
+    """
+    Latency distributions (p50/p95/p99 per tool and per phase), lock-retry counts,
+    embedding batch sizes and observer scan durations of this server process.
+    """
+    return json.dumps(metrics.snapshot(), indent=2)
+
+
+@mcp.custom_route("/embed", methods=["POST"])
+async def embed_route(request: Request) -> JSONResponse:
+    """
+    Embed {"texts": [...]} with this server's model (HTTP transports only). Used by the
+    "remote" embedding backend so the admin and CLI share the server's model.
+    """
+    try:
+        texts = (await request.json())["texts"]
+        vectors = await anyio.to_thread.run_sync(db.embed, texts)
+        return JSONResponse({"embeddings": vectors.tolist()})
+    except Exception as e:
+        print(f"Error embedding for remote client: {e}", file=sys.stderr)
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health_route(request: Request) -> JSONResponse:
+    """Liveness and active sessions of a shared server (HTTP transports only)."""
+    return JSONResponse({
+        "status": "ok",
+        "sessions": len(active_workbases),
+        "active_workbases": active_workbases.all()
+    })
+
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+def _transport_security(host: str, allow_remote: bool) -> TransportSecuritySettings:
+    """
+    DNS rebinding protection for the HTTP transports. The server is unauthenticated, so a
+    non-loopback host is refused unless explicitly allowed; even then only Host/Origin headers
+    naming loopback, the bind host or SERVER_ALLOWED_HOSTS are accepted.
+    """
+    hosts = ["127.0.0.1:*", "localhost:*", "[::1]:*"]
+    if host not in LOOPBACK_HOSTS:
+        if not allow_remote:
+            raise SystemExit(
+                f"Refusing to serve on non-loopback host {host}: the shared server has no authentication. "
+                "Use --allow-remote (MYBRAIN_SERVER_ALLOW_REMOTE=true) to override."
+            )
+        print(f"WARNING: serving myBrAIn without authentication on {host}; any client that can reach "
+              f"it can read and write memories.", file=sys.stderr)
+        hosts.append(f"[{host}]:*" if ":" in host else f"{host}:*")
+    hosts += config.SERVER_ALLOWED_HOSTS
+    return TransportSecuritySettings(
+        enable_dns_rebinding_protection=True,
+        allowed_hosts=hosts,
+        allowed_origins=[f"http://{h}" for h in hosts]
+    )
+
+def serve(transport: str, host: str, port: int, socket_path: Optional[str] = None, allow_remote: bool = False):
+    """
+    Run the MCP server. stdio serves the single agent that spawned this process; the HTTP
+    transports serve every session from one process (one model, one Chroma client).
+    """
+    global shared_server
+    if transport == "stdio":
+        mcp.run()
+        return
+
+    shared_server = True
+    import uvicorn
+    # Over a unix socket the bind host is irrelevant: clients send a loopback Host header
+    mcp.settings.transport_security = _transport_security("localhost" if socket_path else host, allow_remote)
+    app = mcp.streamable_http_app() if transport == "streamable-http" else mcp.sse_app()
+    if socket_path:
+        print(f"myBrAIn serving {transport} on unix socket {socket_path}", file=sys.stderr)
+        uvicorn.run(app, uds=socket_path, log_level="warning")
+    else:
+        print(f"myBrAIn serving {transport} on http://{host}:{port}", file=sys.stderr)
+        uvicorn.run(app, host=host, port=port, log_level="warning")
+
 if __name__ == "__main__":
     from core.observer import SilentObserver
-    from core import config
-    
-    # Start the Silent Observer background thread, sharing the active_workbase reference
-    observer = SilentObserver(data_dir=config.BASE_DATA_DIR, active_workbase=active_workbase)
+    from core.migrations import start_background_migration
+    from core.retention import start_retention_job
+
+    parser = argparse.ArgumentParser(description="myBrAIn MCP server")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http", "sse"], default=config.SERVER_TRANSPORT)
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--socket", default=config.SERVER_SOCKET or None, help="Serve HTTP on this unix socket.")
+    parser.add_argument("--allow-remote", action="store_true", default=config.SERVER_ALLOW_REMOTE,
+                        help="Allow a non-loopback --host (the server has no authentication).")
+    args = parser.parse_args()
+    if args.transport != "stdio" and not args.socket and args.host not in LOOPBACK_HOSTS and not args.allow_remote:
+        parser.error(f"--host {args.host} is not a loopback address; the shared server has no authentication "
+                     "(pass --allow-remote to serve it anyway)")
+
+    # Start the Silent Observer background thread, sharing the per-session active workbases
+    observer = SilentObserver(data_dir=config.BASE_DATA_DIR, active_workbase=active_workbases)
     observer.start()
+
+    # Upgrade memories written under an older schema in the background (tools are not blocked)
+    start_background_migration(db, stop_event=observer.stop_event)
+    # Age out memories per MYBRAIN_RETENTION_* (no-op unless a policy is configured)
+    start_retention_job(db, stop_event=observer.stop_event)
     
     # Ensure stdout is never used for logs
     # FastMCP handles this internally, but we enforce it just in case.
-    mcp.run()
+    serve(args.transport, args.host, args.port, args.socket, allow_remote=args.allow_remote)
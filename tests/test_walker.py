@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+
+import pytest
+
+from core import config
+from core.walker import ParallelWalker, suffix_filter
+
+
+def build_tree(root, width=3, depth=4):
+    """Deterministic tree with files at every level, an ignored dir and a filtered-out suffix."""
+    def fill(directory, level):
+        for i in range(width):
+            (directory / f"f{i}.py").write_text("x = 1\n")
+        (directory / "notes.txt").write_text("skip me\n")
+        if level == depth:
+            return
+        for i in range(width):
+            sub = directory / f"d{i}"
+            sub.mkdir()
+            fill(sub, level + 1)
+
+    fill(root, 1)
+    (root / "node_modules").mkdir()
+    (root / "node_modules" / "dep.py").write_text("x = 1\n")
+
+
+def sorted_os_walk(root, ignored):
+    expected = []
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if d not in ignored)
+        expected.append((str(directory), list(dirs), sorted(f for f in files if f.endswith(".py"))))
+    return expected
+
+
+@pytest.mark.parametrize("workers", [0, 1, 8])
+def test_matches_sorted_os_walk_with_small_lookahead(tmp_path, monkeypatch, workers):
+    # A lookahead of 2 listings is far smaller than the tree, so workers repeatedly fill it
+    # and must still make progress on the directory the consumer is waiting for
+    monkeypatch.setattr(config, "WALKER_MAX_AHEAD", 2)
+    build_tree(tmp_path)
+
+    walker = ParallelWalker(tmp_path, ignored_dirs={"node_modules"},
+                            file_filter=suffix_filter({".py"}), workers=workers)
+    result = []
+    done = threading.Event()
+
+    def consume():
+        for directory, dirs, files in walker:
+            result.append((str(directory), list(dirs), [f.name for f in files]))
+        done.set()
+
+    # A deadlock would hang the test run instead of failing it
+    threading.Thread(target=consume, daemon=True).start()
+    assert done.wait(30), "walk did not finish (deadlock with a full lookahead?)"
+    assert result == sorted_os_walk(tmp_path, {"node_modules"})
+
+
+@pytest.mark.parametrize("workers", [0, 1, 8])
+def test_stop_event_ends_the_walk_promptly(tmp_path, monkeypatch, workers):
+    monkeypatch.setattr(config, "WALKER_MAX_AHEAD", 4)
+    build_tree(tmp_path, width=4, depth=5)
+    stop_event = threading.Event()
+
+    walker = ParallelWalker(tmp_path, file_filter=suffix_filter({".py"}), stop_event=stop_event, workers=workers)
+    seen = 0
+    start = time.monotonic()
+    for _ in walker:
+        seen += 1
+        if seen == 3:
+            stop_event.set()
+    assert time.monotonic() - start < 5
+    assert seen == 3
+
+    # Workers exit once the walk is cancelled
+    for thread in walker._threads:
+        thread.join(5)
+        assert not thread.is_alive()